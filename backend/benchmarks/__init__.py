@@ -0,0 +1 @@
+# Benchmarks package（backend ディレクトリから python -m benchmarks.xxx で実行）
@@ -0,0 +1,69 @@
+"""process_aftercare のジョブ実行時間ベンチマーク
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_aftercare --visits 100000
+
+LINE API はローカルスタブサーバーに向け、ジョブ（アウトボックスへの書き込み）と
+アウトボックスの送信それぞれの時間とリクエスト回数を計測する。
+"""
+import argparse
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched, timed
+from benchmarks.line_stub_server import start_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--visits", type=int, default=100000)
+    parser.add_argument("--tenants", type=int, default=50)
+    args = parser.parse_args()
+
+    server, os.environ["LINE_API_BASE"] = start_in_thread(port=0)
+    app = bench_app()
+    with app.app_context():
+        from models.patient import Patient
+        from models.visit import Visit
+        from models.message_template import MessageTemplate
+        from services.outbox_service import dispatch_pending
+        from services.scheduler_service import process_aftercare
+
+        reset_tables()
+        tenant_ids = seed_tenants(args.tenants)
+        insert_batched(MessageTemplate, ({
+            "id": uuid.uuid4(),
+            "tenant_id": tenant_id,
+            "type": "aftercare",
+            "name": "来院後フォロー",
+            "content": "本日はご来院ありがとうございました。",
+            "is_active": True,
+            "created_at": datetime.utcnow()
+        } for tenant_id in tenant_ids))
+
+        visit_date = datetime.utcnow() - timedelta(hours=24)
+        patient_ids = [uuid.uuid4() for _ in range(args.visits)]
+        insert_batched(Patient, ({
+            "id": patient_id,
+            "tenant_id": tenant_ids[i % len(tenant_ids)],
+            "line_user_id": f"U{i:032d}",
+            "status": "active",
+            "created_at": visit_date
+        } for i, patient_id in enumerate(patient_ids)))
+        insert_batched(Visit, ({
+            "id": uuid.uuid4(),
+            "patient_id": patient_id,
+            "visit_date": visit_date,
+            "aftercare_sent": False
+        } for patient_id in patient_ids))
+
+        with timed(f"process_aftercare ({args.visits} due visits)"):
+            process_aftercare()
+        with timed("outbox dispatch"):
+            while sum(dispatch_pending().values()):
+                pass
+        print(f"LINE requests: {server.stats['requests']}, recipients: {server.stats['messages']}")
+
+
+if __name__ == "__main__":
+    main()
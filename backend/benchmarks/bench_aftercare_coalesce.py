@@ -0,0 +1,141 @@
+"""アフターフォロー送信のまとめ方による LINE API 呼び出し数・時間の比較
+
+    BENCH_DATABASE_URL=postgresql://... LINE_DISPATCH_MODE=async \\
+        python -m benchmarks.bench_aftercare_coalesce --clinics 50 --visits 20000
+
+--clinics 件のクリニックにアフターフォロー対象の来院を作成する。テンプレートは
+1/3 が {name} あり、1/3 が {name} なし、1/3 が {name} ありで個別化オフ（personalize=false）。
+
+- per-patient push: 患者ごとに1プッシュ（本文の展開だけでまとめない従来方式相当）
+- coalesced: 同じ本文はマルチキャスト、本文が異なる宛先だけプッシュ（process_aftercare）
+
+それぞれジョブ（アウトボックスへの書き込み）と送信（スタブ、--latency-ms の遅延あり）の
+時間、API 呼び出し数を計測する。
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched
+from benchmarks.line_stub_server import start_in_thread
+
+TEMPLATES = (
+    ("{name}さん、本日はご来院ありがとうございました。", True),
+    ("本日はご来院ありがとうございました。お大事になさってください。", True),
+    ("{name}、本日はご来院ありがとうございました。", False),
+)
+
+
+def seed(clinics: int, visits: int):
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from models.message_template import MessageTemplate
+
+    reset_tables()
+    tenant_ids = seed_tenants(clinics)
+    insert_batched(MessageTemplate, ({
+        "id": uuid.uuid4(),
+        "tenant_id": tenant_id,
+        "type": "aftercare",
+        "name": "来院後フォロー",
+        "content": TEMPLATES[i % len(TEMPLATES)][0],
+        "personalize": TEMPLATES[i % len(TEMPLATES)][1],
+        "is_active": True,
+        "created_at": datetime.utcnow()
+    } for i, tenant_id in enumerate(tenant_ids)))
+
+    visit_date = datetime.utcnow() - timedelta(hours=24)
+    patient_ids = [uuid.uuid4() for _ in range(visits)]
+    insert_batched(Patient, ({
+        "id": patient_id,
+        "tenant_id": tenant_ids[i % clinics],
+        "line_user_id": f"U{i:032d}",
+        # 1割は表示名なし（「患者様」で展開される）
+        "display_name": f"患者{i}" if i % 10 else None,
+        "status": "active",
+        "created_at": visit_date
+    } for i, patient_id in enumerate(patient_ids)))
+    insert_batched(Visit, ({
+        "id": uuid.uuid4(),
+        "patient_id": patient_id,
+        "visit_date": visit_date,
+        "aftercare_sent": False
+    } for patient_id in patient_ids))
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+
+
+def per_patient_push() -> int:
+    """従来方式相当：来院ごとに本文を展開して1件ずつプッシュ"""
+    from sqlalchemy import select, update
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from services.message_log_writer import MessageLogWriter
+    from services.outbox_service import OutboxWriter
+    from services.scheduler_service import _active_templates
+
+    now = datetime.utcnow()
+    template = _active_templates("aftercare")
+    rows = db.session.execute(
+        select(Visit.id, Patient.id.label("patient_id"), Patient.tenant_id, Patient.line_user_id,
+               Patient.display_name, template.c.content)
+        .join(Patient, Patient.id == Visit.patient_id)
+        .join(template, template.c.tenant_id == Patient.tenant_id)
+        .where(Visit.visit_date >= now - timedelta(hours=25), Visit.visit_date < now - timedelta(hours=23),
+               Visit.aftercare_sent == False)
+    ).all()
+    log_writer = MessageLogWriter()
+    outbox = OutboxWriter()
+    for row in rows:
+        message = row.content.replace("{name}", row.display_name or "患者様")
+        log_id = log_writer.add(row.patient_id, "aftercare", message, status="pending")
+        outbox.push(row.tenant_id, row.line_user_id, message, log_ids=[log_id])
+    db.session.execute(
+        update(Visit).where(Visit.id.in_([row.id for row in rows]))
+        .values(aftercare_sent=True, aftercare_sent_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    log_writer.flush()
+    outbox.flush()
+    db.session.commit()
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clinics", type=int, default=50)
+    parser.add_argument("--visits", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    server, os.environ["LINE_API_BASE"] = start_in_thread(port=0, latency_ms=args.latency_ms)
+    app = bench_app()
+    with app.app_context():
+        from services.dispatch_service import DISPATCH_MODE
+        from services.outbox_service import dispatch_pending
+        from services.scheduler_service import process_aftercare
+
+        print(f"{args.clinics} clinics, {args.visits:,} due visits, LINE latency {args.latency_ms:.0f}ms, "
+              f"dispatch mode {DISPATCH_MODE}")
+        for label, job in (("per-patient push", per_patient_push), ("coalesced", process_aftercare)):
+            seed(args.clinics, args.visits)
+            for key in server.stats:
+                server.stats[key] = 0
+
+            started = time.perf_counter()
+            job()
+            job_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            while sum(dispatch_pending(batch_size=200).values()):
+                pass
+            send_seconds = time.perf_counter() - started
+            print(f"  {label:17s} job {job_seconds:6.2f}s  send {send_seconds:7.2f}s  "
+                  f"API calls {server.stats['requests']:6,}  recipients {server.stats['messages']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""ダッシュボードのベンチマーク（生テーブル集計 vs 日別ロールアップ）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_dashboard --patients 50000
+
+5年分の履歴を持つテナントを generate_series で投入し、rebuild-daily-stats で
+ロールアップを作ってから /api/dashboard/stats・/trends の応答時間を比較する。
+"""
+import argparse
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, timed
+
+
+def seed(patients: int, visits_per_patient: int, messages_per_patient: int):
+    from app import db
+    from services.stats_service import rebuild_daily_stats
+
+    reset_tables()
+    tenant_id = seed_tenants(1)[0]
+    with timed(f"seed {patients:,} patients / 5 years of history"):
+        db.session.execute(db.text("""
+            INSERT INTO patients (id, tenant_id, line_user_id, status, created_at, updated_at)
+            SELECT gen_random_uuid(), :tenant_id, 'U' || i,
+                   CASE WHEN i % 10 = 0 THEN 'blocked' ELSE 'active' END,
+                   now() - (i % 1825) * interval '1 day', now() - (i % 1825) * interval '1 day'
+            FROM generate_series(1, :patients) AS i
+        """), {"tenant_id": str(tenant_id), "patients": patients})
+        db.session.execute(db.text("""
+            INSERT INTO visits (id, patient_id, visit_date, aftercare_sent)
+            SELECT gen_random_uuid(), p.id, now() - (random() * 1825) * interval '1 day', true
+            FROM patients p, generate_series(1, :n)
+        """), {"n": visits_per_patient})
+        db.session.execute(db.text("""
+            INSERT INTO message_logs (id, patient_id, message_type, content, status, sent_at)
+            SELECT gen_random_uuid(), p.id, (ARRAY['aftercare', 'recall', 'reply'])[1 + g % 3],
+                   'bench', 'sent', now() - (random() * 1825) * interval '1 day'
+            FROM patients p, generate_series(1, :n) AS g
+        """), {"n": messages_per_patient})
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+    with timed("rebuild daily_tenant_stats --all"):
+        rebuild_daily_stats(tenant_id=tenant_id)
+    return tenant_id
+
+
+def raw_stats(tenant_id):
+    """ロールアップ導入前の集計（生テーブルを毎回スキャン）"""
+    from sqlalchemy import func
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from models.message_log import MessageLog
+    from services.clinic_time import tenant_timezone, local_today, day_range, local_midnight_utc
+
+    tz_name = tenant_timezone(tenant_id)
+    today = local_today(tz_name)
+    today_start, today_end = day_range(today, tz_name)
+    month_start = local_midnight_utc(today.replace(day=1), tz_name)
+
+    total = Patient.query.filter_by(tenant_id=tenant_id).count()
+    active = Patient.query.filter_by(tenant_id=tenant_id, status="active").count()
+    visits = db.session.query(func.count(Visit.id)).join(Patient).filter(
+        Patient.tenant_id == tenant_id,
+        Visit.visit_date >= today_start, Visit.visit_date < today_end
+    ).scalar()
+    messages = db.session.query(func.count(MessageLog.id)).join(Patient).filter(
+        Patient.tenant_id == tenant_id,
+        MessageLog.sent_at >= today_start, MessageLog.sent_at < today_end
+    ).scalar()
+    month = db.session.query(func.count(MessageLog.id)).join(Patient).filter(
+        Patient.tenant_id == tenant_id, MessageLog.sent_at >= month_start
+    ).scalar()
+    return total, active, visits, messages, month
+
+
+def raw_trends(tenant_id, days: int):
+    """ロールアップ導入前のトレンド集計"""
+    from datetime import timedelta
+    from sqlalchemy import func
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from models.message_log import MessageLog
+    from services.clinic_time import tenant_timezone, local_today, local_midnight_utc, local_date
+
+    tz_name = tenant_timezone(tenant_id)
+    start = local_midnight_utc(local_today(tz_name) - timedelta(days=days), tz_name)
+    results = []
+    for model, column, joined in (
+        (Patient, Patient.created_at, False),
+        (Visit, Visit.visit_date, True),
+        (MessageLog, MessageLog.sent_at, True),
+    ):
+        day = local_date(column, tz_name)
+        query = db.session.query(day, func.count(model.id))
+        if joined:
+            query = query.join(Patient)
+        results.append(query.filter(
+            Patient.tenant_id == tenant_id, column >= start
+        ).group_by(day).all())
+    return results
+
+
+def measure(label: str, func, repeat: int):
+    func()  # ウォームアップ
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    print(f"  {label:<36} {(time.perf_counter() - started) / repeat * 1000:8.1f} ms/req")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=50000)
+    parser.add_argument("--visits-per-patient", type=int, default=10)
+    parser.add_argument("--messages-per-patient", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        from app import db
+        from models.tenant import Tenant
+
+        if args.no_seed:
+            tenant_id = db.session.query(Tenant.id).limit(1).scalar()
+        else:
+            tenant_id = seed(args.patients, args.visits_per_patient, args.messages_per_patient)
+
+        client = app.test_client()
+        headers = {"X-Tenant-ID": str(tenant_id)}
+
+        print("dashboard:")
+        measure("before: stats (raw tables)", lambda: raw_stats(tenant_id), args.repeat)
+        measure("after : GET /api/dashboard/stats",
+                lambda: client.get("/api/dashboard/stats", headers=headers), args.repeat)
+        for days in (30, 365):
+            measure(f"before: trends {days}d (raw tables)",
+                    lambda: raw_trends(tenant_id, days), args.repeat)
+            measure(f"after : GET /api/dashboard/trends {days}d",
+                    lambda: client.get(f"/api/dashboard/trends?days={days}", headers=headers),
+                    args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""日付フィルタの実行計画ベンチマーク（func.date() == 今日 vs 半開区間）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_date_filters --visits 10000000
+
+大量データはサーバー側の generate_series で投入する。
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, timed
+
+
+def seed(visits: int, tenants: int):
+    from app import db
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    patients = max(visits // 20, 1)
+    with timed(f"seed {patients:,} patients / {visits:,} visits"):
+        db.session.execute(db.text("""
+            INSERT INTO patients (id, tenant_id, line_user_id, status, created_at)
+            SELECT gen_random_uuid(), (CAST(:tenant_ids AS uuid[]))[1 + i % :tenants], 'U' || i, 'active',
+                   now() - (i % 1825) * interval '1 day'
+            FROM generate_series(1, :patients) AS i
+        """), {"tenant_ids": [str(t) for t in tenant_ids], "tenants": tenants, "patients": patients})
+        db.session.execute(db.text("""
+            INSERT INTO visits (id, patient_id, visit_date, aftercare_sent)
+            SELECT gen_random_uuid(), p.id,
+                   now() - (random() * 1825) * interval '1 day', true
+            FROM patients p, generate_series(1, 20)
+        """))
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+    return tenant_ids[0]
+
+
+def explain(label: str, statement):
+    from app import db
+
+    sql = statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    result = db.session.execute(db.text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()
+    plan = (result if isinstance(result, list) else json.loads(result))[0]
+
+    nodes = []
+
+    def walk(node):
+        name = node["Node Type"]
+        if "Relation Name" in node:
+            name += f" on {node['Relation Name']}"
+        if "Index Name" in node:
+            name += f" using {node['Index Name']}"
+        nodes.append(name)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    print(f"{label}: {plan['Execution Time']:.1f} ms")
+    for name in nodes:
+        print(f"    {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--visits", type=int, default=10000000)
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        from sqlalchemy import select, func
+        from app import db
+        from models.patient import Patient
+        from models.visit import Visit
+        from services.clinic_time import DEFAULT_TIMEZONE, local_today, day_range
+
+        if args.no_seed:
+            tenant_id = db.session.execute(select(Patient.tenant_id).limit(1)).scalar()
+        else:
+            tenant_id = seed(args.visits, args.tenants)
+
+        tz_name = DEFAULT_TIMEZONE
+        today = local_today(tz_name)
+        start, end = day_range(today, tz_name)
+
+        explain("before: all visits today, func.date(visit_date) = today",
+                select(func.count()).select_from(Visit).where(func.date(Visit.visit_date) == today))
+        explain("after : all visits today, visit_date in [start, end)",
+                select(func.count()).select_from(Visit).where(
+                    Visit.visit_date >= start, Visit.visit_date < end))
+        explain("before: tenant visits today (GET /api/visits/today)",
+                select(Visit.id).join(Patient).where(
+                    Patient.tenant_id == tenant_id, func.date(Visit.visit_date) == today))
+        explain("after : tenant visits today (GET /api/visits/today)",
+                select(Visit.id).join(Patient).where(
+                    Patient.tenant_id == tenant_id,
+                    Visit.visit_date >= start, Visit.visit_date < end))
+        explain("before: 30-day trend filter",
+                select(func.count()).select_from(Visit).join(Patient).where(
+                    Patient.tenant_id == tenant_id,
+                    func.date(Visit.visit_date) >= today - timedelta(days=30)))
+        explain("after : 30-day trend filter",
+                select(func.count()).select_from(Visit).join(Patient).where(
+                    Patient.tenant_id == tenant_id,
+                    Visit.visit_date >= day_range(today - timedelta(days=30), tz_name)[0]))
+
+
+if __name__ == "__main__":
+    main()
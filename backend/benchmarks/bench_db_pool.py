@@ -0,0 +1,90 @@
+"""ジョブ実行中の Web リクエストの接続待ち時間（プール共有とプール分離の比較）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_db_pool --seconds 10
+
+--job-threads 本のスレッドが接続を取り続けて --job-query-ms の重いクエリを繰り返す間に、
+--web-threads 本のスレッドが Web リクエスト相当の短いクエリを発行し、接続の貸し出し待ちを計測する。
+
+- shared: ジョブも Web 用のプールを使う（分離前の構成）
+- separate: ジョブはジョブ用のプール（DB_JOBS_POOL_SIZE）を使う
+"""
+import argparse
+import threading
+import time
+
+from benchmarks._common import bench_app
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def run(app, separate: bool, seconds: float, web_threads: int, job_threads: int, job_query_ms: float) -> dict:
+    from app import db
+    from services.db_pool import jobs_pool
+
+    stop = threading.Event()
+    waits = []
+    lock = threading.Lock()
+
+    def job():
+        while not stop.is_set():
+            with app.app_context():
+                if separate:
+                    with jobs_pool():
+                        db.session.execute(db.text("SELECT pg_sleep(:s)"), {"s": job_query_ms / 1000})
+                else:
+                    db.session.execute(db.text("SELECT pg_sleep(:s)"), {"s": job_query_ms / 1000})
+
+    def web():
+        while not stop.is_set():
+            started = time.perf_counter()
+            with app.app_context():
+                db.session.execute(db.text("SELECT 1"))
+            with lock:
+                waits.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    # ワーカースレッドは既定で Web 用のプール
+    threads = [threading.Thread(target=job) for _ in range(job_threads)]
+    threads += [threading.Thread(target=web) for _ in range(web_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    return {
+        "requests": len(waits),
+        "p50": percentile(waits, 0.5) * 1000,
+        "p99": percentile(waits, 0.99) * 1000,
+        "max": max(waits, default=0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--web-threads", type=int, default=8)
+    parser.add_argument("--job-threads", type=int, default=16)
+    parser.add_argument("--job-query-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    app = bench_app()
+    from services.db_pool import DB_JOBS_MAX_OVERFLOW, DB_JOBS_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+    print(f"web pool {DB_POOL_SIZE}+{DB_MAX_OVERFLOW}, jobs pool {DB_JOBS_POOL_SIZE}+{DB_JOBS_MAX_OVERFLOW}, "
+          f"{args.web_threads} web threads, {args.job_threads} job threads ({args.job_query_ms:.0f}ms queries)")
+    for label, separate in (("shared", False), ("separate", True)):
+        result = run(app, separate, args.seconds, args.web_threads, args.job_threads, args.job_query_ms)
+        print(f"  {label:8s} {result['requests']:7,} requests  request latency p50 {result['p50']:7.2f}ms  "
+              f"p99 {result['p99']:7.2f}ms  max {result['max']:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
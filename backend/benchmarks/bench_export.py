@@ -0,0 +1,107 @@
+"""メッセージログエクスポートのベンチマーク（全件読み込み vs ストリーミング）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_export --rows 5000000
+
+1テナントに --rows 件のメッセージログを generate_series で投入し、/api/exports/message_logs を
+NDJSON・CSV・gzip で最後まで読み出す。ピークRSSを比較するため方式ごとに別プロセスで実行する。
+従来方式（ORM で全件取得してから JSON 化）はメモリに載り切らないため --baseline-rows 件で計測する。
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, peak_rss_mb, timed
+
+METHODS = ("in-memory", "ndjson", "csv", "ndjson+gzip")
+
+
+def seed(rows: int, patients: int = 5000):
+    from app import db
+
+    reset_tables()
+    tenant_id = seed_tenants(1)[0]
+    with timed(f"seed {rows:,} message logs"):
+        db.session.execute(db.text("""
+            INSERT INTO patients (id, tenant_id, line_user_id, status, created_at, updated_at)
+            SELECT gen_random_uuid(), :tenant_id, 'U' || i, 'active', now(), now()
+            FROM generate_series(1, :patients) AS i
+        """), {"tenant_id": str(tenant_id), "patients": patients})
+        db.session.execute(db.text("""
+            INSERT INTO message_logs (id, patient_id, message_type, content, status, line_message_id, sent_at)
+            SELECT gen_random_uuid(), p.id, (ARRAY['aftercare', 'recall', 'reply'])[1 + g % 3],
+                   '前回のご来院から3ヶ月が経ちました。定期検診のご予約をお待ちしております。',
+                   'sent', 'm' || g, now() - g * interval '1 minute'
+            FROM patients p, generate_series(1, :per_patient) AS g
+        """), {"per_patient": rows // patients})
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+
+def legacy_export(tenant_id, limit: int) -> int:
+    """従来方式相当：ORM で全件取得してから1つの JSON にまとめる"""
+    import json
+    from models.patient import Patient
+    from models.message_log import MessageLog
+
+    logs = MessageLog.query.join(Patient).filter(Patient.tenant_id == tenant_id).limit(limit).all()
+    body = json.dumps([log.to_dict() for log in logs], ensure_ascii=False).encode("utf-8")
+    return len(logs), len(body)
+
+
+def run(method: str, baseline_rows: int):
+    app = bench_app()
+    client = app.test_client()
+    with app.app_context():
+        from app import db
+        from models.tenant import Tenant
+
+        tenant_id = db.session.execute(db.select(Tenant.id)).scalar_one()
+        total = db.session.execute(db.text("SELECT count(*) FROM message_logs")).scalar()
+        db.session.rollback()
+
+        started = time.perf_counter()
+        if method == "in-memory":
+            rows, size = legacy_export(tenant_id, baseline_rows)
+        else:
+            fmt, _, compress = method.partition("+")
+            query = f"format={fmt}" + ("&gzip=1" if compress else "")
+            response = client.get(f"/api/exports/message_logs?{query}",
+                                  headers={"X-Tenant-ID": str(tenant_id)}, buffered=False)
+            rows, size, lines = total, 0, 0
+            for chunk in response.response:
+                size += len(chunk)
+                lines += chunk.count(b"\n")
+            response.close()
+            if not compress and fmt == "ndjson":
+                assert lines == total, f"exported {lines:,} of {total:,} rows"
+        elapsed = time.perf_counter() - started
+
+        print(f"{method:12s} {rows:>10,} rows  {rows / elapsed:>9,.0f} rows/s  {elapsed:7.2f}s  "
+              f"{size / 1024 / 1024:8.1f} MB out  peak RSS {peak_rss_mb():6.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000000)
+    parser.add_argument("--baseline-rows", type=int, default=500000)
+    parser.add_argument("--method", choices=METHODS)
+    args = parser.parse_args()
+
+    if args.method:
+        run(args.method, args.baseline_rows)
+        return
+
+    app = bench_app()
+    with app.app_context():
+        seed(args.rows)
+
+    for method in METHODS:
+        subprocess.run([
+            sys.executable, "-m", "benchmarks.bench_export",
+            "--method", method, "--baseline-rows", str(args.baseline_rows)
+        ], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""友だち追加イベントの処理ベンチマーク（1件ずつ SELECT + コミット vs まとめて UPSERT）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_follow --events 10000 --batch 100
+
+QRコード施策などで大量の友だち追加が来た場合を想定し、Webhook 1回あたり --batch 件の
+follow イベントを処理する。ウェルカムテンプレートは作らず、患者の登録処理だけを比較する。
+"""
+import argparse
+import time
+from datetime import datetime
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants
+
+
+def legacy_process(tenant_id, events: list):
+    """従来方式：イベントごとに既存チェックしてコミット"""
+    from app import db
+    from models.patient import Patient
+    from services.stats_service import record_stats
+
+    for event in events:
+        user_id = event["source"]["userId"]
+        patient = Patient.query.filter_by(tenant_id=tenant_id, line_user_id=user_id).first()
+        if patient:
+            patient.status = "active"
+        else:
+            db.session.add(Patient(tenant_id=tenant_id, line_user_id=user_id, display_name="", status="active"))
+            record_stats([(tenant_id, datetime.utcnow(), "new_patients", 1)])
+        db.session.commit()
+
+
+def batched_process(tenant, events: list):
+    """現在の方式：Webhook 1回分をまとめて1文で反映"""
+    from app import db
+    from routes.webhook import process_events
+
+    process_events(tenant, events)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=100, help="Webhook 1回あたりのイベント数")
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        from models.patient import Patient
+        from services.cache_service import get_tenant
+
+        for label in ("per-event", "batched"):
+            reset_tables()
+            tenant_id = seed_tenants(1)[0]
+            tenant = get_tenant(tenant_id)
+            events = [{"type": "follow", "source": {"type": "user", "userId": f"U{i:032d}"}}
+                      for i in range(args.events)]
+            # 半分は再フォロー（既存患者）になるよう同じユーザーを2回送る
+            events = events[:args.events // 2] * 2
+
+            started = time.perf_counter()
+            for i in range(0, len(events), args.batch):
+                chunk = events[i:i + args.batch]
+                if label == "per-event":
+                    legacy_process(tenant_id, chunk)
+                else:
+                    batched_process(tenant, chunk)
+            elapsed = time.perf_counter() - started
+
+            patients = Patient.query.filter_by(tenant_id=tenant_id).count()
+            print(f"{label:10s} {len(events):,} follow events: {elapsed:6.2f}s  "
+                  f"{len(events) / elapsed:>8,.0f} events/s  ({patients:,} patients)")
+
+
+if __name__ == "__main__":
+    main()
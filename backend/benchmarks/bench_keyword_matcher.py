@@ -0,0 +1,62 @@
+"""キーワード照合のベンチマーク（キーワードごとの部分一致ループ vs Aho-Corasick）
+
+    python -m benchmarks.bench_keyword_matcher --keywords 1000 --messages 20000
+
+DB は使わない。テナント1件分のキーワードを生成し、患者からのメッセージ相当の本文で
+1秒あたりの照合件数と、オートマトンの構築時間を比較する。
+"""
+import argparse
+import random
+import time
+
+from benchmarks._common import timed
+from services.keyword_matcher import ALERT_KEYWORDS, KeywordMatcher, MatchTarget, normalize
+
+CHARS = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん薬歯痛腫熱"
+
+
+def naive_best_match(keywords: dict, text: str):
+    """従来方式：キーワードごとに `in` で部分一致を調べる"""
+    text = normalize(text)
+    best = None
+    for keyword, target in keywords.items():
+        if keyword in text and (best is None or target.rank > best.rank):
+            best = target
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keywords", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--length", type=int, default=60, help="メッセージの文字数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    keywords = {keyword: MatchTarget("alert_reply", "alert", (1, len(keyword), 0)) for keyword in ALERT_KEYWORDS}
+    while len(keywords) < args.keywords:
+        keyword = "".join(rng.choice(CHARS) for _ in range(rng.randint(2, 6)))
+        keywords.setdefault(keyword, MatchTarget("keyword", keyword, (0, len(keyword), len(keywords))))
+    messages = ["".join(rng.choice(CHARS) for _ in range(args.length)) for _ in range(args.messages)]
+
+    with timed(f"build automaton ({len(keywords):,} keywords)"):
+        matcher = KeywordMatcher(keywords)
+
+    results = {}
+    for label, match in (
+        ("naive loop", lambda text: naive_best_match(keywords, text)),
+        ("aho-corasick", matcher.best_match),
+    ):
+        started = time.perf_counter()
+        results[label] = [match(text) for text in messages]
+        elapsed = time.perf_counter() - started
+        print(f"{label:12s} {args.messages / elapsed:>10,.0f} messages/s  "
+              f"{elapsed / args.messages * 1e6:8.1f} µs/message")
+
+    matched = sum(r is not None for r in results["aho-corasick"])
+    assert results["naive loop"] == results["aho-corasick"], "results differ"
+    print(f"matched {matched:,}/{args.messages:,} messages (results identical)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""LINE プッシュ送信スループットベンチマーク（接続使い捨て vs LineClient）
+
+    python -m benchmarks.bench_line_push --messages 10000 --latency-ms 5
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.line_stub_server import start_in_thread
+
+
+def run_naive(base_url: str, count: int):
+    """従来方式：メッセージごとに requests.post（毎回新規接続）"""
+    for i in range(count):
+        requests.post(
+            f"{base_url}/message/push",
+            headers={"Authorization": "Bearer token"},
+            json={"to": f"U{i}", "messages": [{"type": "text", "text": "hello"}]}
+        )
+
+
+def run_client(client, count: int, threads: int):
+    """LineClient（プール済みセッション）で送信"""
+    messages = [{"type": "text", "text": "hello"}]
+    if threads <= 1:
+        for i in range(count):
+            client.push("token", f"U{i}", messages)
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: client.push("token", f"U{i}", messages), range(count)))
+
+
+def report(label: str, count: int, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {count / elapsed:,.0f} msg/s ({elapsed:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    
+    server, base_url = start_in_thread(port=0, latency_ms=args.latency_ms)
+    
+    from services.line_service import LineClient
+    client = LineClient(base_url=base_url, pool_size=args.threads)
+    
+    report("before (requests.post per message)", args.messages,
+           lambda: run_naive(base_url, args.messages))
+    report("after  (LineClient, serial)", args.messages,
+           lambda: run_client(client, args.messages, 1))
+    report(f"after  (LineClient, {args.threads} threads)", args.messages,
+           lambda: run_client(client, args.messages, args.threads))
+    print(f"stub stats: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
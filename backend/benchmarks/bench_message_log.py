@@ -0,0 +1,79 @@
+"""MessageLog 書き込みベンチマーク（ORM add / executemany / COPY）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_message_log --rows 1000000
+
+ピークRSSを比較するため、方式ごとに別プロセスで実行する。
+"""
+import argparse
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched, peak_rss_mb
+
+METHODS = ("orm", "executemany", "copy")
+
+
+def run(method: str, rows: int, flush_size: int):
+    app = bench_app()
+    with app.app_context():
+        from app import db
+        from models.patient import Patient
+        from models.message_log import MessageLog
+        from services.message_log_writer import MessageLogWriter
+
+        reset_tables()
+        tenant_id = seed_tenants(1)[0]
+        patient_ids = [uuid.uuid4() for _ in range(1000)]
+        insert_batched(Patient, [{
+            "id": patient_id,
+            "tenant_id": tenant_id,
+            "line_user_id": f"U{i:032d}",
+            "status": "active",
+            "created_at": datetime.utcnow()
+        } for i, patient_id in enumerate(patient_ids)])
+
+        start = time.perf_counter()
+        if method == "orm":
+            # 従来方式：1行ずつ ORM オブジェクトを追加して最後にコミット
+            for i in range(rows):
+                db.session.add(MessageLog(
+                    patient_id=patient_ids[i % len(patient_ids)],
+                    message_type="recall",
+                    content="お元気でいらっしゃいますか？",
+                    status="sent"
+                ))
+        else:
+            writer = MessageLogWriter(flush_size=flush_size, use_copy=method == "copy")
+            for i in range(rows):
+                writer.add(patient_ids[i % len(patient_ids)], "recall", "お元気でいらっしゃいますか？")
+            writer.flush()
+        db.session.commit()
+        elapsed = time.perf_counter() - start
+
+        print(f"{method:12s} {rows:>9,} rows  {rows / elapsed:>10,.0f} rows/s  "
+              f"{elapsed:7.2f}s  peak RSS {peak_rss_mb():7.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--flush-size", type=int, default=1000)
+    parser.add_argument("--method", choices=METHODS)
+    args = parser.parse_args()
+
+    if args.method:
+        run(args.method, args.rows, args.flush_size)
+        return
+
+    for method in METHODS:
+        subprocess.run([
+            sys.executable, "-m", "benchmarks.bench_message_log",
+            "--method", method, "--rows", str(args.rows), "--flush-size", str(args.flush_size)
+        ], check=True)
+
+
+if __name__ == "__main__":
+    main()
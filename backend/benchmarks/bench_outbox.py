@@ -0,0 +1,132 @@
+"""アウトボックスの送信スループット（ディスパッチャーのプロセス数ごと）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_outbox --messages 20000 --processes 1,2,4
+
+送信待ちのプッシュメッセージ（送信ログ付き）を --messages 件作成し、
+--processes 個のディスパッチャープロセス（各 --workers スレッド）で空になるまでの時間を計測する。
+LINE API はスタブ（--latency-ms の応答遅延あり）。--kill-after 秒後に1プロセスを強制終了し、
+送信中だった行がリース期限（OUTBOX_LEASE_SECONDS、ここでは 2 秒）の後に他のプロセスから同じ冪等キーで再送されても、
+配信数がメッセージ数と一致する（重複配信がない）ことを確認する。
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants
+from benchmarks.line_stub_server import start_in_thread
+
+
+def run_child(workers: int):
+    from services.outbox_service import start_dispatcher
+
+    app = bench_app()
+    start_dispatcher(app, workers=workers, poll_interval=0.2)
+    while True:
+        time.sleep(1)
+
+
+def seed(messages: int, tenants: int):
+    from app import db
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    db.session.execute(db.text("""
+        INSERT INTO patients (id, tenant_id, line_user_id, status, created_at, updated_at)
+        SELECT gen_random_uuid(), (CAST(:tenant_ids AS uuid[]))[1 + i % :tenants], 'U' || i, 'active', now(), now()
+        FROM generate_series(0, :messages - 1) AS i
+    """), {"tenant_ids": [str(t) for t in tenant_ids], "tenants": tenants, "messages": messages})
+    db.session.execute(db.text("""
+        INSERT INTO message_logs (id, patient_id, message_type, content, status, sent_at)
+        SELECT gen_random_uuid(), id, 'welcome', 'ようこそ', 'pending', now() FROM patients
+    """))
+    db.session.execute(db.text("""
+        INSERT INTO message_outbox (tenant_id, endpoint, payload, idempotency_key, message_log_ids,
+                                    status, attempts, next_attempt_at, created_at)
+        SELECT p.tenant_id, 'push',
+               jsonb_build_object('to', p.line_user_id,
+                                  'messages', jsonb_build_array(jsonb_build_object('type', 'text', 'text', m.content))),
+               gen_random_uuid(), ARRAY[m.id], 'pending', 0, now(), now()
+        FROM message_logs m JOIN patients p ON p.id = m.patient_id
+    """))
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--processes", default="1,2,4", help="比較するディスパッチャープロセス数（カンマ区切り）")
+    parser.add_argument("--workers", type=int, default=4, help="プロセスあたりのスレッド数")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--kill-after", type=float, default=10.0, help="1プロセスを強制終了するまでの秒数（0 で無効）")
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.workers)
+        return
+
+    os.environ.setdefault("OUTBOX_LEASE_SECONDS", "2")
+    server, os.environ["LINE_API_BASE"] = start_in_thread(port=0, latency_ms=args.latency_ms)
+    app = bench_app()
+    print(f"{args.messages:,} messages, LINE latency {args.latency_ms:.0f}ms, {args.workers} threads per process")
+    for processes in [int(p) for p in args.processes.split(",")]:
+        with app.app_context():
+            from app import db
+
+            seed(args.messages, args.tenants)
+        for key in server.stats:
+            server.stats[key] = 0
+
+        children = [
+            subprocess.Popen([sys.executable, "-m", "benchmarks.bench_outbox", "--child",
+                              "--workers", str(args.workers)])
+            for _ in range(processes)
+        ]
+        started = time.perf_counter()
+        killed = False
+        try:
+            while True:
+                time.sleep(0.2)
+                if (args.kill_after and processes > 1 and not killed
+                        and time.perf_counter() - started >= args.kill_after):
+                    # 送信中のバッチを持ったまま落ちる（その行はリース期限の後に他のプロセスが取り直す）
+                    os.kill(children[0].pid, signal.SIGKILL)
+                    killed = True
+                with app.app_context():
+                    pending = db.session.execute(db.text(
+                        "SELECT count(*) FROM message_outbox WHERE status = 'pending'"
+                    )).scalar()
+                    db.session.rollback()
+                if pending == 0:
+                    break
+            elapsed = time.perf_counter() - started
+        finally:
+            for child in children:
+                child.terminate()
+            for child in children:
+                child.wait()
+
+        with app.app_context():
+            outbox = dict(db.session.execute(db.text(
+                "SELECT status, count(*) FROM message_outbox GROUP BY status"
+            )).all())
+            logs = dict(db.session.execute(db.text(
+                "SELECT status, count(*) FROM message_logs GROUP BY status"
+            )).all())
+            db.session.rollback()
+        delivered = server.stats["messages"]
+        resent = server.stats["requests"] - delivered - server.stats["throttled"]
+        print(f"  processes {processes}: {elapsed:6.2f}s  {args.messages / elapsed:7,.0f} msg/s  "
+              f"delivered {delivered:,}  resent (409) {resent}  outbox {outbox}  logs {logs}"
+              f"{'  (1 process killed)' if killed else ''}")
+        assert delivered == args.messages, "some messages were delivered twice or not at all"
+        assert logs == {"sent": args.messages}
+
+
+if __name__ == "__main__":
+    main()
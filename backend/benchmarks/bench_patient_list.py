@@ -0,0 +1,123 @@
+"""患者一覧のベンチマーク（COUNT + OFFSET vs キーセット、trigram インデックス有無の部分一致検索）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_patient_list --patients 500000
+
+1テナントに --patients 件の患者を generate_series で投入し、1ページ目と 5,000 ページ目
+（per_page=20）の取得時間を比較する。キーセット側の 5,000 ページ目は、直前ページの
+最後の行から作ったカーソルで取得する（クライアントが next_cursor をたどった場合と同じ）。
+"""
+import argparse
+import hashlib
+import statistics
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, timed
+
+PER_PAGE = 20
+
+
+def seed(patients: int):
+    from app import db
+
+    reset_tables()
+    tenant_id = seed_tenants(1)[0]
+    with timed(f"seed {patients:,} patients"):
+        db.session.execute(db.text("""
+            INSERT INTO patients (id, tenant_id, line_user_id, display_name, status, created_at, updated_at)
+            SELECT gen_random_uuid(), :tenant_id, 'U' || i,
+                   (ARRAY['山田', '佐藤', '鈴木', '高橋', '田中', '伊藤'])[1 + i % 6]
+                       || ' ' || substr(md5(i::text), 1, 8),
+                   CASE WHEN i % 10 = 0 THEN 'blocked' ELSE 'active' END,
+                   now() - i * interval '1 minute', now()
+            FROM generate_series(1, :patients) AS i
+        """), {"tenant_id": str(tenant_id), "patients": patients})
+        db.session.execute(db.text("ANALYZE patients"))
+        db.session.commit()
+    return tenant_id
+
+
+def legacy_page(tenant_id, page: int, search: str = ""):
+    """従来方式：Flask-SQLAlchemy の paginate（COUNT + OFFSET）"""
+    from models.patient import Patient
+
+    query = Patient.query.filter_by(tenant_id=tenant_id, status="active")
+    if search:
+        query = query.filter(Patient.display_name.ilike(f"%{search}%"))
+    pagination = query.order_by(Patient.created_at.desc()).paginate(page=page, per_page=PER_PAGE)
+    return [p.to_dict() for p in pagination.items], pagination.total
+
+
+def cursor_before(tenant_id, page: int) -> str:
+    """page ページ目を取得するためのカーソル（前ページ最後の行）"""
+    from app import db
+    from models.patient import Patient
+    from services.pagination import encode_cursor
+
+    row = db.session.execute(
+        db.select(Patient.created_at, Patient.id)
+        .where(Patient.tenant_id == tenant_id, Patient.status == "active")
+        .order_by(Patient.created_at.desc(), Patient.id.desc())
+        .offset((page - 1) * PER_PAGE - 1).limit(1)
+    ).one()
+    return encode_cursor(row.created_at, row.id)
+
+
+def measure(fn, repeat: int) -> float:
+    """中央値（ms）"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=500000)
+    parser.add_argument("--page", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = bench_app()
+    client = app.test_client()
+    with app.app_context():
+        from app import db
+
+        tenant_id = seed(args.patients)
+        headers = {"X-Tenant-ID": str(tenant_id)}
+        cursor = cursor_before(tenant_id, args.page)
+        # 名前の一部で検索（該当は数件）
+        search = hashlib.md5(b"4242").hexdigest()[:6]
+
+        def api(query: str):
+            response = client.get(f"/api/patients/?per_page={PER_PAGE}&{query}", headers=headers)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return response.get_json()
+
+        legacy_ids = [p["id"] for p in legacy_page(tenant_id, args.page)[0]]
+        cursor_ids = [p["id"] for p in api(f"cursor={cursor}")["patients"]]
+        assert legacy_ids == cursor_ids, "page contents differ"
+
+        cases = [
+            ("page 1", "COUNT + OFFSET", lambda: legacy_page(tenant_id, 1)),
+            ("page 1", "keyset, estimate", lambda: api("total=estimate")),
+            ("page 1", "keyset, exact", lambda: api("total=exact")),
+            (f"page {args.page:,}", "COUNT + OFFSET", lambda: legacy_page(tenant_id, args.page)),
+            (f"page {args.page:,}", "keyset, cursor", lambda: api(f"cursor={cursor}")),
+            ("search", "COUNT + OFFSET", lambda: legacy_page(tenant_id, 1, search=search)),
+            ("search", "keyset + trigram", lambda: api(f"search={search}")),
+        ]
+        for page, label, fn in cases:
+            db.session.rollback()
+            print(f"{page:12s} {label:18s} {measure(fn, args.repeat):8.1f} ms")
+
+        # trigram インデックスなしでの部分一致（インデックスを一時的に削除して計測）
+        db.session.execute(db.text("DROP INDEX ix_patients_display_name_trgm"))
+        elapsed = measure(lambda: api(f"search={search}"), args.repeat)
+        print(f"{'search':12s} {'keyset, no trigram':18s} {elapsed:8.1f} ms")
+        db.session.rollback()
+
+
+if __name__ == "__main__":
+    main()
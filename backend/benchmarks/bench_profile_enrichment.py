@@ -0,0 +1,74 @@
+"""LINE プロフィール取得ワーカーのスループット
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_profile_enrichment --patients 10000 --tenants 20
+
+プロフィール未取得の患者を --patients 件（--tenants 件のクリニックに分散）作成し、
+enrich_profiles をバッチサイズごとに空になるまで繰り返した時間と API 呼び出し数を計測する。
+LINE API はスタブ（--latency-ms の応答遅延あり）。プロフィールは LINE_DISPATCH_MODE に関わらず
+ディスパッチエンジンでチャネルごとのレート制限の範囲で並行に取得する。
+"""
+import argparse
+import os
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants
+from benchmarks.line_stub_server import start_in_thread
+
+
+def seed(patients: int, tenants: int):
+    from app import db
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    db.session.execute(db.text("""
+        INSERT INTO patients (id, tenant_id, line_user_id, status, created_at, updated_at)
+        SELECT gen_random_uuid(), (CAST(:tenant_ids AS uuid[]))[1 + i % :tenants], 'U' || i, 'active', now(), now()
+        FROM generate_series(0, :patients - 1) AS i
+    """), {"tenant_ids": [str(t) for t in tenant_ids], "tenants": tenants, "patients": patients})
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--batch-sizes", default="50,200", help="比較するバッチサイズ（カンマ区切り）")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    server, os.environ["LINE_API_BASE"] = start_in_thread(port=0, latency_ms=args.latency_ms)
+    app = bench_app()
+    with app.app_context():
+        from app import db
+        from services.cache_service import profile_cache
+        from services.profile_service import enrich_profiles
+
+        print(f"{args.patients:,} patients without profiles, {args.tenants} clinics, "
+              f"LINE latency {args.latency_ms:.0f}ms")
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            seed(args.patients, args.tenants)
+            profile_cache.invalidate()
+            for key in server.stats:
+                server.stats[key] = 0
+
+            started = time.perf_counter()
+            updated = batches = 0
+            while True:
+                counts = enrich_profiles(batch_size=batch_size)
+                if not counts["claimed"]:
+                    break
+                updated += counts["updated"]
+                batches += 1
+            elapsed = time.perf_counter() - started
+
+            missing = db.session.execute(db.text(
+                "SELECT count(*) FROM patients WHERE display_name IS NULL"
+            )).scalar()
+            db.session.rollback()
+            print(f"  batch {batch_size:4d}: {elapsed:6.2f}s  {updated / elapsed:7,.0f} profiles/s  "
+                  f"{batches} batches  API calls {server.stats['requests']:,}  without name {missing}")
+
+
+if __name__ == "__main__":
+    main()
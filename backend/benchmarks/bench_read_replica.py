@@ -0,0 +1,182 @@
+"""読み取りのレプリカ振り分け（2台のローカル PostgreSQL で確認）
+
+    BENCH_DATABASE_URL=postgresql://...:5433/medcrm_bench \\
+    BENCH_REPLICA_DATABASE_URL=postgresql://...:5434/medcrm_bench \\
+        python -m benchmarks.bench_read_replica --requests 2000
+
+BENCH_REPLICA_DATABASE_URL はベンチマーク用DBのストリーミングレプリカ
+（pg_basebackup -R で作成したもの）。次の3つを順に確認する。
+
+1. 振り分け: ダッシュボード・患者一覧・本日の来院・テンプレート一覧への GET と
+   患者の更新（PATCH）を混ぜて送り、プライマリ・レプリカそれぞれで実行された SQL 文の数を数える
+2. read-your-writes: レプリカの WAL 適用を止めた状態で患者名を更新し、
+   同じクリニックの別のクライアント（別のスタッフのブラウザ）の直後の一覧に
+   新しい名前が出ること（レプリカが適用するまでプライマリで読む）
+3. 遅延時のフォールバック: WAL 適用を止めたまま DB_REPLICA_MAX_LAG_SECONDS を超えると
+   他のテナントの読み取りもプライマリに戻り、適用を再開するとレプリカに戻ること
+"""
+import argparse
+import os
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants
+
+REPLICA_DATABASE_URL = os.getenv("BENCH_REPLICA_DATABASE_URL")
+
+READS = ("/api/dashboard/stats", "/api/dashboard/trends", "/api/patients/", "/api/visits/today", "/api/templates/")
+
+
+def seed(tenants: int, patients: int) -> list:
+    from app import db
+    from services.stats_service import rebuild_daily_stats
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    db.session.execute(db.text("""
+        INSERT INTO patients (id, tenant_id, line_user_id, display_name, status, created_at, updated_at)
+        SELECT gen_random_uuid(), (CAST(:tenant_ids AS uuid[]))[1 + i % :tenants], 'U' || i, '患者' || i,
+               'active', now() - (i % 365) * interval '1 day', now()
+        FROM generate_series(0, :patients - 1) AS i
+    """), {"tenant_ids": [str(t) for t in tenant_ids], "tenants": tenants, "patients": patients})
+    db.session.execute(db.text("""
+        INSERT INTO visits (id, patient_id, visit_date, aftercare_sent)
+        SELECT gen_random_uuid(), id, now() - (random() * 365) * interval '1 day', true FROM patients
+    """))
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    rebuild_daily_stats()
+    db.session.commit()
+    return [str(t) for t in tenant_ids]
+
+
+def replica_sql(sql: str):
+    from sqlalchemy import create_engine
+
+    engine = create_engine(REPLICA_DATABASE_URL)
+    with engine.connect() as connection:
+        result = connection.exec_driver_sql(sql).scalar()
+    engine.dispose()
+    return result
+
+
+def wait_for_replica(timeout: float = 60):
+    """プライマリの現在の WAL 位置までレプリカが適用するのを待つ"""
+    from app import db
+
+    lsn = db.session.execute(db.text("SELECT pg_current_wal_lsn()")).scalar()
+    db.session.rollback()
+    deadline = time.time() + timeout
+    while replica_sql(f"SELECT pg_last_wal_replay_lsn() >= '{lsn}'") is not True:
+        if time.time() > deadline:
+            raise RuntimeError("replica did not catch up")
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=20, help="この件数ごとに1回患者を更新")
+    args = parser.parse_args()
+
+    if not REPLICA_DATABASE_URL:
+        parser.error("BENCH_REPLICA_DATABASE_URL is required")
+    os.environ["DATABASE_REPLICA_URLS"] = REPLICA_DATABASE_URL
+    os.environ.setdefault("DB_REPLICA_MAX_LAG_SECONDS", "1")
+    os.environ.setdefault("DB_REPLICA_CHECK_INTERVAL", "0.2")
+
+    from sqlalchemy import event
+
+    app = bench_app()
+    with app.app_context():
+        from app import db
+        from services.db_pool import (
+            DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_STICKY_SECONDS, JOBS_BIND, REPLICA_BINDS, REPLICA_LAG_SQL,
+            replica_monitor
+        )
+
+        tenant_ids = seed(args.tenants, args.patients)
+        # クリニックごとに別のクライアント（ブラウザ）
+        clients = {tenant_id: app.test_client() for tenant_id in tenant_ids}
+        patient_ids = {
+            str(tenant_id): str(patient_id) for tenant_id, patient_id in db.session.execute(db.text(
+                "SELECT DISTINCT ON (tenant_id) tenant_id, id FROM patients ORDER BY tenant_id, id"
+            ))
+        }
+        db.session.rollback()
+        wait_for_replica()
+
+        statements = {"primary": 0, "replica": 0}
+        # ベンチマークのスレッドはジョブ用のプールを使うので、プライマリは Web・ジョブ用の両方を数える
+        # （レプリカの遅延確認は数えない）
+        def count(name):
+            def listener(connection, cursor, statement, *args):
+                if statement != REPLICA_LAG_SQL:
+                    statements[name] += 1
+            return listener
+
+        engines = [("primary", db.engines[None]), ("primary", db.engines[JOBS_BIND])]
+        for name, engine in engines + [("replica", db.engines[bind]) for bind in REPLICA_BINDS]:
+            event.listen(engine, "before_cursor_execute", count(name))
+
+    print(f"{args.tenants} clinics, {args.patients:,} patients, max lag {DB_REPLICA_MAX_LAG_SECONDS:g}s, "
+          f"read-your-writes {DB_REPLICA_STICKY_SECONDS:g}s")
+
+    # 1. 振り分け
+    started = time.perf_counter()
+    errors = 0
+    for i in range(args.requests):
+        write = i % args.write_every == 0
+        # 書き込むテナントは順に替え、その直後の同じテナントの読み取りが書き込み時点の WAL 位置を見るようにする
+        tenant_id = tenant_ids[(i // args.write_every if write else i) % len(tenant_ids)]
+        headers = {"X-Tenant-ID": tenant_id}
+        client = clients[tenant_id]
+        if write:
+            response = client.patch(f"/api/patients/{patient_ids[tenant_id]}", json={"display_name": f"更新{i}"},
+                                    headers=headers)
+        else:
+            response = client.get(READS[i % len(READS)], headers=headers)
+        errors += response.status_code != 200
+    elapsed = time.perf_counter() - started
+    total = sum(statements.values())
+    print(f"1. {args.requests:,} requests ({args.requests // args.write_every} writes) in {elapsed:.1f}s, errors {errors}: "
+          f"primary {statements['primary']:,} SQL ({statements['primary'] / total:.0%}), "
+          f"replica {statements['replica']:,} SQL ({statements['replica'] / total:.0%})")
+    print(f"   {replica_monitor.stats()}")
+
+    # 2. read-your-writes（WAL 適用を止めてレプリカが古いままの状態で確認）
+    time.sleep(DB_REPLICA_STICKY_SECONDS)
+    replica_sql("SELECT pg_wal_replay_pause()")
+    try:
+        writer, other = tenant_ids[0], tenant_ids[1]
+        clients[writer].patch(f"/api/patients/{patient_ids[writer]}", json={"display_name": "読み取り確認"},
+                              headers={"X-Tenant-ID": writer})
+        # 書き込んだのとは別のクライアント（Cookie などを共有しない）で読む
+        names = [p["display_name"] for p in app.test_client().get(
+            "/api/patients/?search=読み取り確認", headers={"X-Tenant-ID": writer}).get_json()["patients"]]
+        on_replica = replica_sql(f"SELECT display_name FROM patients WHERE id = '{patient_ids[writer]}'")
+        print(f"2. after PATCH: another client of the same clinic sees the new name: {'読み取り確認' in names} "
+              f"(replica still has {on_replica!r})")
+
+        # 3. 遅延時のフォールバック
+        before = statements.copy()
+        time.sleep(DB_REPLICA_MAX_LAG_SECONDS + 0.5)
+        clients[other].get("/api/dashboard/stats", headers={"X-Tenant-ID": other})
+        print(f"3. replay paused for {DB_REPLICA_MAX_LAG_SECONDS + 0.5:g}s: another clinic's dashboard ran "
+              f"{statements['primary'] - before['primary']} SQL on primary, "
+              f"{statements['replica'] - before['replica']} on replica  {replica_monitor.stats()['replicas']}")
+    finally:
+        replica_sql("SELECT pg_wal_replay_resume()")
+
+    with app.app_context():
+        wait_for_replica()
+    time.sleep(0.5)
+    before = statements.copy()
+    clients[tenant_ids[2]].get("/api/dashboard/stats", headers={"X-Tenant-ID": tenant_ids[2]})
+    print(f"   replay resumed: {statements['primary'] - before['primary']} SQL on primary, "
+          f"{statements['replica'] - before['replica']} on replica")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""process_recall のメモリ使用量ベンチマーク（休眠患者を大量に持つテナント）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_recall --patients 1000000
+
+キーセットで500件ずつ走査するため、ピークメモリは患者数に依存しない。
+"""
+import argparse
+import os
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched, peak_rss_mb, timed
+from benchmarks.line_stub_server import start_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=1000000)
+    args = parser.parse_args()
+
+    server, os.environ["LINE_API_BASE"] = start_in_thread(port=0)
+    app = bench_app()
+    with app.app_context():
+        from models.patient import Patient
+        from models.message_template import MessageTemplate
+        from services.outbox_service import dispatch_pending
+        from services.scheduler_service import process_recall
+
+        reset_tables()
+        tenant_id = seed_tenants(1)[0]
+        insert_batched(MessageTemplate, [{
+            "id": uuid.uuid4(),
+            "tenant_id": tenant_id,
+            "type": "recall",
+            "name": "休眠患者呼び戻し",
+            "content": "お元気でいらっしゃいますか？",
+            "is_active": True,
+            "created_at": datetime.utcnow()
+        }])
+        base = datetime.utcnow() - timedelta(days=400)
+        insert_batched(Patient, ({
+            "id": uuid.uuid4(),
+            "tenant_id": tenant_id,
+            "line_user_id": f"U{i:032d}",
+            "status": "active",
+            "last_visit_at": base + timedelta(seconds=i % 86400 * 100),
+            "created_at": base
+        } for i in range(args.patients)))
+
+        rss_before = peak_rss_mb()
+        tracemalloc.start()
+        with timed(f"process_recall ({args.patients} dormant patients)"):
+            process_recall()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with timed("outbox dispatch"):
+            while sum(dispatch_pending().values()):
+                pass
+
+        print(f"LINE requests: {server.stats['requests']}, recipients: {server.stats['messages']}")
+        print(f"python heap peak during job: {peak / 1024 / 1024:.1f} MB")
+        print(f"peak RSS: {rss_before:.0f} MB before job, {peak_rss_mb():.0f} MB after")
+
+
+if __name__ == "__main__":
+    main()
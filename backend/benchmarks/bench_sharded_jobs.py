@@ -0,0 +1,121 @@
+"""アフターフォロー・リコールのシャード並列実行ベンチマーク
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_sharded_jobs --tenants 200 --workers 1,4,8
+
+--tenants 件のテナントそれぞれにアフターフォロー対象の来院と休眠患者を作成し、
+JOB_SHARD_WORKERS ごとのジョブ時間（アウトボックスへの書き込みまで）を計測する
+（1 がテナントを1スレッドで順に処理する従来方式相当）。
+最後に1テナントだけ来院の更新が失敗するトリガーを入れ、他のテナントの処理が
+コミットされることを確認する。
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched
+
+
+def seed(tenants: int, visits_per_tenant: int, dormant_per_tenant: int) -> list:
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from models.message_template import MessageTemplate
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    insert_batched(MessageTemplate, ({
+        "id": uuid.uuid4(),
+        "tenant_id": tenant_id,
+        "type": template_type,
+        "name": template_type,
+        "content": "本日はご来院ありがとうございました。" if template_type == "aftercare" else "お元気でいらっしゃいますか？",
+        "is_active": True,
+        "created_at": datetime.utcnow()
+    } for tenant_id in tenant_ids for template_type in ("aftercare", "recall")))
+
+    visit_date = datetime.utcnow() - timedelta(hours=24)
+    dormant_date = datetime.utcnow() - timedelta(days=200)
+    patients = [{
+        "id": uuid.uuid4(),
+        "tenant_id": tenant_id,
+        "line_user_id": f"U{t:05d}{i:027d}",
+        "status": "active",
+        "last_visit_at": visit_date if i < visits_per_tenant else dormant_date,
+        "created_at": dormant_date
+    } for t, tenant_id in enumerate(tenant_ids) for i in range(visits_per_tenant + dormant_per_tenant)]
+    insert_batched(Patient, patients)
+    insert_batched(Visit, ({
+        "id": uuid.uuid4(),
+        "patient_id": p["id"],
+        "visit_date": visit_date,
+        "aftercare_sent": False
+    } for p in patients if p["last_visit_at"] == visit_date))
+    # 作り直した直後の統計情報のままだと結合計画が極端に悪くなる
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    return tenant_ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--visits-per-tenant", type=int, default=20)
+    parser.add_argument("--dormant-per-tenant", type=int, default=1200)
+    parser.add_argument("--workers", default="1,4,8", help="比較する JOB_SHARD_WORKERS（カンマ区切り）")
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        from app import db
+        from services import shard_executor
+        from services.scheduler_service import process_aftercare, process_recall
+
+        print(f"{args.tenants} tenants, {shard_executor.JOB_SHARDS} shards")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            shard_executor.JOB_SHARD_WORKERS = workers
+            seed(args.tenants, args.visits_per_tenant, args.dormant_per_tenant)
+            for name, job in (("aftercare", process_aftercare), ("recall", process_recall)):
+                started = time.perf_counter()
+                run = job()
+                elapsed = time.perf_counter() - started
+                slowest = max(s.seconds for s in run.shards)
+                print(f"  workers {workers:2d}  {name:10s} {elapsed:7.2f}s  rows {run.rows:7,}  "
+                      f"slowest shard {slowest:.2f}s")
+
+        # 1テナントだけ来院の更新が失敗しても、他のテナントの送信記録はコミットされる
+        tenant_ids = seed(args.tenants, args.visits_per_tenant, 0)
+        broken = tenant_ids[0]
+        db.session.execute(db.text("""
+            CREATE FUNCTION bench_fail_visit_update() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.patient_id IN (SELECT id FROM patients WHERE tenant_id = TG_ARGV[0]::uuid) THEN
+                    RAISE EXCEPTION 'bench: injected failure';
+                END IF;
+                RETURN NEW;
+            END $$ LANGUAGE plpgsql
+        """))
+        db.session.execute(db.text(
+            f"CREATE TRIGGER bench_fail_visit_update BEFORE UPDATE ON visits "
+            f"FOR EACH ROW EXECUTE FUNCTION bench_fail_visit_update('{broken}')"
+        ))
+        db.session.commit()
+        try:
+            run = process_aftercare()
+            sent = dict(db.session.execute(db.text("""
+                SELECT p.tenant_id = :broken, count(*) FILTER (WHERE v.aftercare_sent)
+                FROM visits v JOIN patients p ON p.id = v.patient_id GROUP BY 1
+            """), {"broken": str(broken)}).all())
+            db.session.rollback()
+        finally:
+            db.session.execute(db.text("DROP TRIGGER bench_fail_visit_update ON visits"))
+            db.session.execute(db.text("DROP FUNCTION bench_fail_visit_update()"))
+            db.session.commit()
+        print(f"failure isolation: failed tenants {run.failed_tenants}, "
+              f"visits sent for other tenants {sent[False]:,}, for the failing tenant {sent[True]}")
+        assert run.failed_tenants == [str(broken)]
+        assert sent[False] == (args.tenants - 1) * args.visits_per_tenant and sent[True] == 0
+
+
+if __name__ == "__main__":
+    main()
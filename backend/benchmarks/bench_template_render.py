@@ -0,0 +1,87 @@
+"""テンプレート展開の速度比較（DB 不要）
+
+    python -m benchmarks.bench_template_render --messages 1000000
+
+--clinics 件のクリニックに患者 --messages 人を割り当て、各クリニックのテンプレートで本文を展開する。
+
+- replace: 1通ごとにプレースホルダーを str.replace で置き換え、日付も1通ずつ変換（従来方式相当）
+- compiled: 解析済みテンプレートにクリニック共通の値を埋め込み、患者ごとの値を列で用意して一括展開
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from benchmarks._common import peak_rss_mb
+
+TEMPLATES = (
+    "{name}さん、{clinic_name}です。{last_visit_date}はご来院ありがとうございました。",
+    "{clinic_name}です。{name}さん、前回のご来院（{last_visit_date}）から3か月が経ちました。",
+    "{clinic_name}より：本日はご来院ありがとうございました。お大事になさってください。",
+)
+
+PatientRow = namedtuple("PatientRow", ["display_name", "last_visit_at"])
+
+
+def make_patients(count: int) -> list:
+    rng = random.Random(0)
+    base = datetime(2026, 1, 1)
+    return [
+        PatientRow(f"患者{i}" if i % 10 else None, base + timedelta(minutes=rng.randrange(300 * 24 * 60)))
+        for i in range(count)
+    ]
+
+
+def render_replace(content: str, patients: list, clinic_name: str, tz_name: str) -> list:
+    """従来方式相当：1通ごとに置き換え"""
+    tz = ZoneInfo(tz_name)
+    messages = []
+    for p in patients:
+        day = p.last_visit_at.replace(tzinfo=timezone.utc).astimezone(tz).date()
+        messages.append(
+            content.replace("{name}", p.display_name or "患者様")
+            .replace("{clinic_name}", clinic_name)
+            .replace("{last_visit_date}", f"{day.month}月{day.day}日")
+        )
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--clinics", type=int, default=200)
+    args = parser.parse_args()
+
+    from services.message_render import compile_template, render_batch
+
+    patients = make_patients(args.messages)
+    per_clinic = -(-len(patients) // args.clinics)
+    batches = [
+        (TEMPLATES[i % len(TEMPLATES)], f"クリニック{i}", patients[i * per_clinic:(i + 1) * per_clinic])
+        for i in range(args.clinics)
+    ]
+    print(f"{args.messages:,} messages, {args.clinics} clinics")
+
+    results = {}
+    for label in ("replace", "compiled"):
+        started = time.perf_counter()
+        rendered = []
+        for content, clinic_name, batch in batches:
+            if label == "replace":
+                rendered.extend(render_replace(content, batch, clinic_name, "Asia/Tokyo"))
+            else:
+                # 保存時・キャッシュ読み込み時と同じくクリニックごとに1回だけ解析
+                template = compile_template(content)
+                rendered.extend(render_batch(template, batch, clinic_name=clinic_name, tz_name="Asia/Tokyo"))
+        elapsed = time.perf_counter() - started
+        results[label] = rendered
+        print(f"  {label:8s} {elapsed:6.2f}s  {len(rendered) / elapsed:12,.0f} messages/s  "
+              f"peak RSS {peak_rss_mb():,.0f}MB")
+
+    assert results["replace"] == results["compiled"], "rendered messages differ"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""来院一括登録のベンチマーク（患者ごとのクエリ vs 集合演算）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_visits_bulk --ids 2000
+
+1リクエストで --ids 件の患者IDを送る。1割は登録済み（同日重複）、1割は他テナントの患者。
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched
+
+
+def legacy_register(patient_ids: list, visit_datetime: datetime, day_start: datetime, day_end: datetime) -> int:
+    """従来方式：患者ごとに取得・重複チェックして1件ずつ追加"""
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+
+    created = 0
+    for patient_id in patient_ids:
+        patient = Patient.query.get(patient_id)
+        if not patient:
+            continue
+        existing = Visit.query.filter(
+            Visit.patient_id == patient_id,
+            Visit.visit_date >= day_start,
+            Visit.visit_date < day_end
+        ).first()
+        if existing:
+            continue
+        db.session.add(Visit(patient_id=patient_id, visit_date=visit_datetime))
+        patient.last_visit_at = visit_datetime
+        created += 1
+    db.session.commit()
+    return created
+
+
+def seed(ids: int) -> tuple:
+    from models.patient import Patient
+    from models.visit import Visit
+    from services.clinic_time import DEFAULT_TIMEZONE, day_range, local_today
+
+    reset_tables()
+    tenant_id, other_tenant_id = seed_tenants(2)
+    now = datetime.utcnow()
+    patients = [{
+        "id": uuid.uuid4(),
+        "tenant_id": other_tenant_id if i % 10 == 9 else tenant_id,
+        "line_user_id": f"U{i:032d}",
+        "status": "active",
+        "created_at": now
+    } for i in range(ids)]
+    insert_batched(Patient, patients)
+    day_start, _ = day_range(local_today(DEFAULT_TIMEZONE), DEFAULT_TIMEZONE)
+    insert_batched(Visit, ({
+        "id": uuid.uuid4(),
+        "patient_id": p["id"],
+        "visit_date": day_start,
+        "aftercare_sent": True
+    } for i, p in enumerate(patients) if i % 10 == 0))
+    return tenant_id, [str(p["id"]) for p in patients]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ids", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app = bench_app()
+    client = app.test_client()
+    with app.app_context():
+        from services.clinic_time import DEFAULT_TIMEZONE, day_range, local_date_of
+
+        for label in ("per-patient", "set-based"):
+            total = 0.0
+            for _ in range(args.repeat):
+                tenant_id, patient_ids = seed(args.ids)
+                started = time.perf_counter()
+                if label == "per-patient":
+                    visit_datetime = datetime.utcnow()
+                    day_start, day_end = day_range(local_date_of(visit_datetime, DEFAULT_TIMEZONE), DEFAULT_TIMEZONE)
+                    created = legacy_register(patient_ids, visit_datetime, day_start, day_end)
+                else:
+                    response = client.post("/api/visits/bulk", json={"patient_ids": patient_ids},
+                                           headers={"X-Tenant-ID": str(tenant_id)})
+                    created = response.get_json()["created"]
+                total += time.perf_counter() - started
+            print(f"{label:12s} {args.ids:,} IDs/request: {total / args.repeat * 1000:8.1f} ms  "
+                  f"(created {created:,})")
+
+
+if __name__ == "__main__":
+    main()
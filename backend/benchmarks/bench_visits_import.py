@@ -0,0 +1,131 @@
+"""来院履歴インポートのベンチマーク（1行ずつ ORM vs COPY + 集合演算）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_visits_import --rows 1000000
+
+--patients 人の患者（半数は患者番号で照合）に対し、電子カルテ出力相当の CSV（--rows 行、
+1%は未登録の患者）を一時ファイルに書き出してインポートする。
+従来方式は1行ずつ患者を検索して来院記録を追加するもので、--baseline-rows 行で計測する。
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, timed
+
+
+def seed(patients: int):
+    from app import db
+
+    reset_tables()
+    tenant_id = seed_tenants(1)[0]
+    db.session.execute(db.text("""
+        INSERT INTO patients (id, tenant_id, line_user_id, external_id, status, created_at, updated_at)
+        SELECT gen_random_uuid(), :tenant_id, 'U' || i,
+               CASE WHEN i % 2 = 0 THEN 'K' || i END, 'active', now(), now()
+        FROM generate_series(1, :patients) AS i
+    """), {"tenant_id": str(tenant_id), "patients": patients})
+    db.session.execute(db.text("ANALYZE patients"))
+    db.session.commit()
+    return tenant_id
+
+
+def write_csv(path: str, rows: int, patients: int):
+    """電子カルテ出力相当の CSV（日付は "2024/1/5 9:30" 形式）"""
+    rng = random.Random(0)
+    start = datetime(2019, 1, 1, 9, 0)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("line_user_id,external_id,visit_date,notes\n")
+        for _ in range(rows):
+            i = rng.randint(1, patients)
+            if rng.random() < 0.01:
+                i += patients  # 未登録の患者
+            visit = start + timedelta(days=rng.randint(0, 365 * 5), minutes=rng.randint(0, 600))
+            key = f",K{i}" if i % 2 == 0 else f"U{i},"
+            f.write(f"{key},{visit.year}/{visit.month}/{visit.day} {visit.hour}:{visit.minute:02d},定期検診\n")
+
+
+def legacy_import(tenant_id, path: str, limit: int) -> int:
+    """従来方式相当：1行ずつ患者を検索して同日チェックし ORM で追加"""
+    import csv
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from services.clinic_time import DEFAULT_TIMEZONE, day_range, local_date_of
+    from services.import_service import parse_visit_datetime
+
+    created = 0
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        for n, row in enumerate(reader):
+            if n >= limit:
+                break
+            query = Patient.query.filter_by(tenant_id=tenant_id)
+            if row["external_id"]:
+                patient = query.filter_by(external_id=row["external_id"]).first()
+            else:
+                patient = query.filter_by(line_user_id=row["line_user_id"]).first()
+            if not patient:
+                continue
+            local = parse_visit_datetime(row["visit_date"])
+            visit_date = local.replace(tzinfo=ZoneInfo(DEFAULT_TIMEZONE)).astimezone(timezone.utc).replace(tzinfo=None)
+            day_start, day_end = day_range(local_date_of(visit_date, DEFAULT_TIMEZONE), DEFAULT_TIMEZONE)
+            if Visit.query.filter(Visit.patient_id == patient.id, Visit.visit_date >= day_start,
+                                  Visit.visit_date < day_end).first():
+                continue
+            db.session.add(Visit(patient_id=patient.id, visit_date=visit_date, aftercare_sent=True, notes=row["notes"]))
+            if not patient.last_visit_at or patient.last_visit_at < visit_date:
+                patient.last_visit_at = visit_date
+            created += 1
+    db.session.commit()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--patients", type=int, default=100000)
+    parser.add_argument("--baseline-rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        from app import db
+        from services.import_service import import_visits
+
+        path = os.path.join(tmp, "visits.csv")
+        with timed(f"write CSV ({args.rows:,} rows)"):
+            write_csv(path, args.rows, args.patients)
+
+        tenant_id = seed(args.patients)
+        started = time.perf_counter()
+        created = legacy_import(tenant_id, path, args.baseline_rows)
+        elapsed = time.perf_counter() - started
+        print(f"{'per-row ORM':14s} {args.baseline_rows:>10,} rows  {args.baseline_rows / elapsed:>9,.0f} rows/s  "
+              f"{elapsed:7.2f}s  (imported {created:,})")
+
+        tenant_id = seed(args.patients)
+        started = time.perf_counter()
+        with open(path, encoding="utf-8", newline="") as stream:
+            result = import_visits(tenant_id, stream, progress=lambda rows: print(
+                f"  {rows:,} rows read ({time.perf_counter() - started:.1f}s)"))
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        print(f"{'COPY + merge':14s} {result.rows:>10,} rows  {result.rows / elapsed:>9,.0f} rows/s  "
+              f"{elapsed:7.2f}s  (imported {result.imported:,}, duplicates {result.duplicates:,}, "
+              f"unmatched {result.unmatched:,})")
+
+        # 同じファイルの再実行はすべて重複としてスキップされる
+        started = time.perf_counter()
+        with open(path, encoding="utf-8", newline="") as stream:
+            again = import_visits(tenant_id, stream)
+        db.session.commit()
+        print(f"{'re-import':14s} {again.rows:>10,} rows  {time.perf_counter() - started:7.2f}s  "
+              f"(imported {again.imported:,})")
+
+
+if __name__ == "__main__":
+    main()
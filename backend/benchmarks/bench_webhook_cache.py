@@ -0,0 +1,77 @@
+"""Webhook のテナント・テンプレートキャッシュのベンチマーク
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_webhook_cache --events 2000
+
+メッセージイベントを1件ずつ Webhook に送り、キャッシュ無効・有効それぞれで
+1リクエストあたりの SQL 実行数と処理時間を比較する。LINE API はローカルスタブ。
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched
+from benchmarks.line_stub_server import start_in_thread
+
+
+def run(client, tenant_ids: list, events: int, statements: list) -> tuple:
+    statements.clear()
+    started = time.perf_counter()
+    for i in range(events):
+        tenant_id = tenant_ids[i % len(tenant_ids)]
+        client.post(f"/api/webhook/line/{tenant_id}", json={"events": [{
+            "type": "message",
+            "source": {"userId": f"U{i % 100}"},
+            "replyToken": f"r{i}",
+            "message": {"type": "text", "text": "薬が合わない気がします" if i % 5 == 0 else "ありがとうございます"}
+        }]})
+    elapsed = time.perf_counter() - started
+    return len(statements) / events, elapsed / events * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--tenants", type=int, default=20)
+    args = parser.parse_args()
+
+    server, os.environ["LINE_API_BASE"] = start_in_thread(port=0)
+    app = bench_app()
+    with app.app_context():
+        from sqlalchemy import event
+        from app import db
+        from models.message_template import MessageTemplate
+        from services.cache_service import tenant_cache, template_cache, cache_stats
+
+        reset_tables()
+        tenant_ids = seed_tenants(args.tenants)
+        insert_batched(MessageTemplate, ({
+            "id": uuid.uuid4(),
+            "tenant_id": tenant_id,
+            "type": template_type,
+            "name": template_type,
+            "content": f"{template_type} message",
+            "is_active": True,
+            "created_at": datetime.utcnow()
+        } for tenant_id in tenant_ids for template_type in ("alert_reply", "default_reply")))
+
+        statements = []
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    client = app.test_client()
+    ttl = tenant_cache.ttl
+    for label, cache_ttl in (("cache off", 0), ("cache on ", ttl or 60)):
+        tenant_cache.ttl = template_cache.ttl = cache_ttl
+        tenant_cache.invalidate()
+        template_cache.invalidate()
+        per_event, ms = run(client, tenant_ids, args.events, statements)
+        print(f"{label}: {per_event:.2f} SQL statements/event, {ms:.2f} ms/event")
+
+    print("cache stats:", cache_stats())
+    print(f"LINE requests: {server.stats['requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Webhook 応答レイテンシのベンチマーク（sync: リクエスト内処理 vs queue: キュー保存のみ）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_webhook_latency --rate 500 --latency-ms 200
+
+モードごとにアプリ（werkzeug のスレッドサーバーを複数プロセス）と遅い LINE API スタブ、
+queue モードではワーカープロセスも起動し、
+一定レートでリクエストを送り続けて（オープンループ）応答時間の分布を測る。
+レイテンシは送信予定時刻から数えるので、サーバーが詰まった分もそのまま反映される。
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched
+
+MODES = ("sync", "queue")
+
+
+def serve(port: int, latency_ms: float):
+    """ベンチマーク対象のアプリを起動（子プロセス。同じポートを SO_REUSEPORT で共有）"""
+    from werkzeug.serving import make_server
+    from benchmarks.line_stub_server import start_in_thread
+
+    _, os.environ["LINE_API_BASE"] = start_in_thread(port=0, latency_ms=latency_ms)
+    app = bench_app()
+
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(1024)
+    make_server("127.0.0.1", port, app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+def work(latency_ms: float):
+    """キューのワーカーを起動（子プロセス。flask webhook-worker 相当）"""
+    from benchmarks.line_stub_server import start_in_thread
+
+    _, os.environ["LINE_API_BASE"] = start_in_thread(port=0, latency_ms=latency_ms)
+    app = bench_app()
+
+    from services.webhook_queue import start_worker_pool
+    start_worker_pool(app)
+    while True:
+        time.sleep(1)
+
+
+def seed(tenants: int) -> list:
+    import uuid
+    from datetime import datetime
+
+    app = bench_app()
+    with app.app_context():
+        from models.message_template import MessageTemplate
+
+        reset_tables()
+        tenant_ids = seed_tenants(tenants)
+        insert_batched(MessageTemplate, ({
+            "id": uuid.uuid4(),
+            "tenant_id": tenant_id,
+            "type": "default_reply",
+            "name": "通常応答",
+            "content": "お大事になさってください。",
+            "is_active": True,
+            "created_at": datetime.utcnow()
+        } for tenant_id in tenant_ids))
+    return [str(t) for t in tenant_ids]
+
+
+async def load(base_url: str, tenant_ids: list, rate: float, duration: float) -> tuple:
+    """一定レートで Webhook を送信し、(レイテンシ一覧, エラー数) を返す"""
+    import aiohttp
+
+    latencies, errors = [], 0
+    interval = 1 / rate
+    total = int(rate * duration)
+
+    async def send(session, i, scheduled):
+        nonlocal errors
+        tenant_id = tenant_ids[i % len(tenant_ids)]
+        body = {"events": [{
+            "type": "message",
+            "source": {"userId": f"U{i:08d}"},
+            "replyToken": f"r{i}",
+            "message": {"type": "text", "text": "ありがとうございます"}
+        }]}
+        try:
+            async with session.post(f"{base_url}/api/webhook/line/{tenant_id}", json=body) as response:
+                await response.read()
+                if response.status != 200:
+                    errors += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors += 1
+        latencies.append(time.perf_counter() - scheduled)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            scheduled = started + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(session, i, scheduled)))
+        await asyncio.gather(*tasks)
+    return latencies, errors
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def wait_until_listening(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def wait_until_drained(base_url: str, timeout: float = 600) -> float:
+    """キューの未処理イベントがなくなるまで待ち、かかった秒数を返す"""
+    import json
+    from urllib.request import urlopen
+
+    started = time.time()
+    while time.time() - started < timeout:
+        with urlopen(f"{base_url}/api/system/webhook") as response:
+            if json.load(response)["pending"] == 0:
+                break
+        time.sleep(0.5)
+    return time.time() - started
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=500, help="リクエスト/秒")
+    parser.add_argument("--duration", type=float, default=10, help="送信する秒数")
+    parser.add_argument("--latency-ms", type=float, default=200, help="LINE API スタブの応答遅延")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=4, help="Webサーバーのプロセス数")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--work", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.latency_ms)
+        return
+    if args.work:
+        work(args.latency_ms)
+        return
+
+    for mode in MODES:
+        tenant_ids = seed(args.tenants)
+        port = free_port()
+        env = {**os.environ, "LINE_WEBHOOK_MODE": mode}
+        command = [sys.executable, "-m", "benchmarks.bench_webhook_latency", "--latency-ms", str(args.latency_ms)]
+        children = [
+            subprocess.Popen(command + ["--serve", str(port)], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for _ in range(args.processes)
+        ]
+        if mode == "queue":
+            children.append(subprocess.Popen(command + ["--work"], env=env,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        try:
+            wait_until_listening(port)
+            time.sleep(2)  # 全プロセスの起動待ち
+            base_url = f"http://127.0.0.1:{port}"
+            latencies, errors = asyncio.run(load(base_url, tenant_ids, args.rate, args.duration))
+            drain = wait_until_drained(base_url) if mode == "queue" else 0.0
+        finally:
+            for child in children:
+                child.terminate()
+                child.wait()
+
+        ms = [v * 1000 for v in latencies]
+        print(f"{mode:5s} {len(ms):,} req @ {args.rate:.0f} req/s (LINE +{args.latency_ms:.0f}ms): "
+              f"p50 {percentile(ms, 0.5):8.1f} ms  p99 {percentile(ms, 0.99):8.1f} ms  "
+              f"max {max(ms):8.1f} ms  errors {errors}"
+              + (f"  queue drained {drain:.1f}s after load" if mode == "queue" else ""))
+
+
+if __name__ == "__main__":
+    main()
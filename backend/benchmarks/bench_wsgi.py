@@ -0,0 +1,154 @@
+"""gunicorn のワーカークラスごとのスループット（wsgi.py + gunicorn.conf.py）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_wsgi --worker-classes sync,gthread,gevent
+
+ワーカークラスごとに本番と同じ設定（gunicorn.conf.py）で gunicorn を起動し、
+--concurrency 本の接続から Webhook（メッセージ受信）・患者一覧・ダッシュボード統計への
+リクエストを --duration 秒間送り続けて（クローズドループ）req/s と応答時間を測る。
+DB はベンチマーク用DB、LINE API はスタブ（--latency-ms の応答遅延あり）で、
+アウトボックスのディスパッチャーは各ワーカープロセス内で動く。
+ワーカー数は GUNICORN_WORKERS（省略時は gunicorn.conf.py の既定値）。
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks._common import bench_app, insert_batched, reset_tables, seed_tenants
+from benchmarks.bench_webhook_latency import free_port, percentile, wait_until_listening
+from benchmarks.line_stub_server import start_in_thread
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (名前, メソッド, パス) — 順に繰り返し送る
+REQUESTS = (
+    ("webhook", "POST", "/api/webhook/line/{tenant_id}"),
+    ("patients", "GET", "/api/patients/?per_page=50"),
+    ("dashboard", "GET", "/api/dashboard/stats"),
+)
+
+
+def seed(tenants: int, patients: int) -> list:
+    import uuid
+    from datetime import datetime
+
+    from app import db
+    from models.message_template import MessageTemplate
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    db.session.execute(db.text("""
+        INSERT INTO patients (id, tenant_id, line_user_id, display_name, status, created_at, updated_at)
+        SELECT gen_random_uuid(), (CAST(:tenant_ids AS uuid[]))[1 + i % :tenants], 'U' || i, '患者' || i,
+               'active', now() - i * interval '1 minute', now()
+        FROM generate_series(0, :patients - 1) AS i
+    """), {"tenant_ids": [str(t) for t in tenant_ids], "tenants": tenants, "patients": patients})
+    insert_batched(MessageTemplate, ({
+        "id": uuid.uuid4(),
+        "tenant_id": tenant_id,
+        "type": "default_reply",
+        "name": "通常応答",
+        "content": "{name}さん、お大事になさってください。",
+        "is_active": True,
+        "created_at": datetime.utcnow()
+    } for tenant_id in tenant_ids))
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    return [str(t) for t in tenant_ids]
+
+
+async def load(base_url: str, tenant_ids: list, concurrency: int, duration: float) -> dict:
+    """concurrency 本の接続でリクエストを送り続け、種類ごとの応答時間とエラー数を返す"""
+    import aiohttp
+
+    latencies = {name: [] for name, _, _ in REQUESTS}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(n: int, session):
+        nonlocal errors
+        i = n
+        while time.perf_counter() < deadline:
+            name, method, path = REQUESTS[i % len(REQUESTS)]
+            tenant_id = tenant_ids[i % len(tenant_ids)]
+            kwargs = {"headers": {"X-Tenant-ID": tenant_id}}
+            if name == "webhook":
+                kwargs["json"] = {"events": [{
+                    "type": "message",
+                    "source": {"userId": f"U{i % 1000}"},
+                    "replyToken": f"r{n}-{i}",
+                    "message": {"type": "text", "text": "ありがとうございます"}
+                }]}
+            started = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path.format(tenant_id=tenant_id), **kwargs) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+            latencies[name].append(time.perf_counter() - started)
+            i += concurrency
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(client(n, session) for n in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker-classes", default="sync,gthread,gevent", help="比較するワーカークラス（カンマ区切り）")
+    parser.add_argument("--concurrency", type=int, default=32, help="同時接続数")
+    parser.add_argument("--duration", type=float, default=15, help="送信する秒数")
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=50, help="LINE API スタブの応答遅延")
+    args = parser.parse_args()
+
+    server, line_api_base = start_in_thread(port=0, latency_ms=args.latency_ms)
+    app = bench_app()
+
+    print(f"{args.concurrency} connections, {args.duration:.0f}s per worker class, "
+          f"LINE latency {args.latency_ms:.0f}ms, {os.cpu_count()} CPUs")
+    for worker_class in args.worker_classes.split(","):
+        if worker_class == "gevent" and importlib.util.find_spec("gevent") is None:
+            print(f"  {worker_class:8s} skipped (gevent is not installed)")
+            continue
+        with app.app_context():
+            tenant_ids = seed(args.tenants, args.patients)
+
+        port = free_port()
+        env = {
+            **os.environ,
+            "LINE_API_BASE": line_api_base,
+            "GUNICORN_WORKER_CLASS": worker_class,
+            "GUNICORN_BIND": f"127.0.0.1:{port}",
+            "GUNICORN_ACCESS_LOG": "",
+        }
+        child = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_listening(port)
+            time.sleep(3)  # 全ワーカーの起動待ち
+            result = asyncio.run(load(f"http://127.0.0.1:{port}", tenant_ids, args.concurrency, args.duration))
+        finally:
+            child.terminate()
+            child.wait()
+
+        total = sum(len(values) for values in result["latencies"].values())
+        ms = {name: [v * 1000 for v in values] for name, values in result["latencies"].items()}
+        print(f"  {worker_class:8s} {total / args.duration:7,.0f} req/s  errors {result['errors']}  " + "  ".join(
+            f"{name} p50 {percentile(values, 0.5):6.1f}ms p99 {percentile(values, 0.99):6.1f}ms"
+            for name, values in ms.items() if values
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""ホットクエリの実行計画チェック（インデックスが使われることを確認）
+
+    BENCH_DATABASE_URL=postgresql://... python -m benchmarks.explain_hot_queries
+
+シードしたデータで EXPLAIN を取り、期待するインデックスが使われていなければ終了コード1。
+"""
+import argparse
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks._common import bench_app, reset_tables, seed_tenants, insert_batched
+
+TEMPLATE_TYPES = ("welcome", "aftercare", "default_reply", "alert_reply", "recall")
+
+
+def seed(tenants: int, patients_per_tenant: int):
+    """テナント・患者・来院・ログ・テンプレートを投入"""
+    from app import db
+    from models.patient import Patient
+    from models.visit import Visit
+    from models.message_log import MessageLog
+    from models.message_template import MessageTemplate
+
+    reset_tables()
+    tenant_ids = seed_tenants(tenants)
+    now = datetime.utcnow()
+
+    insert_batched(MessageTemplate, ({
+        "id": uuid.uuid4(),
+        "tenant_id": tenant_id,
+        "type": template_type,
+        "name": template_type,
+        "content": "content",
+        "is_active": True,
+        "created_at": now
+    } for tenant_id in tenant_ids for template_type in TEMPLATE_TYPES))
+
+    patients = [(uuid.uuid4(), tenant_id, i)
+                for tenant_id in tenant_ids for i in range(patients_per_tenant)]
+    insert_batched(Patient, ({
+        "id": patient_id,
+        "tenant_id": tenant_id,
+        "line_user_id": f"U{tenant_id.hex[:8]}{i:024d}",
+        "status": "active" if i % 10 else "blocked",
+        "last_visit_at": now - timedelta(days=i % 365),
+        "created_at": now - timedelta(days=i % 1000)
+    } for patient_id, tenant_id, i in patients))
+    insert_batched(Visit, ({
+        "id": uuid.uuid4(),
+        "patient_id": patient_id,
+        "visit_date": now - timedelta(days=i % 365, hours=i % 24),
+        "aftercare_sent": i % 365 > 1
+    } for patient_id, _, i in patients))
+    insert_batched(MessageLog, ({
+        "id": uuid.uuid4(),
+        "patient_id": patient_id,
+        "message_type": "recall",
+        "content": "content",
+        "status": "sent",
+        "sent_at": now - timedelta(days=(i + n) % 365)
+    } for patient_id, _, i in patients for n in range(2)))
+
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    return tenant_ids[0], patients[0][0]
+
+
+def hot_queries(tenant_id, patient_id) -> dict:
+    """名前 -> (ステートメント, 使われるべきインデックス候補)"""
+    from sqlalchemy import select, func
+    from models.patient import Patient
+    from models.visit import Visit
+    from models.message_log import MessageLog
+    from models.message_template import MessageTemplate
+    from services.clinic_time import DEFAULT_TIMEZONE, local_today, day_range
+
+    now = datetime.utcnow()
+    today_start, today_end = day_range(local_today(DEFAULT_TIMEZONE), DEFAULT_TIMEZONE)
+    return {
+        "scheduler: aftercare due visits": (
+            select(Visit.id).where(
+                Visit.visit_date >= now - timedelta(hours=25),
+                Visit.visit_date < now - timedelta(hours=23),
+                Visit.aftercare_sent == False
+            ),
+            {"ix_visits_aftercare_pending"}
+        ),
+        "scheduler: recall keyset page": (
+            select(Patient.id, Patient.line_user_id, Patient.last_visit_at).where(
+                Patient.tenant_id == tenant_id,
+                Patient.status == "active",
+                Patient.last_visit_at < now - timedelta(days=90)
+            ).order_by(Patient.last_visit_at, Patient.id).limit(500),
+            {"ix_patients_tenant_status_last_visit"}
+        ),
+        "dashboard: active patients": (
+            select(func.count()).select_from(Patient).where(
+                Patient.tenant_id == tenant_id, Patient.status == "active"
+            ),
+            {"ix_patients_tenant_status_last_visit"}
+        ),
+        "dashboard: today visits": (
+            select(func.count()).select_from(Visit).join(Patient).where(
+                Patient.tenant_id == tenant_id,
+                Visit.visit_date >= today_start,
+                Visit.visit_date < today_end
+            ),
+            {"ix_visits_visit_date", "ix_visits_patient_visit_date"}
+        ),
+        "dashboard: today messages": (
+            select(func.count()).select_from(MessageLog).join(Patient).where(
+                Patient.tenant_id == tenant_id,
+                MessageLog.sent_at >= today_start,
+                MessageLog.sent_at < today_end
+            ),
+            {"ix_message_logs_patient_sent_at"}
+        ),
+        "patients: list page": (
+            select(Patient).where(
+                Patient.tenant_id == tenant_id, Patient.status == "active"
+            ).order_by(Patient.created_at.desc()).limit(20),
+            {"ix_patients_tenant_created", "ix_patients_tenant_status_last_visit"}
+        ),
+        "patients: recent visits": (
+            select(Visit).where(Visit.patient_id == patient_id)
+            .order_by(Visit.visit_date.desc()).limit(10),
+            {"ix_visits_patient_visit_date"}
+        ),
+        "patients: message history": (
+            select(MessageLog).where(MessageLog.patient_id == patient_id)
+            .order_by(MessageLog.sent_at.desc()).limit(20),
+            {"ix_message_logs_patient_sent_at"}
+        ),
+        "webhook: template lookup": (
+            select(MessageTemplate).where(
+                MessageTemplate.tenant_id == tenant_id,
+                MessageTemplate.type == "welcome",
+                MessageTemplate.is_active == True
+            ).limit(1),
+            {"ix_message_templates_tenant_type_active"}
+        ),
+        "webhook: patient by LINE user": (
+            select(Patient.id).where(
+                Patient.tenant_id == tenant_id,
+                Patient.line_user_id == f"U{tenant_id.hex[:8]}{1:024d}"
+            ),
+            {"uq_tenant_line_user"}
+        ),
+    }
+
+
+def used_indexes(plan: dict) -> set:
+    """実行計画から使用インデックス名を収集"""
+    found = set()
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= used_indexes(child)
+    return found
+
+
+def check(queries: dict) -> bool:
+    from app import db
+
+    ok = True
+    for name, (statement, expected) in queries.items():
+        sql = statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        result = db.session.execute(db.text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        plan = (result if isinstance(result, list) else json.loads(result))[0]["Plan"]
+        found = used_indexes(plan)
+        passed = bool(found & expected)
+        ok = ok and passed
+        print(f"[{'OK' if passed else 'NG'}] {name}: {plan['Node Type']} "
+              f"using {', '.join(sorted(found)) or '-'} (expected {' / '.join(sorted(expected))})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--patients-per-tenant", type=int, default=500)
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        tenant_id, patient_id = seed(args.tenants, args.patients_per_tenant)
+        if not check(hot_queries(tenant_id, patient_id)):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""ローカル LINE Messaging API スタブサーバー
+
+    python -m benchmarks.line_stub_server --port 8081 --latency-ms 20 --throttle-rate 0.01
+
+アプリ側は LINE_API_BASE=http://localhost:8081/v2/bot を設定して利用する。
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LineStubHandler(BaseHTTPRequestHandler):
+    """keep-alive 対応のスタブハンドラー"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        
+        if server.latency:
+            time.sleep(server.latency)
+        
+        with server.lock:
+            server.stats["requests"] += 1
+            if self.headers.get("Connection", "").lower() != "close":
+                server.stats["keepalive_requests"] += 1
+        
+        # レート制限の擬似発生
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            with server.lock:
+                server.stats["throttled"] += 1
+            return self._respond(429, {"message": "Too Many Requests"}, {"Retry-After": "1"})
+        
+        # リトライキーの重複受付
+        retry_key = self.headers.get("X-Line-Retry-Key")
+        if retry_key:
+            with server.lock:
+                duplicate = retry_key in server.retry_keys
+                server.retry_keys.add(retry_key)
+            if duplicate:
+                return self._respond(409, {"message": "The retry key is already accepted"})
+        
+        path = self.path.split("?")[0]
+        if path.startswith("/v2/bot/message/"):
+            to = payload.get("to")
+            with server.lock:
+                server.stats["messages"] += len(to) if isinstance(to, list) else 1
+            return self._respond(200, {"sentMessages": [{"id": uuid.uuid4().hex}]})
+        if path.startswith("/v2/bot/profile/"):
+            user_id = path.rsplit("/", 1)[-1]
+            return self._respond(200, {
+                "userId": user_id,
+                "displayName": f"User {user_id[-6:]}",
+                "pictureUrl": f"https://profile.line-scdn.net/{user_id}"
+            })
+        if path == "/v2/bot/richmenu":
+            return self._respond(200, {"richMenuId": f"richmenu-{uuid.uuid4().hex}"})
+        return self._respond(200, {})
+
+    do_GET = _handle
+    do_POST = _handle
+    do_DELETE = _handle
+
+
+class LineStubServer(ThreadingHTTPServer):
+    """同時接続の多いベンチマーク向けに listen バックログを広げたサーバー"""
+
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # クライアント側の切断（ベンチマーク終了時など）は無視
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8081, latency_ms: float = 0, throttle_rate: float = 0):
+    """スタブサーバーを作成（serve_forever は呼び出し側で実行）"""
+    server = LineStubServer((host, port), LineStubHandler)
+    server.latency = latency_ms / 1000
+    server.throttle_rate = throttle_rate
+    server.lock = threading.Lock()
+    server.retry_keys = set()
+    server.stats = {"requests": 0, "keepalive_requests": 0, "messages": 0, "throttled": 0}
+    return server
+
+
+def start_in_thread(**kwargs):
+    """バックグラウンドスレッドで起動して (server, base_url) を返す"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v2/bot"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    args = parser.parse_args()
+    
+    server = make_server(args.host, args.port, args.latency_ms, args.throttle_rate)
+    print(f"LINE stub listening on http://{args.host}:{args.port}/v2/bot")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(server.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import time
+from datetime import timedelta
+
+import click
+from flask import Flask, current_app
+
+from app import db
+from services.db_pool import jobs_pool
+
+
+def register_commands(app: Flask):
+    """Flask CLI コマンド登録"""
+    app.cli.add_command(rebuild_daily_stats_command)
+    app.cli.add_command(webhook_worker_command)
+    app.cli.add_command(import_visits_command)
+    app.cli.add_command(scheduler_command)
+    app.cli.add_command(outbox_dispatcher_command)
+    app.cli.add_command(profile_worker_command)
+
+
+@click.command("rebuild-daily-stats")
+@click.option("--days", default=2, show_default=True, help="再集計する日数（今日を含む）")
+@click.option("--all", "rebuild_all", is_flag=True, help="全期間を再集計")
+@click.option("--tenant", "tenant_id", default=None, help="対象テナントID（省略時は全テナント）")
+def rebuild_daily_stats_command(days: int, rebuild_all: bool, tenant_id):
+    """日別ロールアップ（daily_tenant_stats）を生データから再集計"""
+    from services.stats_service import rebuild_daily_stats
+
+    with jobs_pool():
+        since_date = None
+        if not rebuild_all:
+            today = db.session.query(db.func.current_date()).scalar()
+            since_date = today - timedelta(days=days - 1)
+
+        rows = rebuild_daily_stats(since_date=since_date, tenant_id=tenant_id)
+    click.echo(f"Rebuilt daily stats: {rows} rows")
+
+
+@click.command("webhook-worker")
+@click.option("--workers", type=int, default=None, help="ワーカー数（全プロセスで同じ値にする）")
+def webhook_worker_command(workers):
+    """Webhook イベントキューのワーカーを起動（Ctrl+C で停止）"""
+    from services.webhook_queue import WEBHOOK_WORKERS, start_worker_pool
+
+    pool = start_worker_pool(current_app._get_current_object(), workers=workers or WEBHOOK_WORKERS)
+    click.echo(f"Webhook worker started: {pool.workers} workers")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
+        click.echo("Webhook worker stopped")
+
+
+@click.command("outbox-dispatcher")
+@click.option("--workers", type=int, default=None, help="ディスパッチャースレッド数")
+def outbox_dispatcher_command(workers):
+    """LINE 送信のアウトボックスを送信するディスパッチャーを起動（Ctrl+C で停止）
+
+    Web プロセス側は OUTBOX_DISPATCHER=standalone にして起動しないようにする。
+    複数起動しても同じメッセージを二重に送ることはない。
+    """
+    from services.outbox_service import OUTBOX_WORKERS, start_dispatcher
+
+    dispatcher = start_dispatcher(current_app._get_current_object(), workers=workers or OUTBOX_WORKERS)
+    click.echo(f"Outbox dispatcher started: {dispatcher.workers} workers")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        dispatcher.stop()
+        click.echo("Outbox dispatcher stopped")
+
+
+@click.command("profile-worker")
+@click.option("--batch-size", type=int, default=None, help="1回に取得する患者数")
+def profile_worker_command(batch_size):
+    """LINE プロフィール（表示名・画像）を取得して患者に反映するワーカーを起動（Ctrl+C で停止）
+
+    Web プロセス側は PROFILE_ENRICHER=standalone にして起動しないようにする。
+    複数起動しても同じ患者を二重に取得することはない。
+    """
+    from services.profile_service import PROFILE_BATCH_SIZE, start_enricher
+
+    enricher = start_enricher(current_app._get_current_object(), batch_size=batch_size or PROFILE_BATCH_SIZE)
+    click.echo(f"Profile worker started: batch size {enricher.batch_size}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        enricher.stop()
+        click.echo("Profile worker stopped")
+
+
+@click.command("scheduler")
+def scheduler_command():
+    """スケジューラーを専用プロセスで起動（Ctrl+C で停止）
+
+    既定（SCHEDULER_MODE=standalone）では Web プロセスはスケジューラーを起動しないので、
+    gunicorn で動かすときはこのコマンドを必ず別プロセスで1つ以上起動する。
+    複数起動しても各ジョブは実行回ごとに1回だけ実行される。
+    """
+    from services.scheduler_service import init_scheduler, scheduler
+
+    init_scheduler(current_app._get_current_object())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        scheduler.shutdown()
+        click.echo("Scheduler stopped")
+
+
+@click.command("import-visits")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--tenant", "tenant_id", required=True, help="取り込み先テナントID")
+@click.option("--encoding", default="utf-8-sig", show_default=True, help="CSV の文字コード（Shift_JIS は cp932）")
+@click.option("--column", "column_map", multiple=True, metavar="FIELD=NAME",
+              help="項目と CSV 列名の対応（例: visit_date=来院日、external_id=カルテ番号）")
+def import_visits_command(csv_file: str, tenant_id: str, encoding: str, column_map):
+    """電子カルテの CSV から来院履歴をインポート（1トランザクション）"""
+    from services.import_service import IMPORT_FIELDS, InvalidImportFile, import_visits
+
+    columns = {}
+    for mapping in column_map:
+        name, _, column = mapping.partition("=")
+        if name not in IMPORT_FIELDS or not column:
+            raise click.BadParameter(f"{mapping!r} (fields: {', '.join(IMPORT_FIELDS)})", param_hint="--column")
+        columns[name] = column
+
+    started = time.monotonic()
+
+    def progress(rows: int):
+        elapsed = time.monotonic() - started
+        click.echo(f"  {rows:,} rows read ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    with jobs_pool(), open(csv_file, encoding=encoding, newline="") as stream:
+        try:
+            result = import_visits(tenant_id, stream, columns, progress=progress)
+        except InvalidImportFile as e:
+            db.session.rollback()
+            raise click.ClickException(str(e))
+        db.session.commit()
+
+    click.echo(
+        f"Imported {result.imported:,} visits from {result.rows:,} rows in {time.monotonic() - started:.1f}s "
+        f"(duplicates {result.duplicates:,}, unmatched {result.unmatched:,}, invalid {result.invalid:,}, "
+        f"linked external IDs {result.linked:,})"
+    )
+    for error in result.errors:
+        click.echo(f"  line {error['line']}: {error['error']}")
@@ -0,0 +1,94 @@
+"""gunicorn の設定（gunicorn -c gunicorn.conf.py wsgi:app）
+
+設定はすべて環境変数で上書きできる。kill -HUP <master> で新しい設定のワーカーに
+入れ替わり、処理中のリクエストは GUNICORN_GRACEFUL_TIMEOUT 秒まで待つ。
+GUNICORN_PRELOAD=true の場合、アプリのコードは master が読み込むので HUP では更新されない。
+コードを入れ替えるときはプロセスを再起動する（または USR2 で新しい master を起動して古い方を QUIT）。
+"""
+import os
+
+# sync: 1ワーカー1リクエスト / gthread: ワーカーごとに GUNICORN_THREADS スレッド /
+# gevent: ワーカーごとに GUNICORN_WORKER_CONNECTIONS 件まで並行（DB 待ちは psycogreen で譲る）
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+
+def _cpu_count() -> int:
+    # コンテナの CPU 割り当て（cpuset）を考慮する
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _default_workers() -> int:
+    # gevent は1プロセスで多数のリクエストを並行処理できるので CPU 数、それ以外は 2 * CPU + 1
+    if worker_class == "gevent":
+        return _cpu_count()
+    return 2 * _cpu_count() + 1
+
+
+if worker_class == "gevent":
+    # preload で master が読み込むモジュール（threading・socket・SQLAlchemy のプールのロック）を
+    # gevent 対応にするため、アプリの読み込み前にパッチする
+    from gevent import monkey
+
+    monkey.patch_all()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "0")) or _default_workers()
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+
+# master でアプリを読み込んでから fork する（モジュールをワーカー間で共有し、起動時のエラーを早く検出する）
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# DB の statement_timeout（DB_STATEMENT_TIMEOUT_MS）より長くして、遅いクエリはワーカーの強制終了ではなくエラー応答にする
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# 指定したリクエスト数ごとにワーカーを入れ替える（0 は無効）
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_worker_init(worker):
+    """fork 後のワーカーの初期化（リクエストの受付前）"""
+    from app import db, start_background_workers
+
+    app = worker.wsgi
+    if worker_class == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            worker.log.warning("psycogreen is not installed; database calls will block the gevent worker")
+        else:
+            patch_psycopg()
+
+    # master で作られたプールの接続・ロックを引き継がない
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    worker.background_workers = start_background_workers(app, scheduler=False)
+
+
+def worker_exit(server, worker):
+    """ワーカーの終了時に、処理中のバッチを終えてから埋め込みワーカーを停止"""
+    for background_worker in getattr(worker, "background_workers", []):
+        background_worker.stop()
+
+
+def when_ready(server):
+    """スケジューラーは Web ワーカーでは起動しないので、`flask scheduler` が別に必要なことを警告する"""
+    mode = os.getenv("SCHEDULER_MODE")
+    if mode == "embedded":
+        server.log.warning("SCHEDULER_MODE=embedded only applies to `python app.py`; gunicorn workers never start "
+                           "the scheduler. Set SCHEDULER_MODE=standalone and run `flask scheduler`, "
+                           "otherwise scheduled jobs will not run")
+    elif mode is None:
+        server.log.warning("SCHEDULER_MODE is not set (default: standalone); scheduled jobs only run "
+                           "while `flask scheduler` is running as a separate process")
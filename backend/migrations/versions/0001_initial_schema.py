@@ -0,0 +1,127 @@
+"""initial schema
+
+db.create_all() で作成していた既存スキーマ。既存環境は
+`flask db stamp 0001` を実行してから upgrade する。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tenants',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('clinic_name', sa.String(length=255), nullable=False),
+        sa.Column('line_channel_id', sa.String(length=255), nullable=True),
+        sa.Column('line_channel_secret', sa.String(length=255), nullable=True),
+        sa.Column('line_channel_access_token', sa.Text(), nullable=True),
+        sa.Column('stripe_customer_id', sa.String(length=255), nullable=True),
+        sa.Column('subscription_status', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'message_templates',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('trigger_keywords', sa.Text(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'patients',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('line_user_id', sa.String(length=255), nullable=False),
+        sa.Column('display_name', sa.String(length=255), nullable=True),
+        sa.Column('picture_url', sa.Text(), nullable=True),
+        sa.Column('last_visit_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'line_user_id', name='uq_tenant_line_user')
+    )
+    op.create_table(
+        'recall_runs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('run_date', sa.Date(), nullable=False),
+        sa.Column('dormant_threshold', sa.DateTime(), nullable=False),
+        sa.Column('cursor_last_visit_at', sa.DateTime(), nullable=True),
+        sa.Column('cursor_patient_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('sent_count', sa.Integer(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'run_date', name='uq_recall_run_tenant_date')
+    )
+    op.create_table(
+        'rich_menus',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('line_rich_menu_id', sa.String(length=255), nullable=True),
+        sa.Column('template_type', sa.String(length=50), nullable=False),
+        sa.Column('button_config', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'message_logs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('patient_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('message_type', sa.String(length=50), nullable=False),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('line_message_id', sa.String(length=255), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['patient_id'], ['patients.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'visits',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('patient_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('visit_date', sa.DateTime(), nullable=False),
+        sa.Column('aftercare_sent', sa.Boolean(), nullable=True),
+        sa.Column('aftercare_sent_at', sa.DateTime(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['patient_id'], ['patients.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('visits')
+    op.drop_table('message_logs')
+    op.drop_table('rich_menus')
+    op.drop_table('recall_runs')
+    op.drop_table('patients')
+    op.drop_table('message_templates')
+    op.drop_table('tenants')
@@ -0,0 +1,49 @@
+"""hot query indexes
+
+スケジューラー・ダッシュボード・Webhook で使うテナント単位のインデックス。
+既存の大きなテーブルをロックしないよう CONCURRENTLY で作成する。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_visits_patient_visit_date', 'visits', ['patient_id', 'visit_date'], {}),
+    ('ix_visits_aftercare_pending', 'visits', ['visit_date'],
+     {'postgresql_where': sa.text('aftercare_sent = false')}),
+    ('ix_patients_tenant_status_last_visit', 'patients',
+     ['tenant_id', 'status', 'last_visit_at', 'id'], {}),
+    ('ix_patients_tenant_created', 'patients', ['tenant_id', 'created_at'], {}),
+    ('ix_message_logs_patient_sent_at', 'message_logs', ['patient_id', 'sent_at'], {}),
+    ('ix_message_templates_tenant_type_active', 'message_templates',
+     ['tenant_id', 'type', 'is_active'], {}),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True, if_not_exists=True, **options
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,39 @@
+"""tenant timezone and visit date index
+
+日付判定を現地タイムゾーンの半開区間に変えたため、visit_date 単独の範囲検索用
+インデックスを追加する。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'tenants',
+        sa.Column('timezone', sa.String(length=64), nullable=False, server_default='Asia/Tokyo')
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_visits_visit_date', 'visits', ['visit_date'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_visits_visit_date', table_name='visits',
+            postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_column('tenants', 'timezone')
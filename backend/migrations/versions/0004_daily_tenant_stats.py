@@ -0,0 +1,39 @@
+"""daily tenant stats rollup
+
+作成後に `flask rebuild-daily-stats --all` で過去分を集計する。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+COUNTERS = (
+    'new_patients', 'visits', 'blocks', 'messages', 'messages_aftercare',
+    'messages_recall', 'messages_welcome', 'messages_reply'
+)
+
+
+def upgrade():
+    op.create_table(
+        'daily_tenant_stats',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('stat_date', sa.Date(), nullable=False),
+        *[sa.Column(name, sa.Integer(), nullable=False) for name in COUNTERS],
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('tenant_id', 'stat_date')
+    )
+
+
+def downgrade():
+    op.drop_table('daily_tenant_stats')
@@ -0,0 +1,45 @@
+"""webhook event queue
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'webhook_events',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('line_user_id', sa.String(length=255), nullable=True),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_webhook_events_pending', 'webhook_events', ['id'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+    op.create_index('ix_webhook_events_processed_at', 'webhook_events', ['processed_at'])
+
+
+def downgrade():
+    op.drop_index('ix_webhook_events_processed_at', table_name='webhook_events')
+    op.drop_index('ix_webhook_events_pending', table_name='webhook_events')
+    op.drop_table('webhook_events')
@@ -0,0 +1,45 @@
+"""patient list keyset and display name search indexes
+
+患者一覧のキーセットページング（状態別・登録日時順）と表示名の部分一致検索用。
+部分一致検索には pg_trgm 拡張の GIN インデックスを使う。
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_patients_tenant_status_created', 'patients',
+            ['tenant_id', 'status', 'created_at', 'id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_patients_display_name_trgm', 'patients', ['display_name'],
+            postgresql_using='gin', postgresql_ops={'display_name': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_patients_display_name_trgm', table_name='patients',
+            postgresql_concurrently=True, if_exists=True
+        )
+        op.drop_index(
+            'ix_patients_tenant_status_created', table_name='patients',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,36 @@
+"""patient external id for EMR imports
+
+電子カルテからの来院履歴インポートで患者を照合するための患者番号。
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('patients', sa.Column('external_id', sa.String(length=255), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_patients_tenant_external_id', 'patients', ['tenant_id', 'external_id'],
+            unique=True, postgresql_where=sa.text('external_id IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'uq_patients_tenant_external_id', table_name='patients',
+            postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_column('patients', 'external_id')
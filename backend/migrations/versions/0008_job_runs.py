@@ -0,0 +1,39 @@
+"""scheduled job run history
+
+スケジュールジョブの実行履歴。(job_id, scheduled_at) の一意制約で
+複数プロセスからの同じ回の実行を1回にする。
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_runs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.String(length=100), nullable=False),
+        sa.Column('scheduled_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('worker', sa.String(length=255), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('rows_processed', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id', 'scheduled_at', name='uq_job_runs_job_scheduled')
+    )
+
+
+def downgrade():
+    op.drop_table('job_runs')
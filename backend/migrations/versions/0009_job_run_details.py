@@ -0,0 +1,26 @@
+"""job run details
+
+シャード並列実行したジョブのシャード別メトリクス（処理件数・所要時間・失敗テナント）。
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('job_runs', sa.Column('details', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade():
+    op.drop_column('job_runs', 'details')
@@ -0,0 +1,51 @@
+"""message outbox
+
+LINE 送信待ちメッセージ。送信の原因となった更新と同じトランザクションで書き込み、
+ディスパッチャーが FOR UPDATE SKIP LOCKED で取り出して送信する。
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'message_outbox',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('endpoint', sa.String(length=20), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('idempotency_key', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('message_log_ids', postgresql.ARRAY(postgresql.UUID(as_uuid=True)), nullable=False),
+        sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key', name='uq_message_outbox_idempotency_key')
+    )
+    op.create_index(
+        'ix_message_outbox_pending', 'message_outbox', ['next_attempt_at', 'id'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+    op.create_index('ix_message_outbox_created_at', 'message_outbox', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_message_outbox_created_at', table_name='message_outbox')
+    op.drop_index('ix_message_outbox_pending', table_name='message_outbox')
+    op.drop_table('message_outbox')
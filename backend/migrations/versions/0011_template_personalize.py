@@ -0,0 +1,39 @@
+"""message template personalization flag, per-tenant outbox index
+
+False のテンプレートは患者ごとに本文を変えず、同じ本文をマルチキャストでまとめて送る。
+アウトボックスの送信待ちインデックスはテナントごとに取り出せるよう tenant_id を先頭にする。
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'message_templates',
+        sa.Column('personalize', sa.Boolean(), server_default=sa.true(), nullable=False)
+    )
+    op.drop_index('ix_message_outbox_pending', table_name='message_outbox')
+    op.create_index(
+        'ix_message_outbox_pending', 'message_outbox', ['tenant_id', 'next_attempt_at', 'id'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_outbox_pending', table_name='message_outbox')
+    op.create_index(
+        'ix_message_outbox_pending', 'message_outbox', ['next_attempt_at', 'id'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+    op.drop_column('message_templates', 'personalize')
@@ -0,0 +1,31 @@
+"""patient LINE profile refresh timestamp
+
+プロフィール取得ワーカーが未取得・期限切れの患者を取り出すための列とインデックス。
+既存の患者は未取得（NULL）として順次取得される。
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('patients', sa.Column('profile_refreshed_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_patients_profile_refreshed_at', 'patients', [sa.text('profile_refreshed_at NULLS FIRST')],
+        postgresql_where=sa.text("status = 'active'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_patients_profile_refreshed_at', table_name='patients')
+    op.drop_column('patients', 'profile_refreshed_at')
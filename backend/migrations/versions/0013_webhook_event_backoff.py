@@ -0,0 +1,31 @@
+"""webhook event retry backoff
+
+失敗した Webhook イベントの再試行時刻。再試行待ちのユーザーの後続イベントを
+取り出さないための部分インデックス（再試行待ちの行だけを含む）。
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('webhook_events', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_webhook_events_retry', 'webhook_events', ['tenant_id', 'line_user_id', 'id'],
+        postgresql_where=sa.text("status = 'pending' AND next_attempt_at IS NOT NULL")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_webhook_events_retry', table_name='webhook_events')
+    op.drop_column('webhook_events', 'next_attempt_at')
@@ -0,0 +1,34 @@
+"""tenant write lsns
+
+テナントごとに最後の書き込み時点のプライマリの WAL 位置を記録する。
+全ワーカー・プロセスがこれを見て、まだ適用していないレプリカを読み取りに使わない。
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'tenant_write_lsns',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('write_lsn', sa.BigInteger(), nullable=False),
+        sa.Column('written_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('tenant_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('tenant_write_lsns')
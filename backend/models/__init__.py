@@ -1 +1,14 @@
 from app import db
+# マイグレーション（Alembic）がメタデータを参照できるよう全モデルを登録
+from models.tenant import Tenant
+from models.patient import Patient
+from models.visit import Visit
+from models.message_template import MessageTemplate
+from models.message_log import MessageLog
+from models.rich_menu import RichMenu
+from models.recall_run import RecallRun
+from models.daily_tenant_stat import DailyTenantStat
+from models.webhook_event import WebhookEvent
+from models.job_run import JobRun
+from models.message_outbox import MessageOutbox
+from models.tenant_write_lsn import TenantWriteLsn
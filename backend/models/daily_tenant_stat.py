@@ -0,0 +1,38 @@
+from datetime import datetime
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class DailyTenantStat(db.Model):
+    """テナント別・日別の集計モデル（ダッシュボード用ロールアップ）"""
+
+    __tablename__ = "daily_tenant_stats"
+
+    tenant_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("tenants.id"), primary_key=True
+    )
+    stat_date = db.Column(db.Date, primary_key=True)  # クリニック現地日付
+    new_patients = db.Column(db.Integer, nullable=False, default=0)
+    visits = db.Column(db.Integer, nullable=False, default=0)
+    blocks = db.Column(db.Integer, nullable=False, default=0)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    messages_aftercare = db.Column(db.Integer, nullable=False, default=0)
+    messages_recall = db.Column(db.Integer, nullable=False, default=0)
+    messages_welcome = db.Column(db.Integer, nullable=False, default=0)
+    messages_reply = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    def to_dict(self):
+        return {
+            "date": self.stat_date.isoformat(),
+            "new_patients": self.new_patients,
+            "visits": self.visits,
+            "blocks": self.blocks,
+            "messages": self.messages,
+            "messages_aftercare": self.messages_aftercare,
+            "messages_recall": self.messages_recall,
+            "messages_welcome": self.messages_welcome,
+            "messages_reply": self.messages_reply,
+        }
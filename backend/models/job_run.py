@@ -0,0 +1,47 @@
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
+from app import db
+
+
+class JobRun(db.Model):
+    """スケジュールジョブの実行履歴（兼 実行権の取得）
+
+    (job_id, scheduled_at) が一意なので、同じ回を複数プロセスが起動しても
+    行を作れた1プロセスだけが実行する。
+    """
+
+    __tablename__ = "job_runs"
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.String(100), nullable=False)
+    scheduled_at = db.Column(db.DateTime, nullable=False)  # 予定の起動時刻（UTC）
+    status = db.Column(
+        db.String(20), nullable=False, default="running"
+    )  # running, succeeded, failed, skipped
+    worker = db.Column(db.String(255))  # 実行したプロセス（ホスト名:PID）
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    rows_processed = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    details = db.Column(JSONB)  # シャード別の処理件数・所要時間・失敗テナントなど
+
+    __table_args__ = (
+        db.UniqueConstraint("job_id", "scheduled_at", name="uq_job_runs_job_scheduled"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "job_id": self.job_id,
+            "scheduled_at": self.scheduled_at.isoformat(),
+            "status": self.status,
+            "worker": self.worker,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "duration_seconds": (self.finished_at - self.started_at).total_seconds()
+            if self.finished_at and self.started_at
+            else None,
+            "rows_processed": self.rows_processed,
+            "error": self.error,
+            "details": self.details,
+        }
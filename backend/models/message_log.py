@@ -17,10 +17,14 @@ class MessageLog(db.Model):
         db.String(50), nullable=False
     )  # aftercare, recall, seasonal, reply
     content = db.Column(db.Text)
-    status = db.Column(db.String(50), default="sent")  # sent, delivered, failed
+    status = db.Column(db.String(50), default="sent")  # pending, sent, delivered, failed
     line_message_id = db.Column(db.String(255))
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_message_logs_patient_sent_at", "patient_id", "sent_at"),
+    )
+
     def to_dict(self):
         return {
             "id": str(self.id),
@@ -0,0 +1,55 @@
+from datetime import datetime
+from app import db
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
+
+
+class MessageOutbox(db.Model):
+    """LINE 送信待ちメッセージ（アウトボックス）
+
+    送信の原因となった更新（来院のアフターフォロー済み・リコールのカーソル・送信ログ）と
+    同じトランザクションで書き込み、ディスパッチャーが送信する。
+    同じ idempotency_key の再送は LINE 側で重複配信されない。
+    """
+
+    __tablename__ = "message_outbox"
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    tenant_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("tenants.id"), nullable=False
+    )
+    endpoint = db.Column(db.String(20), nullable=False)  # push, multicast, reply
+    payload = db.Column(JSONB, nullable=False)  # LINE API のリクエストボディ
+    # X-Line-Retry-Key として送る（reply は非対応）
+    idempotency_key = db.Column(UUID(as_uuid=True), nullable=False)
+    # 送信結果で status を更新する送信ログ
+    message_log_ids = db.Column(ARRAY(UUID(as_uuid=True)), nullable=False, default=list)
+    status = db.Column(
+        db.String(20), nullable=False, default="pending", server_default="pending"
+    )  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint("idempotency_key", name="uq_message_outbox_idempotency_key"),
+        db.Index(
+            "ix_message_outbox_pending", "tenant_id", "next_attempt_at", "id",
+            postgresql_where=db.text("status = 'pending'")
+        ),
+        db.Index("ix_message_outbox_created_at", "created_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tenant_id": str(self.tenant_id),
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at.isoformat(),
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "sent_at": self.sent_at.isoformat() if self.sent_at else None,
+        }
@@ -20,11 +20,19 @@ class MessageTemplate(db.Model):
     content = db.Column(db.Text, nullable=False)
     trigger_keywords = db.Column(db.Text)  # カンマ区切りのキーワード（返信検知用）
     is_active = db.Column(db.Boolean, default=True)
+    # False にすると {name} 等を患者ごとに置き換えず、全員に同じ本文をマルチキャストする
+    personalize = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
+    __table_args__ = (
+        db.Index(
+            "ix_message_templates_tenant_type_active", "tenant_id", "type", "is_active"
+        ),
+    )
+
     def to_dict(self):
         return {
             "id": str(self.id),
@@ -33,5 +41,6 @@ class MessageTemplate(db.Model):
             "content": self.content,
             "trigger_keywords": self.trigger_keywords,
             "is_active": self.is_active,
+            "personalize": self.personalize,
             "created_at": self.created_at.isoformat(),
         }
@@ -14,8 +14,11 @@ class Patient(db.Model):
         UUID(as_uuid=True), db.ForeignKey("tenants.id"), nullable=False
     )
     line_user_id = db.Column(db.String(255), nullable=False)
+    external_id = db.Column(db.String(255))  # 電子カルテの患者番号（インポート時の照合用）
     display_name = db.Column(db.String(255))
     picture_url = db.Column(db.Text)
+    # LINE プロフィール（表示名・画像）を取得した日時。NULL は未取得
+    profile_refreshed_at = db.Column(db.DateTime)
     last_visit_at = db.Column(db.DateTime)
     status = db.Column(db.String(50), default="active")  # active, inactive, blocked
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -26,6 +29,38 @@ class Patient(db.Model):
     # Unique constraint: one LINE user per tenant
     __table_args__ = (
         db.UniqueConstraint("tenant_id", "line_user_id", name="uq_tenant_line_user"),
+        # 状態別の件数・休眠患者のキーセット走査
+        db.Index(
+            "ix_patients_tenant_status_last_visit",
+            "tenant_id", "status", "last_visit_at", "id"
+        ),
+        # 一覧・友だち追加数の集計
+        db.Index("ix_patients_tenant_created", "tenant_id", "created_at"),
+        # 一覧のキーセットページング（状態別・登録日時の新しい順）
+        db.Index(
+            "ix_patients_tenant_status_created",
+            "tenant_id", "status", "created_at", "id"
+        ),
+        # 電子カルテ患者番号での照合（テナント内で一意）
+        db.Index(
+            "uq_patients_tenant_external_id",
+            "tenant_id", "external_id",
+            unique=True,
+            postgresql_where=db.text("external_id IS NOT NULL")
+        ),
+        # 表示名の部分一致検索（pg_trgm）
+        db.Index(
+            "ix_patients_display_name_trgm",
+            "display_name",
+            postgresql_using="gin",
+            postgresql_ops={"display_name": "gin_trgm_ops"}
+        ),
+        # プロフィール未取得・期限切れの患者を古い順に取り出す
+        db.Index(
+            "ix_patients_profile_refreshed_at",
+            db.text("profile_refreshed_at NULLS FIRST"),
+            postgresql_where=db.text("status = 'active'")
+        ),
     )
 
     # Relationships
@@ -36,6 +71,7 @@ class Patient(db.Model):
         return {
             "id": str(self.id),
             "line_user_id": self.line_user_id,
+            "external_id": self.external_id,
             "display_name": self.display_name,
             "picture_url": self.picture_url,
             "last_visit_at": self.last_visit_at.isoformat()
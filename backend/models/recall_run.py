@@ -0,0 +1,41 @@
+import uuid
+from datetime import datetime
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class RecallRun(db.Model):
+    """リコール配信の進捗モデル（テナント・実行日ごと）"""
+
+    __tablename__ = "recall_runs"
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("tenants.id"), nullable=False
+    )
+    run_date = db.Column(db.Date, nullable=False)
+    dormant_threshold = db.Column(db.DateTime, nullable=False)
+    # キーセットページングのカーソル（送信済みの最後の患者）
+    cursor_last_visit_at = db.Column(db.DateTime)
+    cursor_patient_id = db.Column(UUID(as_uuid=True))
+    sent_count = db.Column(db.Integer, default=0, nullable=False)
+    completed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("tenant_id", "run_date", name="uq_recall_run_tenant_date"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "tenant_id": str(self.tenant_id),
+            "run_date": self.run_date.isoformat(),
+            "sent_count": self.sent_count,
+            "completed_at": self.completed_at.isoformat()
+            if self.completed_at
+            else None,
+        }
@@ -18,6 +18,9 @@ class Tenant(db.Model):
     subscription_status = db.Column(
         db.String(50), default="trial"
     )  # trial, active, canceled
+    timezone = db.Column(
+        db.String(64), nullable=False, default="Asia/Tokyo", server_default="Asia/Tokyo"
+    )  # 日付の集計・判定に使うクリニックのタイムゾーン
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -35,5 +38,6 @@ class Tenant(db.Model):
             "id": str(self.id),
             "clinic_name": self.clinic_name,
             "subscription_status": self.subscription_status,
+            "timezone": self.timezone,
             "created_at": self.created_at.isoformat(),
         }
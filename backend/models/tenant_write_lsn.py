@@ -0,0 +1,16 @@
+from datetime import datetime
+from app import db
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class TenantWriteLsn(db.Model):
+    """テナントが最後に書き込んだ時点のプライマリの WAL 位置（レプリカの read-your-writes 用）"""
+
+    __tablename__ = "tenant_write_lsns"
+
+    tenant_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("tenants.id"), primary_key=True
+    )
+    # pg_current_wal_lsn() - '0/0'（services.db_pool.parse_lsn と同じ整数）
+    write_lsn = db.Column(db.BigInteger, nullable=False)
+    written_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
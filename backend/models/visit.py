@@ -19,6 +19,19 @@ class Visit(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 患者別の来院履歴・同日重複チェック
+        db.Index("ix_visits_patient_visit_date", "patient_id", "visit_date"),
+        # 日付範囲（本日の来院・日別集計）
+        db.Index("ix_visits_visit_date", "visit_date"),
+        # アフターフォロー未送信の来院（部分インデックス）
+        db.Index(
+            "ix_visits_aftercare_pending",
+            "visit_date",
+            postgresql_where=db.text("aftercare_sent = false")
+        ),
+    )
+
     def to_dict(self):
         return {
             "id": str(self.id),
@@ -0,0 +1,58 @@
+from datetime import datetime
+from app import db
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+
+class WebhookEvent(db.Model):
+    """受信済み LINE Webhook イベントのキュー（非同期処理用）"""
+
+    __tablename__ = "webhook_events"
+
+    # 受信順（同一ユーザーのイベントはこの順で処理する）
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    tenant_id = db.Column(
+        UUID(as_uuid=True), db.ForeignKey("tenants.id"), nullable=False
+    )
+    line_user_id = db.Column(db.String(255))
+    # (tenant_id, line_user_id) のハッシュ。ワーカーの担当振り分けに使う
+    shard = db.Column(db.Integer, nullable=False)
+    payload = db.Column(JSONB, nullable=False)  # LINE から受信したイベントそのまま
+    status = db.Column(
+        db.String(20), nullable=False, default="pending", server_default="pending"
+    )  # pending, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_error = db.Column(db.Text)
+    # 失敗後の再試行時刻（それまで同じユーザーの以降のイベントも処理しない）
+    next_attempt_at = db.Column(db.DateTime)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index(
+            "ix_webhook_events_pending", "id",
+            postgresql_where=db.text("status = 'pending'")
+        ),
+        db.Index("ix_webhook_events_processed_at", "processed_at"),
+        # 再試行待ちのユーザーの判定
+        db.Index(
+            "ix_webhook_events_retry", "tenant_id", "line_user_id", "id",
+            postgresql_where=db.text("status = 'pending' AND next_attempt_at IS NOT NULL")
+        ),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tenant_id": str(self.tenant_id),
+            "line_user_id": self.line_user_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "next_attempt_at": self.next_attempt_at.isoformat()
+            if self.next_attempt_at
+            else None,
+            "received_at": self.received_at.isoformat(),
+            "processed_at": self.processed_at.isoformat()
+            if self.processed_at
+            else None,
+        }
@@ -3,6 +3,7 @@ import stripe
 from flask import Blueprint, request, jsonify
 from app import db
 from models.tenant import Tenant
+from services.cache_service import invalidate_tenant
 
 billing_bp = Blueprint("billing", __name__)
 
@@ -104,6 +105,7 @@ def handle_subscription_created(subscription):
     if tenant:
         tenant.subscription_status = "active"
         db.session.commit()
+        invalidate_tenant(tenant.id)
 
 
 def handle_subscription_updated(subscription):
@@ -114,6 +116,7 @@ def handle_subscription_updated(subscription):
     if tenant:
         tenant.subscription_status = status
         db.session.commit()
+        invalidate_tenant(tenant.id)
 
 
 def handle_subscription_deleted(subscription):
@@ -123,3 +126,4 @@ def handle_subscription_deleted(subscription):
     if tenant:
         tenant.subscription_status = "canceled"
         db.session.commit()
+        invalidate_tenant(tenant.id)
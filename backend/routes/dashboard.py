@@ -1,56 +1,59 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from flask import Blueprint, request, jsonify
 from sqlalchemy import func
 from app import db
 from models.patient import Patient
-from models.visit import Visit
-from models.message_log import MessageLog
+from models.daily_tenant_stat import DailyTenantStat
+from services.clinic_time import tenant_timezone, local_today
+from services.db_pool import read_replica
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
 
 @dashboard_bp.route("/stats", methods=["GET"])
+@read_replica
 def get_stats():
     """ダッシュボード統計"""
     tenant_id = request.headers.get("X-Tenant-ID")
     if not tenant_id:
         return jsonify({"error": "Tenant ID required"}), 400
     
-    today = datetime.utcnow().date()
+    # 日付はクリニック現地時間で判定
+    tz_name = tenant_timezone(tenant_id)
+    today = local_today(tz_name)
+    first_of_month = today.replace(day=1)
     
     # 友だち数（総数・アクティブ）
-    total_patients = Patient.query.filter_by(tenant_id=tenant_id).count()
-    active_patients = Patient.query.filter_by(tenant_id=tenant_id, status="active").count()
-    
-    # 本日の来院数
-    today_visits = Visit.query.join(Patient).filter(
-        Patient.tenant_id == tenant_id,
-        func.date(Visit.visit_date) == today
-    ).count()
+    patients = db.session.query(
+        func.count(Patient.id).label("total"),
+        func.count(Patient.id).filter(Patient.status == "active").label("active")
+    ).filter(Patient.tenant_id == tenant_id).one()
     
-    # 本日の配信数
-    today_messages = MessageLog.query.join(Patient).filter(
-        Patient.tenant_id == tenant_id,
-        func.date(MessageLog.sent_at) == today
-    ).count()
-    
-    # 今月の配信数
-    first_of_month = today.replace(day=1)
-    month_messages = MessageLog.query.join(Patient).filter(
-        Patient.tenant_id == tenant_id,
-        func.date(MessageLog.sent_at) >= first_of_month
-    ).count()
+    # 本日の来院数・配信数、今月の配信数（日別ロールアップから）
+    rollup = db.session.query(
+        func.coalesce(func.sum(DailyTenantStat.visits).filter(
+            DailyTenantStat.stat_date == today
+        ), 0).label("today_visits"),
+        func.coalesce(func.sum(DailyTenantStat.messages).filter(
+            DailyTenantStat.stat_date == today
+        ), 0).label("today_messages"),
+        func.coalesce(func.sum(DailyTenantStat.messages), 0).label("month_messages")
+    ).filter(
+        DailyTenantStat.tenant_id == tenant_id,
+        DailyTenantStat.stat_date >= first_of_month
+    ).one()
     
     return jsonify({
-        "total_patients": total_patients,
-        "active_patients": active_patients,
-        "today_visits": today_visits,
-        "today_messages": today_messages,
-        "month_messages": month_messages
+        "total_patients": patients.total,
+        "active_patients": patients.active,
+        "today_visits": rollup.today_visits,
+        "today_messages": rollup.today_messages,
+        "month_messages": rollup.month_messages
     })
 
 
 @dashboard_bp.route("/trends", methods=["GET"])
+@read_replica
 def get_trends():
     """トレンドデータ（グラフ用）"""
     tenant_id = request.headers.get("X-Tenant-ID")
@@ -58,38 +61,23 @@ def get_trends():
         return jsonify({"error": "Tenant ID required"}), 400
     
     days = request.args.get("days", 30, type=int)
-    end_date = datetime.utcnow().date()
+    end_date = local_today(tenant_timezone(tenant_id))
     start_date = end_date - timedelta(days=days)
     
-    # 日別友だち追加数
-    new_patients = db.session.query(
-        func.date(Patient.created_at).label("date"),
-        func.count(Patient.id).label("count")
-    ).filter(
-        Patient.tenant_id == tenant_id,
-        func.date(Patient.created_at) >= start_date
-    ).group_by(func.date(Patient.created_at)).all()
-    
-    # 日別来院数
-    daily_visits = db.session.query(
-        func.date(Visit.visit_date).label("date"),
-        func.count(Visit.id).label("count")
-    ).join(Patient).filter(
-        Patient.tenant_id == tenant_id,
-        func.date(Visit.visit_date) >= start_date
-    ).group_by(func.date(Visit.visit_date)).all()
+    # 日別ロールアップ（友だち追加数・来院数・配信数）
+    rows = DailyTenantStat.query.filter(
+        DailyTenantStat.tenant_id == tenant_id,
+        DailyTenantStat.stat_date >= start_date
+    ).order_by(DailyTenantStat.stat_date).all()
     
-    # 日別配信数
-    daily_messages = db.session.query(
-        func.date(MessageLog.sent_at).label("date"),
-        func.count(MessageLog.id).label("count")
-    ).join(Patient).filter(
-        Patient.tenant_id == tenant_id,
-        func.date(MessageLog.sent_at) >= start_date
-    ).group_by(func.date(MessageLog.sent_at)).all()
+    def series(counter):
+        return [
+            {"date": r.stat_date.isoformat(), "count": getattr(r, counter)}
+            for r in rows if getattr(r, counter)
+        ]
     
     return jsonify({
-        "new_patients": [{"date": str(r.date), "count": r.count} for r in new_patients],
-        "daily_visits": [{"date": str(r.date), "count": r.count} for r in daily_visits],
-        "daily_messages": [{"date": str(r.date), "count": r.count} for r in daily_messages]
+        "new_patients": series("new_patients"),
+        "daily_visits": series("visits"),
+        "daily_messages": series("messages")
     })
@@ -0,0 +1,46 @@
+from datetime import date
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from services.export_service import EXPORT_COLUMNS, EXPORT_FORMATS, export_statement, stream_export
+
+exports_bp = Blueprint("exports", __name__)
+
+
+@exports_bp.route("/<resource>", methods=["GET"])
+def export_resource(resource):
+    """患者・来院記録・メッセージログのエクスポート（ストリーミング）
+
+    format は ndjson（既定）/ csv。gzip=1 で gzip 圧縮したファイルを返す。
+    since / until（YYYY-MM-DD、テナント現地日付）で期間を絞り込める。
+    """
+    tenant_id = request.headers.get("X-Tenant-ID")
+    if not tenant_id:
+        return jsonify({"error": "Tenant ID required"}), 400
+
+    if resource not in EXPORT_COLUMNS:
+        return jsonify({"error": "Unknown export"}), 404
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    try:
+        since = date.fromisoformat(request.args["since"]) if request.args.get("since") else None
+        until = date.fromisoformat(request.args["until"]) if request.args.get("until") else None
+    except ValueError:
+        return jsonify({"error": "since / until must be YYYY-MM-DD"}), 400
+
+    compress = request.args.get("gzip", "0") in ("1", "true")
+    statement = export_statement(resource, tenant_id, since, until, status=request.args.get("status"))
+
+    filename = f"{resource}-{date.today().isoformat()}.{fmt}" + (".gz" if compress else "")
+    return Response(
+        stream_with_context(stream_export(statement, fmt, compress)),
+        mimetype="application/gzip" if compress else EXPORT_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            # プロキシでバッファリングせず逐次転送する
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -1,39 +1,86 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select, tuple_
 from app import db
 from models.patient import Patient
+from services.db_pool import read_replica
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor, estimate_count, escape_like
 
 patients_bp = Blueprint("patients", __name__)
 
 
+# 1ページの最大件数
+MAX_PER_PAGE = 100
+
+
 @patients_bp.route("/", methods=["GET"])
+@read_replica
 def get_patients():
-    """患者一覧取得"""
+    """患者一覧取得
+
+    登録日時の新しい順。次ページは next_cursor を cursor に渡して取得する（キーセットページング）。
+    total は exact（COUNT）/ estimate（実行計画の推定値）/ none を指定できる。
+    既定は cursor を渡した場合のみ none、それ以外（page 指定・1ページ目）は従来どおり exact で、
+    total が分かるときは pages も返す。page 指定（OFFSET）も互換のため残している。
+    """
     tenant_id = request.headers.get("X-Tenant-ID")
     if not tenant_id:
         return jsonify({"error": "Tenant ID required"}), 400
     
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 20, type=int)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), MAX_PER_PAGE))
+    cursor = request.args.get("cursor")
+    page = request.args.get("page", type=int)
     status = request.args.get("status", "active")
     search = request.args.get("search", "")
+    total_mode = request.args.get("total", "none" if cursor else "exact")
+    
+    if total_mode not in ("exact", "estimate", "none"):
+        return jsonify({"error": "total must be exact, estimate or none"}), 400
     
-    query = Patient.query.filter_by(tenant_id=tenant_id)
+    query = select(Patient).where(Patient.tenant_id == tenant_id)
     
     if status:
-        query = query.filter_by(status=status)
+        query = query.where(Patient.status == status)
     
     if search:
-        query = query.filter(Patient.display_name.ilike(f"%{search}%"))
+        # 部分一致（pg_trgm インデックスを使用）
+        query = query.where(Patient.display_name.ilike(f"%{escape_like(search)}%", escape="\\"))
     
-    query = query.order_by(Patient.created_at.desc())
-    pagination = query.paginate(page=page, per_page=per_page)
+    total = None
+    if total_mode == "exact":
+        total = db.session.execute(
+            query.with_only_columns(func.count(), maintain_column_froms=True)
+        ).scalar()
+    elif total_mode == "estimate":
+        total = estimate_count(query)
     
-    return jsonify({
-        "patients": [p.to_dict() for p in pagination.items],
-        "total": pagination.total,
-        "pages": pagination.pages,
-        "current_page": page
-    })
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except InvalidCursor:
+            return jsonify({"error": "Invalid cursor"}), 400
+        query = query.where(tuple_(Patient.created_at, Patient.id) < (cursor_created_at, cursor_id))
+    elif page and page > 1:
+        query = query.offset((page - 1) * per_page)
+    
+    patients = db.session.execute(
+        query.order_by(Patient.created_at.desc(), Patient.id.desc()).limit(per_page + 1)
+    ).scalars().all()
+    has_more = len(patients) > per_page
+    patients = patients[:per_page]
+    
+    result = {
+        "patients": [p.to_dict() for p in patients],
+        "next_cursor": encode_cursor(patients[-1].created_at, patients[-1].id) if has_more else None,
+        "has_more": has_more,
+        "total": total,
+        "total_is_estimate": total_mode == "estimate"
+    }
+    if not cursor:
+        result["current_page"] = page or 1
+    if total is not None:
+        result["pages"] = (total + per_page - 1) // per_page
+    
+    return jsonify(result)
 
 
 @patients_bp.route("/<patient_id>", methods=["GET"])
@@ -62,6 +109,15 @@ def update_patient(patient_id):
         patient.display_name = data["display_name"]
     if "status" in data:
         patient.status = data["status"]
+    if "external_id" in data:
+        external_id = data["external_id"] or None
+        if external_id and Patient.query.filter(
+            Patient.tenant_id == patient.tenant_id,
+            Patient.external_id == external_id,
+            Patient.id != patient.id
+        ).first():
+            return jsonify({"error": "External ID already in use"}), 409
+        patient.external_id = external_id
     
     db.session.commit()
     return jsonify(patient.to_dict())
@@ -0,0 +1,56 @@
+from flask import Blueprint, request, jsonify
+from services.cache_service import cache_stats
+from services.db_pool import pool_stats
+from services.dispatch_service import DISPATCH_MODE, get_dispatch_engine
+from services.job_runner import recent_runs
+from services.outbox_service import outbox_stats
+from services.profile_service import profile_stats
+from services.webhook_queue import queue_stats
+
+system_bp = Blueprint("system", __name__)
+
+
+@system_bp.route("/dispatch", methods=["GET"])
+def get_dispatch_stats():
+    """LINE送信エンジンの統計（キュー長・送信中件数）"""
+    return jsonify({
+        "mode": DISPATCH_MODE,
+        **get_dispatch_engine().stats()
+    })
+
+
+@system_bp.route("/cache", methods=["GET"])
+def get_cache_stats():
+    """テナント・テンプレートキャッシュの統計（ヒット率など）"""
+    return jsonify(cache_stats())
+
+
+@system_bp.route("/webhook", methods=["GET"])
+def get_webhook_stats():
+    """Webhook イベントキューの統計（滞留件数・ワーカー状態）"""
+    return jsonify(queue_stats())
+
+
+@system_bp.route("/outbox", methods=["GET"])
+def get_outbox_stats():
+    """LINE 送信アウトボックスの統計（送信待ち・失敗件数・ディスパッチャー状態）"""
+    return jsonify(outbox_stats())
+
+
+@system_bp.route("/profiles", methods=["GET"])
+def get_profile_stats():
+    """LINE プロフィール取得の統計（未取得・期限切れの患者数・ワーカー状態）"""
+    return jsonify(profile_stats())
+
+
+@system_bp.route("/db", methods=["GET"])
+def get_db_stats():
+    """DB 接続プールの統計（Web・ジョブ別の使用中接続数・貸し出し待ち時間）"""
+    return jsonify(pool_stats())
+
+
+@system_bp.route("/jobs", methods=["GET"])
+def get_job_runs():
+    """スケジュールジョブの実行履歴（ジョブごとに新しい順）"""
+    limit = max(1, min(request.args.get("limit", 20, type=int), 200))
+    return jsonify(recent_runs(limit))
@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify
 from app import db
 from models.message_template import MessageTemplate
+from services.cache_service import invalidate_templates
+from services.db_pool import read_replica
+from services.message_render import TemplateError, compile_template
 
 templates_bp = Blueprint("templates", __name__)
 
 
 @templates_bp.route("/", methods=["GET"])
+@read_replica
 def get_templates():
     """テンプレート一覧取得"""
     tenant_id = request.headers.get("X-Tenant-ID")
@@ -33,17 +37,25 @@ def create_template():
     
     data = request.json
     
+    # 使えないプレースホルダーは保存前に拒否
+    try:
+        compile_template(data.get("content") or "")
+    except TemplateError as e:
+        return jsonify({"error": str(e)}), 400
+    
     template = MessageTemplate(
         tenant_id=tenant_id,
         type=data.get("type", "aftercare"),
         name=data.get("name"),
         content=data.get("content"),
         trigger_keywords=data.get("trigger_keywords"),
-        is_active=data.get("is_active", True)
+        is_active=data.get("is_active", True),
+        personalize=data.get("personalize", True)
     )
     
     db.session.add(template)
     db.session.commit()
+    invalidate_templates(tenant_id)
     
     return jsonify(template.to_dict()), 201
 
@@ -54,6 +66,12 @@ def update_template(template_id):
     template = MessageTemplate.query.get_or_404(template_id)
     data = request.json
     
+    if "content" in data:
+        try:
+            compile_template(data["content"] or "")
+        except TemplateError as e:
+            return jsonify({"error": str(e)}), 400
+    
     if "name" in data:
         template.name = data["name"]
     if "content" in data:
@@ -62,8 +80,11 @@ def update_template(template_id):
         template.trigger_keywords = data["trigger_keywords"]
     if "is_active" in data:
         template.is_active = data["is_active"]
+    if "personalize" in data:
+        template.personalize = data["personalize"]
     
     db.session.commit()
+    invalidate_templates(template.tenant_id)
     
     return jsonify(template.to_dict())
 
@@ -72,8 +93,10 @@ def update_template(template_id):
 def delete_template(template_id):
     """テンプレート削除"""
     template = MessageTemplate.query.get_or_404(template_id)
+    tenant_id = template.tenant_id
     db.session.delete(template)
     db.session.commit()
+    invalidate_templates(tenant_id)
     
     return jsonify({"status": "deleted"})
 
@@ -132,6 +155,7 @@ def create_default_templates():
         created.append(template)
     
     db.session.commit()
+    invalidate_templates(tenant_id)
     
     return jsonify({
         "created": len(created),
@@ -1,8 +1,15 @@
+import io
+import uuid
 from datetime import datetime
 from flask import Blueprint, request, jsonify
+from sqlalchemy import select
 from app import db
 from models.patient import Patient
 from models.visit import Visit
+from services.clinic_time import tenant_timezone, local_today, local_date_of, day_range
+from services.db_pool import jobs_pool, read_replica
+from services.import_service import IMPORT_FIELDS, InvalidImportFile, import_visits
+from services.stats_service import record_stats
 
 visits_bp = Blueprint("visits", __name__)
 
@@ -29,6 +36,7 @@ def register_visit():
     
     # 患者の最終来院日更新
     patient.last_visit_at = visit.visit_date
+    record_stats([(patient.tenant_id, visit.visit_date, "visits", 1)])
     
     db.session.commit()
     
@@ -38,6 +46,10 @@ def register_visit():
 @visits_bp.route("/bulk", methods=["POST"])
 def register_visits_bulk():
     """来院登録（一括）- その日来た患者をまとめてチェック"""
+    tenant_id = request.headers.get("X-Tenant-ID")
+    if not tenant_id:
+        return jsonify({"error": "Tenant ID required"}), 400
+    
     data = request.json
     patient_ids = data.get("patient_ids", [])
     visit_date = data.get("visit_date")
@@ -45,51 +57,89 @@ def register_visits_bulk():
     if not patient_ids:
         return jsonify({"error": "Patient IDs required"}), 400
     
-    visit_datetime = datetime.fromisoformat(visit_date) if visit_date else datetime.utcnow()
-    created_visits = []
-    
+    # 形式が不正なIDと重複を除外（順序は維持）
+    requested_ids = []
     for patient_id in patient_ids:
-        patient = Patient.query.get(patient_id)
-        if not patient:
-            continue
-        
-        # 同日の重複チェック
-        existing = Visit.query.filter(
-            Visit.patient_id == patient_id,
-            db.func.date(Visit.visit_date) == visit_datetime.date()
-        ).first()
-        
-        if existing:
+        try:
+            requested_ids.append(uuid.UUID(str(patient_id)))
+        except ValueError:
             continue
+    requested_ids = list(dict.fromkeys(requested_ids))
+    
+    visit_datetime = datetime.fromisoformat(visit_date) if visit_date else datetime.utcnow()
+    tz_name = tenant_timezone(tenant_id)
+    day_start, day_end = day_range(local_date_of(visit_datetime, tz_name), tz_name)
+    
+    # 自テナントの患者のみ（同時に一括登録されても重複しないよう行ロック）
+    valid_ids = set(db.session.execute(
+        select(Patient.id)
+        .where(Patient.tenant_id == tenant_id, Patient.id.in_(requested_ids))
+        .order_by(Patient.id)
+        .with_for_update()
+    ).scalars()) if requested_ids else set()
+    
+    # 同日の重複チェック
+    visited_ids = set(db.session.execute(
+        select(Visit.patient_id).distinct().where(
+            Visit.patient_id.in_(valid_ids),
+            Visit.visit_date >= day_start,
+            Visit.visit_date < day_end
+        )
+    ).scalars()) if valid_ids else set()
+    
+    now = datetime.utcnow()
+    rows = [{
+        "id": uuid.uuid4(),
+        "patient_id": patient_id,
+        "visit_date": visit_datetime,
+        "aftercare_sent": False,
+        "notes": None,
+        "created_at": now
+    } for patient_id in requested_ids if patient_id in valid_ids and patient_id not in visited_ids]
+    
+    if rows:
+        db.session.execute(db.insert(Visit), rows)
         
-        visit = Visit(
-            patient_id=patient_id,
-            visit_date=visit_datetime
+        # 患者の最終来院日更新
+        db.session.execute(
+            db.update(Patient)
+            .where(Patient.id.in_([row["patient_id"] for row in rows]))
+            .values(last_visit_at=visit_datetime)
         )
-        db.session.add(visit)
-        patient.last_visit_at = visit_datetime
-        created_visits.append(visit)
+        record_stats([(tenant_id, visit_datetime, "visits", len(rows))])
     
     db.session.commit()
     
     return jsonify({
-        "created": len(created_visits),
-        "visits": [v.to_dict() for v in created_visits]
+        "created": len(rows),
+        # Visit.to_dict と同じ形式（ORMオブジェクトを作らずに返す）
+        "visits": [{
+            "id": str(row["id"]),
+            "patient_id": str(row["patient_id"]),
+            "visit_date": visit_datetime.isoformat(),
+            "aftercare_sent": False,
+            "aftercare_sent_at": None,
+            "notes": None
+        } for row in rows]
     }), 201
 
 
 @visits_bp.route("/today", methods=["GET"])
+@read_replica
 def get_today_visits():
     """本日の来院一覧"""
     tenant_id = request.headers.get("X-Tenant-ID")
     if not tenant_id:
         return jsonify({"error": "Tenant ID required"}), 400
     
-    today = datetime.utcnow().date()
+    tz_name = tenant_timezone(tenant_id)
+    today = local_today(tz_name)
+    today_start, today_end = day_range(today, tz_name)
     
     visits = Visit.query.join(Patient).filter(
         Patient.tenant_id == tenant_id,
-        db.func.date(Visit.visit_date) == today
+        Visit.visit_date >= today_start,
+        Visit.visit_date < today_end
     ).all()
     
     return jsonify({
@@ -97,3 +147,38 @@ def get_today_visits():
         "count": len(visits),
         "visits": [v.to_dict() for v in visits]
     })
+
+
+@visits_bp.route("/import", methods=["POST"])
+def import_visits_csv():
+    """電子カルテの CSV から来院履歴をインポート
+
+    CSV は multipart の file か、リクエスト本文そのもの。
+    encoding（既定 utf-8、Shift_JIS の場合は cp932）と、列名が異なる場合は
+    <項目名>_column（例: visit_date_column=来院日）を指定する。
+    大きなファイルは `flask import-visits` を使う。
+    """
+    tenant_id = request.headers.get("X-Tenant-ID")
+    if not tenant_id:
+        return jsonify({"error": "Tenant ID required"}), 400
+    
+    upload = request.files.get("file")
+    raw = upload.stream if upload else request.stream
+    columns = {
+        name: request.args[f"{name}_column"]
+        for name in IMPORT_FIELDS if request.args.get(f"{name}_column")
+    }
+    
+    # 大きなファイルが Web 用の statement_timeout に掛からないようジョブ用のプールで取り込む
+    with jobs_pool():
+        try:
+            stream = io.TextIOWrapper(raw, encoding=request.args.get("encoding", "utf-8-sig"), newline="")
+            result = import_visits(tenant_id, stream, columns)
+        except (InvalidImportFile, LookupError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 400
+        
+        db.session.commit()
+    print(f"Visit import for tenant {tenant_id}: {result.imported}/{result.rows} rows imported")
+    
+    return jsonify(result.to_dict())
@@ -5,9 +5,14 @@ import base64
 from flask import Blueprint, request, jsonify
 from app import db
 from models.patient import Patient
-from models.tenant import Tenant
-from models.message_template import MessageTemplate
-from services.line_service import send_line_message
+from services.cache_service import CachedTenant, get_tenant, get_active_template
+from services.keyword_matcher import get_keyword_matcher
+from services.message_render import compile_template, render
+from services.message_log_writer import MessageLogWriter
+from services.outbox_service import OutboxWriter, notify_dispatcher
+from services.follow_service import FollowBatch
+from services.profile_service import notify_enricher
+from services.webhook_queue import WEBHOOK_MODE, enqueue_events, notify_workers
 
 webhook_bp = Blueprint("webhook", __name__)
 
@@ -26,8 +31,8 @@ def verify_signature(body: bytes, signature: str, channel_secret: str) -> bool:
 def line_webhook(tenant_id):
     """LINE Webhookエンドポイント（テナント別）"""
     
-    # テナント取得
-    tenant = Tenant.query.get(tenant_id)
+    # テナント取得（キャッシュ）
+    tenant = get_tenant(tenant_id)
     if not tenant:
         return jsonify({"error": "Tenant not found"}), 404
     
@@ -37,80 +42,92 @@ def line_webhook(tenant_id):
         if not verify_signature(request.data, signature, tenant.line_channel_secret):
             return jsonify({"error": "Invalid signature"}), 400
     
-    # イベント処理
     body = request.json
     events = body.get("events", [])
     
+    if WEBHOOK_MODE == "queue":
+        # キューに保存してすぐに応答（処理はワーカーが受信順に行う）
+        enqueue_events(tenant.id, events)
+        db.session.commit()
+        notify_workers()
+        return jsonify({"status": "ok"})
+    
+    # イベント処理（返信・ウェルカムメッセージは送信ログと一緒にアウトボックスへ書き込む）
+    followed = process_events(tenant, events)
+    db.session.commit()
+    notify_dispatcher()
+    if followed:
+        # 新しい友だちのプロフィールはワーカーが後から取得する
+        notify_enricher()
+    
+    return jsonify({"status": "ok"})
+
+
+def process_events(tenant: CachedTenant, events: list) -> int:
+    """Webhook イベントを順に処理し、友だち追加の件数を返す（最後のコミットは呼び出し側）"""
+    log_writer = MessageLogWriter()
+    outbox = OutboxWriter()
+    follows = FollowBatch(tenant.id)
+    followed = 0
+    
     for event in events:
         event_type = event.get("type")
         user_id = event.get("source", {}).get("userId")
         
         if event_type == "follow":
-            # 友だち追加
-            handle_follow_event(tenant, user_id, event)
+            # 友だち追加（まとめて反映）
+            follows.follow(user_id)
         
         elif event_type == "unfollow":
-            # ブロック
-            handle_unfollow_event(tenant, user_id)
+            # ブロック（まとめて反映）
+            follows.unfollow(user_id)
         
         elif event_type == "message":
+            # 同じユーザーの友だち追加・ブロックを先に反映
+            if user_id in follows:
+                followed += handle_follow_events(tenant, follows, log_writer, outbox)
             # メッセージ受信
-            handle_message_event(tenant, user_id, event)
+            handle_message_event(tenant, user_id, event, log_writer, outbox)
     
-    return jsonify({"status": "ok"})
+    followed += handle_follow_events(tenant, follows, log_writer, outbox)
+    
+    # 送信ログと送信待ちメッセージをまとめて記録
+    log_writer.flush()
+    outbox.flush()
+    return followed
 
 
-def handle_follow_event(tenant: Tenant, user_id: str, event: dict):
-    """友だち追加イベント処理"""
-    # 既存患者チェック
-    patient = Patient.query.filter_by(
-        tenant_id=tenant.id,
-        line_user_id=user_id
-    ).first()
-    
-    if patient:
-        # 再フォロー
-        patient.status = "active"
-    else:
-        # 新規患者
-        patient = Patient(
-            tenant_id=tenant.id,
-            line_user_id=user_id,
-            display_name=event.get("source", {}).get("displayName", ""),
-            status="active"
-        )
-        db.session.add(patient)
-    
-    db.session.commit()
+def handle_follow_events(
+    tenant: CachedTenant,
+    follows: FollowBatch,
+    log_writer: MessageLogWriter,
+    outbox: OutboxWriter
+) -> int:
+    """友だち追加・ブロックイベントを1文で反映し、追加したユーザーにウェルカムメッセージ送信"""
+    changes = follows.apply()
+    followed = [c for c in changes if c.status == "active"]
+    if not followed:
+        return 0
     
     # ウェルカムメッセージ送信
-    welcome_template = MessageTemplate.query.filter_by(
-        tenant_id=tenant.id,
-        type="welcome",
-        is_active=True
-    ).first()
+    welcome_template = get_active_template(tenant.id, "welcome")
     
     if welcome_template:
-        send_line_message(
-            tenant.line_channel_access_token,
-            user_id,
-            welcome_template.content
-        )
-
+        # 友だち追加の時点ではプロフィール未取得のため、患者ごとの項目は既定値で展開
+        content = render(welcome_template.compiled, clinic_name=tenant.clinic_name, tz_name=tenant.timezone)
+        for change in followed:
+            log_id = log_writer.add(change.patient_id, "welcome", content, status="pending")
+            outbox.push(tenant.id, change.line_user_id, content, log_ids=[log_id])
+    return len(followed)
 
-def handle_unfollow_event(tenant: Tenant, user_id: str):
-    """ブロック（フォロー解除）イベント処理"""
-    patient = Patient.query.filter_by(
-        tenant_id=tenant.id,
-        line_user_id=user_id
-    ).first()
-    
-    if patient:
-        patient.status = "blocked"
-        db.session.commit()
 
-
-def handle_message_event(tenant: Tenant, user_id: str, event: dict):
+def handle_message_event(
+    tenant: CachedTenant,
+    user_id: str,
+    event: dict,
+    log_writer: MessageLogWriter,
+    outbox: OutboxWriter
+):
     """メッセージ受信イベント処理"""
     message = event.get("message", {})
     text = message.get("text", "")
@@ -119,34 +136,28 @@ def handle_message_event(tenant: Tenant, user_id: str, event: dict):
     if not text:
         return
     
-    # キーワードマッチング（痛い、合わない等）
-    alert_keywords = ["痛い", "つらい", "合わない", "悪化", "副作用"]
+    # キーワード判定（テンプレートのトリガーキーワード・緊急ワード「痛い」「合わない」等）
+    match = get_keyword_matcher(tenant.id).best_match(text)
     
-    if any(keyword in text for keyword in alert_keywords):
-        # 緊急応答テンプレート
-        alert_template = MessageTemplate.query.filter_by(
-            tenant_id=tenant.id,
-            type="alert_reply",
-            is_active=True
-        ).first()
-        
-        if alert_template:
-            reply_content = alert_template.content
-        else:
-            reply_content = "ご連絡ありがとうございます。診察時間内にお電話ください。"
+    if match:
+        reply_template = match.compiled or compile_template(match.content, strict=False)
     else:
         # 通常応答テンプレート
-        default_template = MessageTemplate.query.filter_by(
-            tenant_id=tenant.id,
-            type="default_reply",
-            is_active=True
-        ).first()
+        default_template = get_active_template(tenant.id, "default_reply")
         
         if default_template:
-            reply_content = default_template.content
+            reply_template = default_template.compiled
         else:
-            reply_content = "お大事になさってください。"
+            reply_template = compile_template("お大事になさってください。")
+    
+    patient = db.session.query(Patient.id, Patient.display_name, Patient.last_visit_at).filter_by(
+        tenant_id=tenant.id,
+        line_user_id=user_id
+    ).first()
+    reply_content = render(reply_template, patient, clinic_name=tenant.clinic_name, tz_name=tenant.timezone)
+    log_ids = []
+    if patient:
+        log_ids.append(log_writer.add(patient.id, "reply", reply_content, status="pending"))
     
     # リプライ送信
-    from services.line_service import reply_line_message
-    reply_line_message(tenant.line_channel_access_token, reply_token, reply_content)
+    outbox.reply(tenant.id, reply_token, reply_content, log_ids=log_ids)
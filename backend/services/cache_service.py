@@ -0,0 +1,264 @@
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+
+# キャッシュの有効期限（秒）。0 でキャッシュ無効
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+# キャッシュごとの最大件数（超えたら最も使われていないものから破棄）
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# 取得した LINE プロフィールのキャッシュ有効期限（秒）
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "3600"))
+
+# キャッシュ無効化を通知するチャネル名
+INVALIDATION_CHANNEL = "cache.invalidate"
+
+
+class TTLCache:
+    """TTL + LRU のスレッドセーフなキャッシュ（ヒット・ミス数を記録）"""
+
+    def __init__(self, name: str, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_load(self, key, loader: Callable):
+        """キャッシュから取得し、なければ loader の結果を保存して返す（None も保存）"""
+        if self.ttl <= 0:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[1]
+            self._counters["misses"] += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            # 読み込み中に無効化された場合は古い値を保存しない
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters["evictions"] += 1
+        return value
+
+    def get_many(self, keys) -> dict:
+        """有効期限内のキーだけを {キー: 値} で返す"""
+        if self.ttl <= 0:
+            return {}
+
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    found[key] = entry[1]
+                else:
+                    self._counters["misses"] += 1
+        return found
+
+    def put_many(self, items: dict):
+        """{キー: 値} をまとめて保存"""
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            for key, value in items.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, predicate: Optional[Callable] = None):
+        """predicate に一致するキー（None は全件）を破棄"""
+        with self._lock:
+            self._generation += 1
+            self._counters["invalidations"] += 1
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        """件数・ヒット率などの統計"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else None
+            }
+
+
+class LocalPubSub:
+    """プロセス内の Pub/Sub
+
+    ワーカー間で無効化を共有する場合は、同じ publish/subscribe を持つ
+    Redis 等の実装に差し替える。届かなかった通知は TTL で補われる。
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel: str, callback: Callable[[dict], None]):
+        with self._lock:
+            self._subscribers[channel].append(callback)
+
+    def publish(self, channel: str, message: dict):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, []))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"PubSub subscriber error: {channel}: {e}")
+
+
+pubsub = LocalPubSub()
+
+tenant_cache = TTLCache("tenants")
+template_cache = TTLCache("templates")
+matcher_cache = TTLCache("keyword_matchers")
+# (template_id, updated_at) → 解析済みテンプレート（更新するとキーが変わる）
+compiled_template_cache = TTLCache("compiled_templates")
+# (tenant_id, line_user_id) → 取得できた LINE プロフィール
+profile_cache = TTLCache("line_profiles", ttl=PROFILE_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class CachedTenant:
+    """キャッシュ用のテナント情報（セッションに紐づかない読み取り専用コピー）"""
+
+    id: object
+    clinic_name: str
+    line_channel_secret: Optional[str]
+    line_channel_access_token: Optional[str]
+    subscription_status: Optional[str]
+    timezone: str
+
+
+@dataclass(frozen=True)
+class CachedTemplate:
+    """キャッシュ用の有効テンプレート情報"""
+
+    id: object
+    tenant_id: object
+    type: str
+    content: str
+    trigger_keywords: Optional[str]
+    updated_at: Optional[datetime]
+
+    @property
+    def compiled(self):
+        """解析済みのテンプレート（services.message_render）"""
+        from services.message_render import get_compiled
+
+        return get_compiled(self.id, self.updated_at, self.content)
+
+
+def get_tenant(tenant_id) -> Optional[CachedTenant]:
+    """テナント取得（存在しない場合は None。未登録IDはキャッシュしない）"""
+    from models.tenant import Tenant
+
+    key = str(tenant_id)
+
+    def load():
+        tenant = Tenant.query.get(tenant_id)
+        if tenant is None:
+            raise LookupError(key)
+        return CachedTenant(
+            id=tenant.id,
+            clinic_name=tenant.clinic_name,
+            line_channel_secret=tenant.line_channel_secret,
+            line_channel_access_token=tenant.line_channel_access_token,
+            subscription_status=tenant.subscription_status,
+            timezone=tenant.timezone
+        )
+
+    try:
+        return tenant_cache.get_or_load(key, load)
+    except LookupError:
+        return None
+
+
+def get_active_template(tenant_id, template_type: str) -> Optional[CachedTemplate]:
+    """テナントの有効なテンプレート（最新の1件）取得"""
+    from models.message_template import MessageTemplate
+
+    def load():
+        template = MessageTemplate.query.filter_by(
+            tenant_id=tenant_id,
+            type=template_type,
+            is_active=True
+        ).order_by(MessageTemplate.created_at.desc()).first()
+        if template is None:
+            return None
+        return CachedTemplate(
+            id=template.id,
+            tenant_id=template.tenant_id,
+            type=template.type,
+            content=template.content,
+            trigger_keywords=template.trigger_keywords,
+            updated_at=template.updated_at
+        )
+
+    return template_cache.get_or_load((str(tenant_id), template_type), load)
+
+
+def invalidate_tenant(tenant_id):
+    """テナント情報の変更を通知（コミット後に呼ぶ）"""
+    pubsub.publish(INVALIDATION_CHANNEL, {"kind": "tenant", "tenant_id": str(tenant_id)})
+
+
+def invalidate_templates(tenant_id):
+    """テナントのテンプレート変更を通知（コミット後に呼ぶ）"""
+    pubsub.publish(INVALIDATION_CHANNEL, {"kind": "templates", "tenant_id": str(tenant_id)})
+
+
+def _on_invalidate(message: dict):
+    tenant_id = message.get("tenant_id")
+    if message.get("kind") == "tenant":
+        tenant_cache.invalidate(lambda key: key == tenant_id)
+    elif message.get("kind") == "templates":
+        template_cache.invalidate(lambda key: key[0] == tenant_id)
+        matcher_cache.invalidate(lambda key: key == tenant_id)
+
+
+pubsub.subscribe(INVALIDATION_CHANNEL, _on_invalidate)
+
+
+def cache_stats() -> dict:
+    """キャッシュごとの統計"""
+    return {
+        tenant_cache.name: tenant_cache.stats(),
+        template_cache.name: template_cache.stats(),
+        matcher_cache.name: matcher_cache.stats(),
+        compiled_template_cache.name: compiled_template_cache.stats(),
+        profile_cache.name: profile_cache.stats()
+    }
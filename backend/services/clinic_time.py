@@ -0,0 +1,48 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func
+
+
+# クリニックのタイムゾーン未設定時の既定値
+DEFAULT_TIMEZONE = "Asia/Tokyo"
+
+
+def tenant_timezone(tenant_id: Optional[str]) -> str:
+    """テナントのタイムゾーン名を取得"""
+    from services.cache_service import get_tenant
+
+    if not tenant_id:
+        return DEFAULT_TIMEZONE
+    tenant = get_tenant(tenant_id)
+    return (tenant and tenant.timezone) or DEFAULT_TIMEZONE
+
+
+def local_today(tz_name: str) -> date:
+    """クリニック現地時間での今日の日付"""
+    return datetime.now(ZoneInfo(tz_name)).date()
+
+
+def local_date_of(utc_dt: datetime, tz_name: str) -> date:
+    """UTC（naive）日時をクリニック現地の日付に変換"""
+    return utc_dt.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name)).date()
+
+
+def local_midnight_utc(day: date, tz_name: str) -> datetime:
+    """現地日付の0時をUTC（naive、DB保存形式）で返す"""
+    local = datetime.combine(day, time.min, tzinfo=ZoneInfo(tz_name))
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def day_range(day: date, tz_name: str) -> tuple:
+    """現地日付1日分の半開区間 [start, end)（UTC naive）"""
+    return (
+        local_midnight_utc(day, tz_name),
+        local_midnight_utc(day + timedelta(days=1), tz_name)
+    )
+
+
+def local_date(column, tz_name: str):
+    """UTC保存の日時カラムを現地日付に変換するSQL式（SELECT/GROUP BY 用）"""
+    return func.date(func.timezone(tz_name, func.timezone("UTC", column)))
@@ -0,0 +1,460 @@
+import functools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+# Web リクエスト用のプール
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# 接続が空くのを待つ最大秒数（超えると sqlalchemy.exc.TimeoutError）
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# この秒数より古い接続は使う前に張り直す（PgBouncer・LB のアイドル切断対策）
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# 貸し出し前に接続の生存確認をする
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# 1文の最大実行時間・ロック待ちの最大時間（ミリ秒、0 は無制限）
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "5000"))
+
+# スケジュールジョブ・ワーカー（アウトボックス・Webhook キュー・プロフィール取得）・CLI 用のプール
+# Web のプールと分けて、ジョブの接続が Web リクエストを待たせないようにする
+DATABASE_JOBS_URL = os.getenv("DATABASE_JOBS_URL")  # 省略時は DATABASE_URL
+DB_JOBS_POOL_SIZE = int(os.getenv("DB_JOBS_POOL_SIZE", "10"))
+DB_JOBS_MAX_OVERFLOW = int(os.getenv("DB_JOBS_MAX_OVERFLOW", "10"))
+DB_JOBS_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_JOBS_STATEMENT_TIMEOUT_MS", "0"))
+DB_JOBS_LOCK_TIMEOUT_MS = int(os.getenv("DB_JOBS_LOCK_TIMEOUT_MS", "30000"))
+
+# PgBouncer のトランザクションプーリング経由で接続する
+# 接続時の options（-c statement_timeout=...）は使えないため、タイムアウトはトランザクションごとに SET LOCAL する。
+# アドバイザリロック（ジョブの排他・Webhook キューのパーティション）はセッション単位なので、
+# DATABASE_JOBS_URL に PgBouncer を通さない直接接続を指定する。
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# この時間（ミリ秒）以上待った貸し出しを slow として数える
+DB_SLOW_CHECKOUT_MS = float(os.getenv("DB_SLOW_CHECKOUT_MS", "100"))
+
+# 読み取り専用のエンドポイント（@read_replica）を振り分けるレプリカ（カンマ区切り、省略時はプライマリのみ）
+# プールの大きさ・タイムアウトは Web 用と同じ
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# レプリケーション遅延がこの秒数を超えたレプリカは使わない（全レプリカが超えたらプライマリ）
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+# 遅延を確認する間隔（秒）
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "2"))
+# 停止したレプリカへの接続で待たないよう接続タイムアウト（秒）を短くする
+DB_REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "3"))
+# テナントが書き込んでからこの秒数の間、そのテナントの読み取りは書き込み時点の WAL 位置を
+# 適用済みのレプリカかプライマリで行う（read-your-writes、全ワーカー共通）。
+# 既定は DB_REPLICA_MAX_LAG_SECONDS（使うレプリカの遅延はこれ以下なので、経過後は書き込みが必ず見える）
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", str(DB_REPLICA_MAX_LAG_SECONDS)))
+
+JOBS_BIND = "jobs"
+REPLICA_ROLE = "replica"
+REPLICA_BINDS = [f"replica_{n}" for n in range(len(DATABASE_REPLICA_URLS))]
+
+_pool_role = ContextVar("db_pool_role", default="web")
+
+
+class CheckoutMetrics:
+    """接続の貸し出し待ち時間の統計（新規接続の確立時間を含む）"""
+
+    def __init__(self, recent: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent)
+        self._counters = {"checkouts": 0, "slow": 0, "timeouts": 0}
+        self._total = 0.0
+        self._max = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self._recent.append(seconds)
+            self._total += seconds
+            self._max = max(self._max, seconds)
+            if timed_out:
+                self._counters["timeouts"] += 1
+                return
+            self._counters["checkouts"] += 1
+            if seconds * 1000 >= DB_SLOW_CHECKOUT_MS:
+                self._counters["slow"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            attempts = self._counters["checkouts"] + self._counters["timeouts"]
+
+            def percentile(p: float):
+                return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 3) if recent else None
+
+            return {
+                **self._counters,
+                "wait_ms_avg": round(self._total / attempts * 1000, 3) if attempts else None,
+                "wait_ms_max": round(self._max * 1000, 3),
+                # 直近の貸し出し
+                "wait_ms_p50": percentile(0.5),
+                "wait_ms_p99": percentile(0.99),
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """貸し出し待ち時間を記録する QueuePool"""
+
+    def __init__(self, *args, metrics: CheckoutMetrics = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or CheckoutMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # dispose() 後も統計を引き継ぐ
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _transaction_pooled(role: str) -> bool:
+    """PgBouncer のトランザクションプーリング経由で接続するか"""
+    return DB_PGBOUNCER and (role != "jobs" or not DATABASE_JOBS_URL)
+
+
+def _timeouts(role: str) -> tuple:
+    """(statement_timeout, lock_timeout) ミリ秒"""
+    if role != "jobs":
+        return DB_STATEMENT_TIMEOUT_MS, DB_LOCK_TIMEOUT_MS
+    return DB_JOBS_STATEMENT_TIMEOUT_MS, DB_JOBS_LOCK_TIMEOUT_MS
+
+
+def engine_options(role: str = "web") -> dict:
+    """Web（role="web"）・ジョブ（role="jobs"）・レプリカ（role="replica"）用のエンジン設定"""
+    if role != "jobs":
+        pool_size, max_overflow = DB_POOL_SIZE, DB_MAX_OVERFLOW
+    else:
+        pool_size, max_overflow = DB_JOBS_POOL_SIZE, DB_JOBS_MAX_OVERFLOW
+    statement_timeout, lock_timeout = _timeouts(role)
+
+    options = {
+        "poolclass": MeteredQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"application_name": f"medcrm-{role}"},
+    }
+    if role == REPLICA_ROLE:
+        options["connect_args"]["connect_timeout"] = DB_REPLICA_CONNECT_TIMEOUT
+    if not _transaction_pooled(role):
+        options["connect_args"]["options"] = (
+            f"-c statement_timeout={statement_timeout} -c lock_timeout={lock_timeout}"
+        )
+    return options
+
+
+def binds_config(database_url: str) -> dict:
+    """SQLALCHEMY_BINDS に登録するジョブ用・レプリカ用エンジンの設定"""
+    binds = {JOBS_BIND: {"url": DATABASE_JOBS_URL or database_url, **engine_options("jobs")}}
+    for bind, url in zip(REPLICA_BINDS, DATABASE_REPLICA_URLS):
+        binds[bind] = {"url": url, **engine_options(REPLICA_ROLE)}
+    return binds
+
+
+def _engines(db) -> list:
+    """(役割, バインド名, エンジン) の一覧（アプリコンテキスト内で呼ぶ）"""
+    engines = [("web", "web", db.engines[None]), ("jobs", JOBS_BIND, db.engines[JOBS_BIND])]
+    return engines + [(REPLICA_ROLE, bind, db.engines[bind]) for bind in REPLICA_BINDS]
+
+
+def configure_engines(db, app):
+    """エンジン作成後の設定（create_app の init_app 後に呼ぶ）"""
+    if DB_PGBOUNCER and not DATABASE_JOBS_URL:
+        print("Warning: DB_PGBOUNCER is set without DATABASE_JOBS_URL; "
+              "job and webhook queue advisory locks need a direct (session) connection")
+
+    with app.app_context():
+        for role, _, engine in _engines(db):
+            if _transaction_pooled(role):
+                _set_local_timeouts(engine, role)
+
+
+def _set_local_timeouts(engine, role: str):
+    """トランザクションの開始ごとにタイムアウトを SET LOCAL（PgBouncer のトランザクションプーリング用）"""
+    statement_timeout, lock_timeout = _timeouts(role)
+    sql = f"SET LOCAL statement_timeout = {statement_timeout}; SET LOCAL lock_timeout = {lock_timeout}"
+
+    @event.listens_for(engine, "begin")
+    def set_timeouts(connection):
+        if connection.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            connection.exec_driver_sql(sql)
+
+
+# プライマリのレプリケーション遅延（秒）と適用済みの WAL 位置。受信済みの WAL をすべて適用済みなら遅延 0
+# （プライマリに更新がない間は最終適用時刻が古くても遅れていない）
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END,
+CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END::text
+"""
+
+
+def parse_lsn(lsn: str) -> int:
+    """PostgreSQL の LSN（"16/B374D848"）を比較できる整数に変換"""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class ReplicaMonitor:
+    """レプリカごとの遅延と適用済みの WAL 位置を確認し、リクエストで使うレプリカを選ぶ
+
+    確認はプロセスごとのバックグラウンドスレッドが DB_REPLICA_CHECK_INTERVAL 秒ごとに行い、
+    リクエストは前回の結果だけを見る（リクエスト内で確認を待たない）。
+    接続できないレプリカは次の確認まで使わない。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}  # バインド名 -> {"lag": 秒 or None, "replay_lsn": int or None, "error": str or None}
+        self._engines = {}
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._counters = {"replica_requests": 0, "fallback_requests": 0, "sticky_requests": 0}
+
+    def _ensure_started(self, engines: dict):
+        """このプロセスの確認スレッドを起動（fork 後の子プロセスでは起動し直す）"""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            self._engines = dict(engines)
+            self._state = {}
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+            self._pid = pid
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for bind, engine in self._engines.items():
+                self._check(bind, engine)
+            self._stop.wait(DB_REPLICA_CHECK_INTERVAL)
+
+    def _check(self, bind: str, engine):
+        lag, replay_lsn, error = None, None, None
+        try:
+            with engine.connect() as connection:
+                lag, lsn = connection.exec_driver_sql(REPLICA_LAG_SQL).one()
+                lag, replay_lsn = float(lag), parse_lsn(lsn) if lsn else None
+        except Exception as e:
+            error = str(e).splitlines()[0]
+            print(f"Replica {bind} check failed: {error}")
+        with self._lock:
+            self._state[bind] = {"lag": lag, "replay_lsn": replay_lsn, "error": error}
+
+    def choose(self, engines: dict, min_lsn=None):
+        """リクエストで使うレプリカのエンジン（なければ None）
+
+        遅延が DB_REPLICA_MAX_LAG_SECONDS 以下で、min_lsn（テナントが最後に書き込んだ
+        プライマリの WAL 位置）を適用済みのレプリカから1つ選ぶ。
+        """
+        self._ensure_started(engines)
+        with self._lock:
+            usable = [
+                bind for bind in engines
+                if (state := self._state.get(bind)) and state["lag"] is not None
+                and state["lag"] <= DB_REPLICA_MAX_LAG_SECONDS
+            ]
+            if min_lsn is not None:
+                caught_up = [
+                    bind for bind in usable
+                    if self._state[bind]["replay_lsn"] is not None and self._state[bind]["replay_lsn"] >= min_lsn
+                ]
+                if usable and not caught_up:
+                    self._counters["sticky_requests"] += 1
+                usable = caught_up
+            self._counters["replica_requests" if usable else "fallback_requests"] += 1
+        return engines[random.choice(usable)] if usable else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "replicas": {
+                    bind: {
+                        "lag_seconds": state["lag"],
+                        "replay_lsn": f"{state['replay_lsn'] >> 32:X}/{state['replay_lsn'] & 0xFFFFFFFF:X}"
+                        if state["replay_lsn"] is not None else None,
+                        "error": state["error"]
+                    }
+                    for bind, state in self._state.items()
+                },
+            }
+
+
+replica_monitor = ReplicaMonitor()
+
+# @read_replica のリクエストで使うレプリカのエンジン（リクエストの最初に1回選ぶ）
+_replica_engine = ContextVar("db_replica_engine", default=None)
+
+# テナントの最後の書き込み時点のプライマリの WAL 位置（tenant_write_lsns）。全ワーカー・プロセスが同じ表を見るので、
+# どのワーカーが読み取りを受けても、その位置を適用済みのレプリカだけを使う
+RECORD_WRITE_LSN_SQL = """
+INSERT INTO tenant_write_lsns (tenant_id, write_lsn, written_at)
+VALUES (CAST(:tenant_id AS uuid), (pg_current_wal_lsn() - '0/0'::pg_lsn)::bigint, now() AT TIME ZONE 'UTC')
+ON CONFLICT (tenant_id) DO UPDATE SET
+    write_lsn = GREATEST(tenant_write_lsns.write_lsn, EXCLUDED.write_lsn),
+    written_at = EXCLUDED.written_at
+"""
+
+# DB_REPLICA_STICKY_SECONDS 以内の書き込みだけを見る（経過後は使うレプリカが必ず適用済み）
+TENANT_WRITE_LSN_SQL = """
+SELECT write_lsn FROM tenant_write_lsns
+WHERE tenant_id = CAST(:tenant_id AS uuid)
+  AND written_at > now() AT TIME ZONE 'UTC' - make_interval(secs => :sticky_seconds)
+"""
+
+
+def _request_tenant():
+    """管理画面からのリクエストのテナントID（X-Tenant-ID ヘッダー）
+
+    LINE の Webhook（URL にテナントID）の書き込みはクリニックの操作ではないので
+    read-your-writes の対象にしない。
+    """
+    if not has_request_context():
+        return None
+    return request.headers.get("X-Tenant-ID")
+
+
+def _tenant_write_lsn(tenant_id):
+    """テナントが DB_REPLICA_STICKY_SECONDS 以内に書き込んだ時点の WAL 位置（なければ None）
+
+    プライマリの主キー検索1回。レプリカを選ぶ前に Web 用のプールの接続ですぐ返す。
+    """
+    if tenant_id is None:
+        return None
+    from app import db
+
+    with db.engines[None].connect() as connection:
+        return connection.execute(
+            db.text(TENANT_WRITE_LSN_SQL), {"tenant_id": tenant_id, "sticky_seconds": DB_REPLICA_STICKY_SECONDS}
+        ).scalar()
+
+
+class RoutingSession(Session):
+    """ジョブ用のコンテキストではジョブ用のエンジン、@read_replica の中ではそのリクエストのレプリカを使うセッション"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        role = _pool_role.get()
+        if bind is None and role == JOBS_BIND:
+            engine = self._db.engines.get(JOBS_BIND)
+            if engine is not None:
+                return engine
+        if bind is None and role == REPLICA_ROLE and not self._flushing:
+            return _replica_engine.get()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        super().commit()
+        # リクエスト中のコミットは管理画面の書き込みとしてテナントの WAL 位置を記録する
+        tenant_id = _request_tenant() if REPLICA_BINDS else None
+        if tenant_id is None:
+            return
+        try:
+            super().execute(text(RECORD_WRITE_LSN_SQL), {"tenant_id": tenant_id})
+            super().commit()
+        except Exception as e:
+            super().rollback()
+            print(f"Tenant write LSN record failed: {e}")
+
+
+def read_replica(view):
+    """読み取り専用のエンドポイントをレプリカで処理するデコレーター
+
+    レプリカはリクエストの最初に1回選び、リクエスト中の SQL はすべて同じレプリカで実行する。
+    レプリカ未設定・遅延超過、または X-Tenant-ID のテナントが直前に書き込んだ WAL 位置
+    （tenant_write_lsns）をまだ適用していない場合はプライマリで処理する。
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not REPLICA_BINDS:
+            return view(*args, **kwargs)
+        from app import db
+
+        try:
+            min_lsn = _tenant_write_lsn(_request_tenant())
+        except Exception as e:
+            print(f"Tenant write LSN lookup failed: {e}")
+            return view(*args, **kwargs)
+        engine = replica_monitor.choose({name: db.engines[name] for name in REPLICA_BINDS}, min_lsn)
+        if engine is None:
+            return view(*args, **kwargs)
+        engine_token = _replica_engine.set(engine)
+        role_token = _pool_role.set(REPLICA_ROLE)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _pool_role.reset(role_token)
+            _replica_engine.reset(engine_token)
+
+    return wrapper
+
+
+@contextmanager
+def jobs_pool():
+    """この中の db.session はジョブ用のプールを使う（スレッド・コンテキストごと）"""
+    token = _pool_role.set(JOBS_BIND)
+    try:
+        yield
+    finally:
+        _pool_role.reset(token)
+
+
+def use_jobs_pool():
+    """現在のスレッド（コンテキスト）の以降の処理でジョブ用のプールを使う（専用プロセス・ベンチマーク用）"""
+    _pool_role.set(JOBS_BIND)
+
+
+def jobs_engine():
+    """ジョブ用のエンジン（アドバイザリロック用の接続など。アプリコンテキスト内で呼ぶ）"""
+    from app import db
+
+    return db.engines[JOBS_BIND]
+
+
+def pool_stats() -> dict:
+    """プールごとの接続数・貸し出し待ち時間"""
+    from app import db
+
+    pools = {}
+    for _, bind, engine in _engines(db):
+        pool = engine.pool
+        pools[bind] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **pool.metrics.stats(),
+        }
+    return {"pgbouncer": DB_PGBOUNCER, "pools": pools, "replication": replica_monitor.stats()}
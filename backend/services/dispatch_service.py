@@ -0,0 +1,343 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+
+import aiohttp
+
+from services.line_service import LINE_API_BASE, RETRY_STATUSES, get_line_client
+
+
+# sync: 呼び出しスレッドで送信 / async: 非同期ディスパッチエンジン経由で送信
+DISPATCH_MODE = os.getenv("LINE_DISPATCH_MODE", "sync")
+
+
+@dataclass
+class SendJob:
+    """LINE送信ジョブ"""
+
+    access_token: str
+    endpoint: str  # push, multicast, reply
+    payload: dict
+    retry_key: Optional[str] = field(default=None)
+
+    @classmethod
+    def push(cls, access_token: str, user_id: str, message: str, retry_key: Optional[str] = None) -> "SendJob":
+        return cls(access_token, "push", {
+            "to": user_id,
+            "messages": [{"type": "text", "text": message}]
+        }, retry_key or str(uuid.uuid4()))
+
+    @classmethod
+    def multicast(cls, access_token: str, user_ids: list, message: str, retry_key: Optional[str] = None) -> "SendJob":
+        return cls(access_token, "multicast", {
+            "to": user_ids,
+            "messages": [{"type": "text", "text": message}]
+        }, retry_key or str(uuid.uuid4()))
+
+    @classmethod
+    def reply(cls, access_token: str, reply_token: str, message: str) -> "SendJob":
+        return cls(access_token, "reply", {
+            "replyToken": reply_token,
+            "messages": [{"type": "text", "text": message}]
+        })
+
+
+@dataclass
+class ProfileJob:
+    """LINE プロフィール取得ジョブ（送信と同じチャネルのレート制限を受ける）"""
+
+    access_token: str
+    user_id: str
+    endpoint = "profile"
+
+
+class TokenBucket:
+    """トークンバケット（チャネル単位のレート制限）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """トークンを1つ取得（不足時は補充まで待機）"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DispatchEngine:
+    """asyncio ベースの LINE 送信エンジン
+
+    チャネル（アクセストークン）ごとにキューとトークンバケットを持ち、
+    大規模クリニックの送信が他テナントの送信を待たせないようにする。
+    """
+
+    def __init__(
+        self,
+        base_url: str = LINE_API_BASE,
+        rate_per_channel: float = 100,
+        burst: float = 100,
+        max_in_flight: int = 100,
+        per_channel_concurrency: int = 10,
+        max_retries: int = 3,
+        timeout: float = 10.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.rate_per_channel = rate_per_channel
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.per_channel_concurrency = per_channel_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._queues = {}
+        self._drainers = {}
+        self._buckets = {}
+        self._in_flight = 0
+        self._counters = {"sent": 0, "failed": 0, "retried": 0, "profiles": 0}
+
+    @classmethod
+    def from_env(cls) -> "DispatchEngine":
+        """環境変数の設定からエンジンを作成"""
+        return cls(
+            base_url=LINE_API_BASE,
+            rate_per_channel=float(os.getenv("LINE_DISPATCH_RATE", "100")),
+            burst=float(os.getenv("LINE_DISPATCH_BURST", "100")),
+            max_in_flight=int(os.getenv("LINE_DISPATCH_MAX_IN_FLIGHT", "100")),
+            per_channel_concurrency=int(os.getenv("LINE_DISPATCH_CHANNEL_CONCURRENCY", "10")),
+            max_retries=int(os.getenv("LINE_MAX_RETRIES", "3")),
+            timeout=float(os.getenv("LINE_READ_TIMEOUT", "10"))
+        )
+
+    def start(self):
+        """イベントループをバックグラウンドスレッドで起動（複数スレッドから呼ばれても1回だけ）"""
+        with self._start_lock:
+            if self._thread is None:
+                self._started.clear()
+                self._thread = threading.Thread(target=self._run, name="line-dispatch", daemon=True)
+                self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        """送信中のジョブを待たずに停止"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._loop = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._setup())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    def submit(self, job) -> Future:
+        """ジョブを投入（スレッドセーフ）。結果は SendJob は Future[bool]、ProfileJob は Future[Optional[dict]]"""
+        self.start()
+        future = Future()
+        self._loop.call_soon_threadsafe(self._enqueue, job, future)
+        return future
+
+    def _enqueue(self, job, future: Future):
+        channel = job.access_token
+        queue = self._queues.get(channel)
+        if queue is None:
+            queue = self._queues[channel] = asyncio.Queue()
+            self._buckets.setdefault(channel, TokenBucket(self.rate_per_channel, self.burst))
+        queue.put_nowait((job, future))
+
+        # チャネルごとの送信タスク（空になったら終了）
+        if channel not in self._drainers:
+            self._drainers[channel] = [
+                self._loop.create_task(self._drain(channel))
+                for _ in range(self.per_channel_concurrency)
+            ]
+
+    async def _drain(self, channel: str):
+        queue = self._queues[channel]
+        bucket = self._buckets[channel]
+
+        while not queue.empty():
+            job, future = queue.get_nowait()
+            await bucket.acquire()
+            profile = isinstance(job, ProfileJob)
+            async with self._semaphore:
+                self._in_flight += 1
+                try:
+                    result = await (self._get_profile(job) if profile else self._send(job))
+                except Exception as e:
+                    print(f"LINE dispatch error: {job.endpoint}: {e}")
+                    result = None if profile else False
+                finally:
+                    self._in_flight -= 1
+            if profile:
+                self._counters["profiles" if result is not None else "failed"] += 1
+            else:
+                self._counters["sent" if result else "failed"] += 1
+            future.set_result(result)
+
+        tasks = self._drainers.get(channel, [])
+        if all(t.done() or t is asyncio.current_task() for t in tasks):
+            self._drainers.pop(channel, None)
+            if queue.empty():
+                self._queues.pop(channel, None)
+
+    async def _send(self, job: SendJob) -> bool:
+        headers = {"Authorization": f"Bearer {job.access_token}"}
+        if job.retry_key:
+            headers["X-Line-Retry-Key"] = job.retry_key
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._session.post(
+                    f"{self.base_url}/message/{job.endpoint}",
+                    headers=headers,
+                    json=job.payload
+                ) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"LINE dispatch request failed: {job.endpoint}: {e}")
+                status, retry_after = None, None
+
+            if status == 200 or (status == 409 and job.retry_key):
+                return True
+            if status is not None and status not in RETRY_STATUSES:
+                return False
+            # リトライキーのない送信（reply）は LINE 側で処理済みかもしれないので、
+            # 受け付けられていないことが確かな 429 以外は再送しない
+            if not job.retry_key and status != 429:
+                return False
+            if attempt < self.max_retries:
+                self._counters["retried"] += 1
+                await asyncio.sleep(_retry_delay(retry_after, attempt))
+        return False
+
+    async def _get_profile(self, job: ProfileJob) -> Optional[dict]:
+        headers = {"Authorization": f"Bearer {job.access_token}"}
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._session.get(f"{self.base_url}/profile/{job.user_id}", headers=headers) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    if status == 200:
+                        return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"LINE dispatch request failed: profile: {e}")
+                status, retry_after = None, None
+
+            # 404 はブロック済み・友だちでないユーザー
+            if status is not None and status not in RETRY_STATUSES:
+                return None
+            if attempt < self.max_retries:
+                self._counters["retried"] += 1
+                await asyncio.sleep(_retry_delay(retry_after, attempt))
+        return None
+
+    def stats(self) -> dict:
+        """キュー長・送信中件数などの統計"""
+        return {
+            "running": self._thread is not None,
+            "queue_depth": sum(q.qsize() for q in list(self._queues.values())),
+            "in_flight": self._in_flight,
+            "channels": len(self._queues),
+            **self._counters
+        }
+
+
+def _retry_delay(retry_after: Optional[str], attempt: int) -> float:
+    """Retry-After（秒）を優先し、なければ指数バックオフ"""
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return 0.5 * 2 ** attempt
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+def get_dispatch_engine() -> DispatchEngine:
+    """ワーカープロセス共有のディスパッチエンジン取得（fork後は作り直す）"""
+    global _engine, _engine_pid
+
+    pid = os.getpid()
+    if _engine is None or _engine_pid != pid:
+        with _engine_lock:
+            if _engine is None or _engine_pid != pid:
+                _engine = DispatchEngine.from_env()
+                _engine_pid = pid
+    return _engine
+
+
+def _send_sync(job: SendJob) -> bool:
+    """呼び出しスレッドで送信"""
+    client = get_line_client()
+    if job.endpoint == "reply":
+        return client.reply(job.access_token, job.payload["replyToken"], job.payload["messages"])
+    if job.endpoint == "multicast":
+        return client.multicast(job.access_token, job.payload["to"], job.payload["messages"], job.retry_key)
+    return client.push(job.access_token, job.payload["to"], job.payload["messages"], job.retry_key)
+
+
+def dispatch(jobs: list) -> list:
+    """ジョブをまとめて送信し、成否のリストを返す"""
+    if DISPATCH_MODE != "async":
+        return [_send_sync(job) for job in jobs]
+
+    engine = get_dispatch_engine()
+    futures = [engine.submit(job) for job in jobs]
+    return [future.result() for future in futures]
+
+
+def fetch_profiles(jobs: list) -> list:
+    """プロフィールをまとめて取得し、プロフィール（取得できなければ None）のリストを返す
+
+    LINE_DISPATCH_MODE に関わらず常にディスパッチエンジンを使い、チャネルごとの
+    レート制限（トークンバケット）の範囲で並行に取得する。
+    """
+    engine = get_dispatch_engine()
+    futures = [engine.submit(job) for job in jobs]
+    return [future.result() for future in futures]
+
+
+def dispatch_background(job: SendJob):
+    """結果を待たずに送信（async モード以外はその場で送信）"""
+    if DISPATCH_MODE != "async":
+        _send_sync(job)
+        return
+    get_dispatch_engine().submit(job)
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import DateTime, Text, cast, select
+from sqlalchemy.dialects.postgresql import UUID
+
+from app import db
+from models.patient import Patient
+from models.visit import Visit
+from models.message_log import MessageLog
+from services.clinic_time import local_midnight_utc, tenant_timezone
+
+
+# サーバーサイドカーソルから1回に取り出す行数（この単位で書き出す）
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# エクスポート対象ごとの出力カラム（順序は CSV の列順）
+EXPORT_COLUMNS = {
+    "patients": (
+        Patient.id, Patient.line_user_id, Patient.display_name, Patient.status,
+        Patient.last_visit_at, Patient.created_at, Patient.updated_at
+    ),
+    "visits": (
+        Visit.id, Visit.patient_id, Visit.visit_date, Visit.aftercare_sent,
+        Visit.aftercare_sent_at, Visit.notes, Visit.created_at
+    ),
+    "message_logs": (
+        MessageLog.id, MessageLog.patient_id, MessageLog.message_type, MessageLog.content,
+        MessageLog.status, MessageLog.line_message_id, MessageLog.sent_at
+    ),
+}
+
+# 期間指定（since / until）の対象カラム
+PERIOD_COLUMNS = {
+    "patients": Patient.created_at,
+    "visits": Visit.visit_date,
+    "message_logs": MessageLog.sent_at,
+}
+
+
+def export_statement(resource: str, tenant_id, since: Optional[date] = None,
+                     until: Optional[date] = None, status: Optional[str] = None):
+    """テナント分のエクスポート用 SELECT（期間はテナント現地日付、until は当日を含む）
+
+    並び順は指定しない（全件を順に読み出すだけなのでソートを避ける）。
+    """
+    # UUID は Python 側で uuid.UUID を経由すると遅いので SQL で文字列にする
+    statement = select(*(
+        cast(column, Text).label(column.key) if isinstance(column.type, UUID) else column
+        for column in EXPORT_COLUMNS[resource]
+    ))
+    if resource == "patients":
+        statement = statement.where(Patient.tenant_id == tenant_id)
+        if status:
+            statement = statement.where(Patient.status == status)
+    else:
+        model = Visit if resource == "visits" else MessageLog
+        statement = statement.join(Patient, Patient.id == model.patient_id).where(Patient.tenant_id == tenant_id)
+
+    if since or until:
+        tz_name = tenant_timezone(tenant_id)
+        column = PERIOD_COLUMNS[resource]
+        if since:
+            statement = statement.where(column >= local_midnight_utc(since, tz_name))
+        if until:
+            statement = statement.where(column < local_midnight_utc(until + timedelta(days=1), tz_name))
+    return statement
+
+
+def _row_formatter(statement):
+    """日時カラムだけ ISO 8601 文字列にする変換関数（他の型はそのまま出力できる）"""
+    positions = [
+        i for i, column in enumerate(statement.selected_columns) if isinstance(column.type, DateTime)
+    ]
+
+    def format_row(row) -> list:
+        values = list(row)
+        for i in positions:
+            if values[i] is not None:
+                values[i] = values[i].isoformat()
+        return values
+    return format_row
+
+
+def _ndjson_chunks(names: list, batches: Iterator[list], format_row) -> Iterator[str]:
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for rows in batches:
+        yield "".join(dumps(dict(zip(names, format_row(row)))) + "\n" for row in rows)
+
+
+def _csv_chunks(names: list, batches: Iterator[list], format_row) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\r\n")
+    # Excel で文字化けしないよう BOM を付ける（None は空欄になる）
+    buffer.write("\ufeff")
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows(map(format_row, rows))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_export(statement, fmt: str, compress: bool = False) -> Iterator[bytes]:
+    """SELECT 結果をサーバーサイドカーソルで EXPORT_BATCH_SIZE 行ずつ読み、
+    NDJSON / CSV（任意で gzip）のバイト列として順に返す
+
+    メモリに載るのは1バッチ分だけなので、件数に関係なく使用量は一定。
+    リクエストコンテキスト内（stream_with_context）で消費すること。
+    """
+    # ORM の行変換を通さないよう Core で実行する（セッションのトランザクション内）
+    result = db.session.connection().execute(
+        statement.execution_options(stream_results=True, max_row_buffer=EXPORT_BATCH_SIZE)
+    )
+    names = list(result.keys())
+    write = _ndjson_chunks if fmt == "ndjson" else _csv_chunks
+    chunks = write(names, result.partitions(EXPORT_BATCH_SIZE), _row_formatter(statement))
+
+    try:
+        if not compress:
+            for chunk in chunks:
+                yield chunk.encode("utf-8")
+            return
+
+        # wbits=31 で gzip 形式（ヘッダー・CRC 付き）
+        compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode("utf-8"))
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        result.close()
+        # 読み取り専用のトランザクションを終了してコネクションを返す
+        db.session.rollback()
@@ -0,0 +1,111 @@
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from app import db
+from services.stats_service import record_stats
+
+
+# 友だち追加・ブロックをまとめて反映する UPSERT
+# previous は文実行前のスナップショットなので、変更前の状態と新規作成かどうかが分かる
+FOLLOW_UPSERT_SQL = """
+WITH input AS (
+    SELECT * FROM unnest(
+        CAST(:ids AS uuid[]), CAST(:line_user_ids AS text[]),
+        CAST(:statuses AS text[]), CAST(:followed AS boolean[])
+    ) AS i(id, line_user_id, status, followed)
+),
+previous AS (
+    SELECT p.line_user_id, p.status
+    FROM patients p
+    WHERE p.tenant_id = :tenant_id AND p.line_user_id = ANY(CAST(:line_user_ids AS text[]))
+),
+upserted AS (
+    INSERT INTO patients (id, tenant_id, line_user_id, status, created_at, updated_at)
+    SELECT i.id, :tenant_id, i.line_user_id, i.status, :now, :now
+    FROM input i
+    -- 未登録ユーザーのブロックは記録しない
+    WHERE i.followed OR i.line_user_id IN (SELECT line_user_id FROM previous)
+    ORDER BY i.line_user_id
+    ON CONFLICT (tenant_id, line_user_id) DO UPDATE SET
+        status = excluded.status,
+        updated_at = CASE
+            WHEN patients.status IS DISTINCT FROM excluded.status THEN excluded.updated_at
+            ELSE patients.updated_at
+        END
+    RETURNING id, line_user_id, status
+)
+SELECT u.id, u.line_user_id, u.status, pr.status AS previous_status
+FROM upserted u
+LEFT JOIN previous pr ON pr.line_user_id = u.line_user_id
+"""
+
+
+@dataclass
+class FollowChange:
+    """友だち追加・ブロックの反映結果"""
+
+    patient_id: uuid.UUID
+    line_user_id: str
+    status: str
+    previous_status: Optional[str]  # None は新規作成
+
+    @property
+    def created(self) -> bool:
+        return self.previous_status is None
+
+
+class FollowBatch:
+    """Webhook の友だち追加・ブロックイベントをためて1文で反映する
+
+    同じユーザーのイベントは最後のものが最終状態になる。表示名・画像は Webhook に
+    含まれないため、新規の患者はプロフィール未取得で作成し、services.profile_service が後から取得する。
+    """
+
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id
+        self._users = {}
+
+    def __contains__(self, line_user_id: str) -> bool:
+        return line_user_id in self._users
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def follow(self, line_user_id: str):
+        entry = self._users.setdefault(line_user_id, {"followed": False})
+        entry["status"] = "active"
+        entry["followed"] = True
+
+    def unfollow(self, line_user_id: str):
+        entry = self._users.setdefault(line_user_id, {"followed": False})
+        entry["status"] = "blocked"
+
+    def apply(self) -> list:
+        """ためたイベントを反映して変更結果を返す（コミットは呼び出し側）"""
+        if not self._users:
+            return []
+
+        users = sorted(self._users.items())
+        self._users = {}
+        now = datetime.utcnow()
+
+        rows = db.session.execute(db.text(FOLLOW_UPSERT_SQL), {
+            "tenant_id": str(self.tenant_id),
+            "now": now,
+            "ids": [str(uuid.uuid4()) for _ in users],
+            "line_user_ids": [user_id for user_id, _ in users],
+            "statuses": [entry["status"] for _, entry in users],
+            "followed": [entry["followed"] for _, entry in users],
+        }).all()
+        changes = [FollowChange(row.id, row.line_user_id, row.status, row.previous_status) for row in rows]
+
+        new_patients = sum(1 for c in changes if c.created)
+        blocks = sum(1 for c in changes if c.status == "blocked" and c.previous_status != "blocked")
+        record_stats([
+            (self.tenant_id, now, counter, count)
+            for counter, count in (("new_patients", new_patients), ("blocks", blocks))
+            if count
+        ])
+        return changes
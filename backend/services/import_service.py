@@ -0,0 +1,276 @@
+import csv
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Optional, TextIO
+
+from app import db
+from services.clinic_time import local_midnight_utc, tenant_timezone
+from services.message_log_writer import copy_supported, copy_value
+from services.stats_service import record_stats
+
+
+# COPY 1回で送る行数（この単位で進捗を通知する）
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "50000"))
+
+# エラー行として返す最大件数
+MAX_REPORTED_ERRORS = 20
+
+# 取り込む項目（CSV の列名が異なる場合は columns で対応付ける）
+IMPORT_FIELDS = ("line_user_id", "external_id", "visit_date", "notes")
+
+# 電子カルテの出力でよく使われるゼロ埋めなしの日時（"2024/1/5 9:30" など）
+# strptime は1行ごとに呼ぶには遅いので正規表現で分解する
+LOOSE_DATETIME = re.compile(r"(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[ T](\d{1,2}):(\d{1,2})(?::(\d{1,2}))?)?")
+
+STAGING_TABLE = "visit_import_staging"
+STAGING_FIELDS = ("line_user_id", "external_id", "visit_local", "notes")
+
+# 同じテナントのインポートを同時に走らせない（トランザクション終了まで保持）
+IMPORT_LOCK_KEY = 0x494D5054
+
+# line_user_id と患者番号の両方がある行で、未設定の患者番号を紐付ける
+LINK_EXTERNAL_IDS_SQL = f"""
+WITH pairs AS (
+    SELECT external_id, min(line_user_id) AS line_user_id
+    FROM {STAGING_TABLE}
+    WHERE line_user_id IS NOT NULL AND external_id IS NOT NULL
+    GROUP BY external_id
+    HAVING count(DISTINCT line_user_id) = 1
+)
+UPDATE patients p SET external_id = pairs.external_id
+FROM pairs
+WHERE p.tenant_id = :tenant_id
+  AND p.line_user_id = pairs.line_user_id
+  AND p.external_id IS NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM patients o WHERE o.tenant_id = :tenant_id AND o.external_id = pairs.external_id
+  )
+"""
+
+# 患者番号を優先し、なければ line_user_id で照合
+RESOLVED_SQL = f"""
+SELECT s.line_no, coalesce(pe.id, pl.id) AS patient_id, s.visit_local, s.notes
+FROM {STAGING_TABLE} s
+LEFT JOIN patients pe ON pe.tenant_id = :tenant_id AND pe.external_id = s.external_id
+LEFT JOIN patients pl ON pl.tenant_id = :tenant_id AND pl.line_user_id = s.line_user_id
+"""
+
+UNMATCHED_SQL = f"""
+WITH resolved AS ({RESOLVED_SQL})
+SELECT count(*) AS unmatched,
+       (array_agg(line_no ORDER BY line_no))[1:{MAX_REPORTED_ERRORS}] AS lines
+FROM resolved
+WHERE patient_id IS NULL
+"""
+
+# 照合できた行を来院記録に反映する
+# 同じ患者の同じ現地日付は1件（ファイル内は最初の時刻、登録済みの日はスキップ）。
+# 過去の来院なのでアフターフォロー送信済みとして登録する。
+MERGE_VISITS_SQL = f"""
+WITH resolved AS ({RESOLVED_SQL}),
+candidates AS (
+    SELECT DISTINCT ON (patient_id, visit_local::date)
+        patient_id,
+        notes,
+        (visit_local AT TIME ZONE :tz) AT TIME ZONE 'UTC' AS visit_date,
+        (visit_local::date::timestamp AT TIME ZONE :tz) AT TIME ZONE 'UTC' AS day_start,
+        ((visit_local::date + 1)::timestamp AT TIME ZONE :tz) AT TIME ZONE 'UTC' AS day_end
+    FROM resolved
+    WHERE patient_id IS NOT NULL
+    ORDER BY patient_id, visit_local::date, visit_local, line_no
+),
+inserted AS (
+    INSERT INTO visits (id, patient_id, visit_date, aftercare_sent, notes, created_at)
+    SELECT gen_random_uuid(), c.patient_id, c.visit_date, true, c.notes, :now
+    FROM candidates c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM visits v
+        WHERE v.patient_id = c.patient_id AND v.visit_date >= c.day_start AND v.visit_date < c.day_end
+    )
+    RETURNING patient_id, visit_date
+),
+last_visits AS (
+    UPDATE patients p SET last_visit_at = m.last_visit_at
+    FROM (SELECT patient_id, max(visit_date) AS last_visit_at FROM inserted GROUP BY patient_id) m
+    WHERE p.id = m.patient_id AND (p.last_visit_at IS NULL OR p.last_visit_at < m.last_visit_at)
+)
+SELECT (visit_date AT TIME ZONE 'UTC' AT TIME ZONE :tz)::date AS day, count(*) AS visits
+FROM inserted
+GROUP BY 1
+"""
+
+
+class InvalidImportFile(ValueError):
+    """CSV の形式が不正（ヘッダー・必須列がない）"""
+
+
+@dataclass
+class ImportResult:
+    """来院履歴インポートの結果"""
+
+    rows: int = 0
+    imported: int = 0
+    duplicates: int = 0  # ファイル内の同日重複・登録済みの来院
+    unmatched: int = 0  # 患者が見つからない行
+    invalid: int = 0  # 日付・照合キーが不正な行
+    linked: int = 0  # 患者番号を紐付けた患者数
+    errors: list = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "unmatched": self.unmatched,
+            "invalid": self.invalid,
+            "linked": self.linked,
+            "errors": self.errors,
+        }
+
+
+def parse_visit_datetime(value: str) -> datetime:
+    """電子カルテ出力の日時（現地時間、ISO 8601 か "2024/1/5 9:30" など）を解析"""
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    match = LOOSE_DATETIME.fullmatch(value)
+    try:
+        if match:
+            return datetime(*(int(part) for part in match.groups(0)))
+    except ValueError:
+        pass
+    raise ValueError(f"invalid date: {value!r}")
+
+
+def _column_positions(header: list, columns: dict) -> dict:
+    """取り込む項目ごとの列位置（columns は 項目名 -> CSV の列名）"""
+    names = [name.strip() for name in header]
+    positions = {}
+    for name in IMPORT_FIELDS:
+        column = columns.get(name, name)
+        if column in names:
+            positions[name] = names.index(column)
+    if "visit_date" not in positions:
+        raise InvalidImportFile(f"column {columns.get('visit_date', 'visit_date')!r} not found")
+    if "line_user_id" not in positions and "external_id" not in positions:
+        raise InvalidImportFile("line_user_id or external_id column required")
+    return positions
+
+
+def _copy_rows(rows: list):
+    """ステージングテーブルへ COPY（使えない場合は executemany）"""
+    connection = db.session.connection()
+    if not copy_supported(connection):
+        db.session.execute(db.text(
+            f"INSERT INTO {STAGING_TABLE} VALUES (:line_no, :line_user_id, :external_id, :visit_local, :notes)"
+        ), [dict(zip(("line_no",) + STAGING_FIELDS, row)) for row in rows])
+        return
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(map(copy_value, row)))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {STAGING_TABLE} FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def import_visits(
+    tenant_id,
+    stream: TextIO,
+    columns: Optional[dict] = None,
+    progress: Optional[Callable[[int], None]] = None
+) -> ImportResult:
+    """電子カルテの CSV（ヘッダー行あり）から来院履歴を取り込む
+
+    CSV は読みながら IMPORT_CHUNK_SIZE 行ずつ一時テーブルへ COPY し、
+    患者の照合・重複除外・来院記録の追加・最終来院日の更新を集合演算でまとめて行う。
+    日時はクリニック現地時間として扱う。progress には読み込んだ行数を渡す。
+    コミットは呼び出し側で行う。
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        raise InvalidImportFile("header row required")
+    positions = _column_positions(header, columns or {})
+
+    result = ImportResult()
+    tz_name = tenant_timezone(tenant_id)
+    db.session.execute(
+        db.text("SELECT pg_advisory_xact_lock(:key, hashtext(:tenant_id))"),
+        {"key": IMPORT_LOCK_KEY, "tenant_id": str(tenant_id)}
+    )
+    db.session.execute(db.text(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} (
+            line_no bigint, line_user_id text, external_id text, visit_local timestamp, notes text
+        ) ON COMMIT DROP
+    """))
+
+    def error(message: str):
+        result.invalid += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append({"line": reader.line_num, "error": message})
+
+    def value(record: list, name: str) -> Optional[str]:
+        position = positions.get(name)
+        if position is None or position >= len(record):
+            return None
+        return record[position].strip() or None
+
+    rows = []
+    for record in reader:
+        if not any(record):
+            continue
+        result.rows += 1
+        line_user_id, external_id = value(record, "line_user_id"), value(record, "external_id")
+        if not line_user_id and not external_id:
+            error("line_user_id or external_id required")
+            continue
+        try:
+            visit_local = parse_visit_datetime(value(record, "visit_date") or "")
+        except ValueError as e:
+            error(str(e))
+            continue
+        rows.append((reader.line_num, line_user_id, external_id, visit_local, value(record, "notes")))
+
+        if len(rows) >= IMPORT_CHUNK_SIZE:
+            _copy_rows(rows)
+            rows = []
+            if progress:
+                progress(result.rows)
+    if rows:
+        _copy_rows(rows)
+        if progress:
+            progress(result.rows)
+
+    # 一時テーブルは自動 ANALYZE されないので、結合の前に統計を取る
+    db.session.execute(db.text(f"ANALYZE {STAGING_TABLE}"))
+    params = {"tenant_id": str(tenant_id)}
+    result.linked = db.session.execute(db.text(LINK_EXTERNAL_IDS_SQL), params).rowcount
+
+    unmatched = db.session.execute(db.text(UNMATCHED_SQL), params).one()
+    result.unmatched = unmatched.unmatched
+    for line in unmatched.lines or []:
+        if len(result.errors) >= MAX_REPORTED_ERRORS:
+            break
+        result.errors.append({"line": line, "error": "patient not found"})
+
+    days = db.session.execute(db.text(MERGE_VISITS_SQL), {
+        **params, "tz": tz_name, "now": datetime.utcnow()
+    }).all()
+    record_stats([
+        (tenant_id, local_midnight_utc(day, tz_name), "visits", count) for day, count in days
+    ])
+
+    result.imported = sum(count for _, count in days)
+    result.duplicates = result.rows - result.invalid - result.unmatched - result.imported
+    result.errors.sort(key=lambda e: e["line"])
+    return result
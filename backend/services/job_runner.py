@@ -0,0 +1,134 @@
+import os
+import socket
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from models.job_run import JobRun
+from services.db_pool import jobs_engine
+from services.shard_executor import ShardedRun
+
+
+# ジョブごとの実行中ロック（pg_try_advisory_lock(JOB_LOCK_KEY, hashtext(job_id))）
+JOB_LOCK_KEY = 0x4A4F4253
+
+WORKER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claim(job_id: str, scheduled_at: datetime) -> Optional[int]:
+    """実行回の行を running で作成（他プロセスが作成済みなら None）"""
+    run_id = db.session.execute(
+        insert(JobRun)
+        .values(
+            job_id=job_id,
+            scheduled_at=scheduled_at,
+            status="running",
+            worker=WORKER_NAME,
+            started_at=datetime.utcnow()
+        )
+        .on_conflict_do_nothing(constraint="uq_job_runs_job_scheduled")
+        .returning(JobRun.id)
+    ).scalar()
+    db.session.commit()
+    return run_id
+
+
+def _finish(
+    run_id: int,
+    status: str,
+    rows_processed: Optional[int] = None,
+    error: Optional[str] = None,
+    details: Optional[dict] = None
+):
+    db.session.execute(
+        db.update(JobRun)
+        .where(JobRun.id == run_id)
+        .values(
+            status=status,
+            finished_at=datetime.utcnow(),
+            rows_processed=rows_processed,
+            error=error,
+            details=details
+        )
+    )
+    db.session.commit()
+
+
+def run_exclusive(job_id: str, scheduled_at: datetime, job: Callable[[], Any]) -> Optional[str]:
+    """ジョブをクラスタ全体で1回だけ実行して履歴を記録（アプリコンテキスト内で呼ぶ）
+
+    - (job_id, scheduled_at) の行を作れたプロセスだけがその回を担当する（二重実行を防ぐ）。
+    - 担当プロセスは実行中ジョブごとのアドバイザリロックを取る。前回の実行が他プロセスで
+      続いていて取れない場合、この回は skipped として記録して実行しない。
+    - ロックはセッション単位なので、実行中のプロセスが落ちると解放される。
+      ロックを取れた時点で running のまま残っている他の行は中断された実行として failed にする。
+
+    job は処理件数（None 可）か ShardedRun を返す。ShardedRun の場合はシャード別の結果を
+    details に記録する。戻り値は記録した状態（他プロセスが担当した場合は None）。
+    """
+    run_id = _claim(job_id, scheduled_at)
+    if run_id is None:
+        return None
+
+    # セッション単位のロックなので PgBouncer を通さないジョブ用のエンジンから接続する
+    lock_conn = jobs_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+    locked = False
+    try:
+        locked = lock_conn.execute(
+            db.text("SELECT pg_try_advisory_lock(:key, hashtext(:job_id))"),
+            {"key": JOB_LOCK_KEY, "job_id": job_id}
+        ).scalar()
+        if not locked:
+            _finish(run_id, "skipped", error="previous run still in progress")
+            return "skipped"
+
+        db.session.execute(
+            db.update(JobRun)
+            .where(JobRun.job_id == job_id, JobRun.status == "running", JobRun.id != run_id)
+            .values(status="failed", finished_at=datetime.utcnow(), error="interrupted (worker exited)")
+        )
+        db.session.commit()
+
+        try:
+            result = job()
+        except Exception:
+            db.session.rollback()
+            error = traceback.format_exc()
+            print(f"Job {job_id} failed: {error}")
+            _finish(run_id, "failed", error=error)
+            return "failed"
+
+        if isinstance(result, ShardedRun):
+            _finish(run_id, "succeeded", result.rows, details=result.to_dict())
+        else:
+            _finish(run_id, "succeeded", result)
+        return "succeeded"
+    finally:
+        if locked:
+            lock_conn.execute(
+                db.text("SELECT pg_advisory_unlock(:key, hashtext(:job_id))"),
+                {"key": JOB_LOCK_KEY, "job_id": job_id}
+            )
+        lock_conn.close()
+
+
+def recent_runs(limit: int = 20) -> dict:
+    """ジョブごとの直近の実行履歴"""
+    ranked = select(
+        JobRun,
+        func.row_number().over(partition_by=JobRun.job_id, order_by=JobRun.scheduled_at.desc()).label("n")
+    ).subquery()
+    runs = db.session.execute(
+        select(db.aliased(JobRun, ranked))
+        .where(ranked.c.n <= limit)
+        .order_by(ranked.c.job_id, ranked.c.scheduled_at.desc())
+    ).scalars().all()
+
+    history = {}
+    for run in runs:
+        history.setdefault(run.job_id, []).append(run.to_dict())
+    return history
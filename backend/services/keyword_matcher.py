@@ -0,0 +1,147 @@
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+# 組み込みの緊急キーワード（テンプレート未設定でも緊急応答する）
+ALERT_KEYWORDS = ("痛い", "つらい", "合わない", "悪化", "副作用")
+
+# 緊急応答テンプレートがない場合の返信
+ALERT_FALLBACK_MESSAGE = "ご連絡ありがとうございます。診察時間内にお電話ください。"
+
+# trigger_keywords の区切り文字（カンマ・読点・改行）
+_KEYWORD_SEPARATORS = re.compile(r"[,、\n]")
+
+
+def normalize(text: str) -> str:
+    """全角・半角や大文字・小文字の違いをそろえる"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def parse_keywords(trigger_keywords: Optional[str]) -> list:
+    """カンマ区切りの trigger_keywords をキーワードのリストに変換"""
+    if not trigger_keywords:
+        return []
+    return [k.strip() for k in _KEYWORD_SEPARATORS.split(normalize(trigger_keywords)) if k.strip()]
+
+
+@dataclass(frozen=True)
+class MatchTarget:
+    """キーワード一致時の返信内容
+
+    rank が大きいほど優先（緊急応答 > 長いキーワード > 新しいテンプレート）。
+    """
+
+    template_type: str
+    content: str
+    rank: tuple
+    compiled: object = field(default=None, compare=False)  # 解析済みの content（services.message_render）
+
+
+class KeywordMatcher:
+    """Aho-Corasick 法による複数キーワード照合
+
+    キーワードごとの返信内容を1つのオートマトンにまとめ、
+    本文を1回走査するだけで最も優先度の高い一致を返す。
+    """
+
+    def __init__(self, keywords: dict):
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+        self.size = 0
+
+        for keyword, target in keywords.items():
+            keyword = normalize(keyword)
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                state = next_state
+            self._best[state] = _better(self._best[state], target)
+            self.size += 1
+
+        # 失敗遷移を幅優先で構築し、接尾辞で一致するキーワードの候補も集約
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._best[next_state] = _better(self._best[next_state], self._best[self._fail[next_state]])
+                queue.append(next_state)
+
+    def best_match(self, text: str) -> Optional[MatchTarget]:
+        """本文中で一致したキーワードのうち最も優先度の高い返信内容"""
+        goto, fail, best_at = self._goto, self._fail, self._best
+        best = None
+        state = 0
+        for char in normalize(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if best_at[state] is not None:
+                best = _better(best, best_at[state])
+        return best
+
+
+def _better(a: Optional[MatchTarget], b: Optional[MatchTarget]) -> Optional[MatchTarget]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return b if b.rank > a.rank else a
+
+
+def build_matcher(tenant_id) -> KeywordMatcher:
+    """テナントの有効なテンプレートの trigger_keywords と緊急キーワードから照合器を作成"""
+    from models.message_template import MessageTemplate
+    from services.message_render import compile_template, get_compiled
+
+    templates = MessageTemplate.query.filter_by(
+        tenant_id=tenant_id,
+        is_active=True
+    ).order_by(MessageTemplate.created_at.desc()).all()
+
+    alert_template = next((t for t in templates if t.type == "alert_reply"), None)
+    if alert_template:
+        alert_content = alert_template.content
+        alert_compiled = get_compiled(alert_template.id, alert_template.updated_at, alert_template.content)
+    else:
+        alert_content = ALERT_FALLBACK_MESSAGE
+        alert_compiled = compile_template(ALERT_FALLBACK_MESSAGE)
+
+    keywords = {}
+
+    def add(keyword: str, target: MatchTarget):
+        keywords[keyword] = _better(keywords.get(keyword), target)
+
+    for keyword in ALERT_KEYWORDS:
+        add(keyword, MatchTarget("alert_reply", alert_content, (1, len(keyword), 0), alert_compiled))
+
+    for template in templates:
+        created = template.created_at.timestamp() if template.created_at else 0
+        priority = 1 if template.type == "alert_reply" else 0
+        compiled = get_compiled(template.id, template.updated_at, template.content)
+        for keyword in parse_keywords(template.trigger_keywords):
+            add(keyword, MatchTarget(template.type, template.content, (priority, len(keyword), created), compiled))
+
+    return KeywordMatcher(keywords)
+
+
+def get_keyword_matcher(tenant_id) -> KeywordMatcher:
+    """テナントの照合器を取得（テンプレート変更時に作り直す）"""
+    from services.cache_service import matcher_cache
+
+    return matcher_cache.get_or_load(str(tenant_id), lambda: build_matcher(tenant_id))
@@ -1,102 +1,189 @@
+import os
+import threading
+import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional
 
 
-LINE_API_BASE = "https://api.line.me/v2/bot"
+LINE_API_BASE = os.getenv("LINE_API_BASE", "https://api.line.me/v2/bot")
+
+# マルチキャスト1リクエストあたりの最大宛先数（LINE APIの制限）
+MULTICAST_MAX_RECIPIENTS = 500
+
+# リトライ対象のステータス（レート制限・サーバーエラー）
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LineClient:
+    """LINE Messaging API クライアント（コネクションプール・タイムアウト・リトライ付き）"""
+
+    def __init__(
+        self,
+        base_url: str = LINE_API_BASE,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        
+        # 429/5xx は指数バックオフで再試行（Retry-After ヘッダーを優先）
+        retry = Retry(
+            total=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            backoff_factor=backoff_factor,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        # 再試行するのは冪等なメソッド（GET など）と、X-Line-Retry-Key 付きの POST（push・multicast）だけ。
+        # キーのない POST（reply・リッチメニュー作成）は LINE 側で処理済みの場合に重複するので再試行しない
+        self.session = _session(retry, pool_size)
+        self._keyed_session = _session(retry.new(allowed_methods=None), pool_size)
+
+    def close(self):
+        """コネクションプールを閉じる"""
+        self.session.close()
+        self._keyed_session.close()
+
+    @classmethod
+    def from_env(cls) -> "LineClient":
+        """環境変数の設定からクライアントを作成"""
+        return cls(
+            base_url=LINE_API_BASE,
+            pool_size=int(os.getenv("LINE_POOL_SIZE", "10")),
+            connect_timeout=float(os.getenv("LINE_CONNECT_TIMEOUT", "3.05")),
+            read_timeout=float(os.getenv("LINE_READ_TIMEOUT", "10")),
+            max_retries=int(os.getenv("LINE_MAX_RETRIES", "3")),
+            backoff_factor=float(os.getenv("LINE_RETRY_BACKOFF", "0.5"))
+        )
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        access_token: str,
+        payload: Optional[dict] = None,
+        retry_key: Optional[str] = None
+    ) -> Optional[requests.Response]:
+        """APIリクエスト送信（通信エラー時は None）"""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        if retry_key:
+            # 同じキーの再送はLINE側で重複配信されない
+            headers["X-Line-Retry-Key"] = retry_key
+        
+        session = self._keyed_session if retry_key else self.session
+        try:
+            return session.request(
+                method,
+                f"{self.base_url}{path}",
+                headers=headers,
+                json=payload,
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            print(f"LINE API request failed: {method} {path}: {e}")
+            return None
+
+    def push(self, access_token: str, to: str, messages: list, retry_key: Optional[str] = None) -> bool:
+        """プッシュメッセージ送信"""
+        response = self.request(
+            "POST", "/message/push", access_token,
+            {"to": to, "messages": messages},
+            retry_key=retry_key or str(uuid.uuid4())
+        )
+        return _accepted(response)
+
+    def multicast(self, access_token: str, to: list, messages: list, retry_key: Optional[str] = None) -> bool:
+        """マルチキャストメッセージ送信"""
+        response = self.request(
+            "POST", "/message/multicast", access_token,
+            {"to": to, "messages": messages},
+            retry_key=retry_key or str(uuid.uuid4())
+        )
+        return _accepted(response)
+
+    def reply(self, access_token: str, reply_token: str, messages: list) -> bool:
+        """リプライメッセージ送信"""
+        response = self.request(
+            "POST", "/message/reply", access_token,
+            {"replyToken": reply_token, "messages": messages}
+        )
+        return response is not None and response.status_code == 200
+
+    def get_profile(self, access_token: str, user_id: str) -> Optional[dict]:
+        """ユーザープロフィール取得"""
+        response = self.request("GET", f"/profile/{user_id}", access_token)
+        if response is not None and response.status_code == 200:
+            return response.json()
+        return None
+
+
+def _session(retry: Retry, pool_size: int) -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _accepted(response: Optional[requests.Response]) -> bool:
+    """送信成功判定（409 は同じリトライキーで受付済み）"""
+    return response is not None and response.status_code in (200, 409)
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_line_client() -> LineClient:
+    """ワーカープロセス共有のクライアント取得（fork後は作り直す）"""
+    global _client, _client_pid
+    
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = LineClient.from_env()
+                _client_pid = pid
+    return _client
+
+
+def _text(message: str) -> list:
+    """テキストメッセージオブジェクト"""
+    return [{"type": "text", "text": message}]
 
 
 def send_line_message(access_token: str, user_id: str, message: str) -> bool:
     """プッシュメッセージ送信"""
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "to": user_id,
-        "messages": [
-            {"type": "text", "text": message}
-        ]
-    }
-    
-    response = requests.post(
-        f"{LINE_API_BASE}/message/push",
-        headers=headers,
-        json=payload
-    )
-    
-    return response.status_code == 200
+    return get_line_client().push(access_token, user_id, _text(message))
 
 
 def reply_line_message(access_token: str, reply_token: str, message: str) -> bool:
     """リプライメッセージ送信"""
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "replyToken": reply_token,
-        "messages": [
-            {"type": "text", "text": message}
-        ]
-    }
-    
-    response = requests.post(
-        f"{LINE_API_BASE}/message/reply",
-        headers=headers,
-        json=payload
-    )
-    
-    return response.status_code == 200
+    return get_line_client().reply(access_token, reply_token, _text(message))
 
 
 def multicast_line_message(access_token: str, user_ids: list, message: str) -> bool:
     """マルチキャストメッセージ送信（複数ユーザー同時）"""
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "to": user_ids,
-        "messages": [
-            {"type": "text", "text": message}
-        ]
-    }
-    
-    response = requests.post(
-        f"{LINE_API_BASE}/message/multicast",
-        headers=headers,
-        json=payload
-    )
-    
-    return response.status_code == 200
+    return get_line_client().multicast(access_token, user_ids, _text(message))
 
 
 def get_user_profile(access_token: str, user_id: str) -> Optional[dict]:
     """ユーザープロフィール取得"""
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    
-    response = requests.get(
-        f"{LINE_API_BASE}/profile/{user_id}",
-        headers=headers
-    )
-    
-    if response.status_code == 200:
-        return response.json()
-    return None
+    return get_line_client().get_profile(access_token, user_id)
 
 
 def create_rich_menu(access_token: str, template: dict, button_config: dict) -> Optional[str]:
     """リッチメニュー作成"""
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
     # アクションマッピング
     action_map = {
         "reserve": {"type": "uri", "uri": button_config.get("reserve_url", "https://example.com/reserve")},
@@ -124,40 +211,24 @@ def create_rich_menu(access_token: str, template: dict, button_config: dict) ->
         "areas": areas
     }
     
-    response = requests.post(
-        f"{LINE_API_BASE}/richmenu",
-        headers=headers,
-        json=payload
-    )
+    response = get_line_client().request("POST", "/richmenu", access_token, payload)
     
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         return response.json().get("richMenuId")
     return None
 
 
 def set_default_rich_menu(access_token: str, rich_menu_id: str) -> bool:
     """リッチメニューをデフォルトに設定"""
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    
-    response = requests.post(
-        f"{LINE_API_BASE}/user/all/richmenu/{rich_menu_id}",
-        headers=headers
+    response = get_line_client().request(
+        "POST", f"/user/all/richmenu/{rich_menu_id}", access_token
     )
-    
-    return response.status_code == 200
+    return response is not None and response.status_code == 200
 
 
 def delete_rich_menu(access_token: str, rich_menu_id: str) -> bool:
     """リッチメニュー削除"""
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    
-    response = requests.delete(
-        f"{LINE_API_BASE}/richmenu/{rich_menu_id}",
-        headers=headers
+    response = get_line_client().request(
+        "DELETE", f"/richmenu/{rich_menu_id}", access_token
     )
-    
-    return response.status_code == 200
+    return response is not None and response.status_code == 200
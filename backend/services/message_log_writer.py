@@ -0,0 +1,146 @@
+import io
+import os
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from app import db
+from models.message_log import MessageLog
+from services.stats_service import message_events, record_stats
+
+
+# 1回の書き込みでまとめる行数
+FLUSH_SIZE = int(os.getenv("MESSAGE_LOG_FLUSH_SIZE", "1000"))
+
+# PostgreSQL COPY を使う（psycopg2 接続時のみ有効）
+USE_COPY = os.getenv("MESSAGE_LOG_USE_COPY", "true").lower() == "true"
+
+COLUMNS = ("id", "patient_id", "message_type", "content", "status", "line_message_id", "sent_at")
+
+
+def copy_value(value) -> str:
+    """COPY テキスト形式の値にエスケープ"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_supported(connection) -> bool:
+    """この接続で COPY を使えるか
+
+    psycopg2 のみ。gevent ワーカー（psycogreen で待ちを譲る設定）では COPY が使えないため除く。
+    """
+    if connection.dialect.driver != "psycopg2":
+        return False
+    from psycopg2.extensions import get_wait_callback
+
+    return get_wait_callback() is None
+
+
+class MessageLogWriter:
+    """メッセージ送信ログの一括書き込み
+
+    ORMオブジェクトを作らずに行をため、flush_size 件ごとに COPY
+    （使えない場合は executemany）で現在のセッションのトランザクションへ書き込む。
+    tenant_id を渡した送信済み（status="sent"）の行は日別ロールアップにも同じトランザクションで加算する。
+    送信待ち（pending）の行はアウトボックスのディスパッチャーが送信済みにした時点で加算される。
+    コミットは呼び出し側で行う。
+    """
+
+    def __init__(self, flush_size: int = FLUSH_SIZE, use_copy: bool = USE_COPY):
+        self.flush_size = flush_size
+        self.use_copy = use_copy
+        self.rows = []
+        self.stat_events = []
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(
+        self,
+        patient_id,
+        message_type: str,
+        content: Optional[str],
+        status: str = "sent",
+        line_message_id: Optional[str] = None,
+        sent_at: Optional[datetime] = None,
+        tenant_id=None
+    ) -> uuid.UUID:
+        """ログを1行追加してIDを返す"""
+        sent_at = sent_at or datetime.utcnow()
+        if tenant_id is not None and status == "sent":
+            self.stat_events.extend(message_events(tenant_id, sent_at, message_type))
+        log_id = uuid.uuid4()
+        self.rows.append({
+            "id": log_id,
+            "patient_id": patient_id,
+            "message_type": message_type,
+            "content": content,
+            "status": status,
+            "line_message_id": line_message_id,
+            "sent_at": sent_at
+        })
+        if len(self.rows) >= self.flush_size:
+            self.flush()
+        return log_id
+
+    def add_many(
+        self,
+        patient_ids,
+        message_type: str,
+        content: Optional[str],
+        status: str = "sent",
+        tenant_id=None
+    ) -> list:
+        """同一内容のログを複数患者分追加してIDのリストを返す"""
+        sent_at = datetime.utcnow()
+        log_ids = [self.add(patient_id, message_type, content, status, sent_at=sent_at) for patient_id in patient_ids]
+        if tenant_id is not None and status == "sent":
+            self.stat_events.extend(message_events(tenant_id, sent_at, message_type, len(patient_ids)))
+        return log_ids
+
+    def flush(self):
+        """ためた行を書き込み"""
+        if self.stat_events:
+            record_stats(self.stat_events)
+            self.stat_events = []
+        if not self.rows:
+            return
+
+        connection = db.session.connection()
+        if self.use_copy and copy_supported(connection):
+            self._copy(connection)
+        else:
+            db.session.execute(db.insert(MessageLog.__table__), self.rows)
+
+        self.written += len(self.rows)
+        self.rows = []
+
+    def _copy(self, connection):
+        buffer = io.StringIO()
+        for row in self.rows:
+            buffer.write("\t".join(copy_value(row[c]) for c in COLUMNS))
+            buffer.write("\n")
+        buffer.seek(0)
+
+        cursor = connection.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {MessageLog.__tablename__} ({', '.join(COLUMNS)}) FROM STDIN",
+                buffer
+            )
+        finally:
+            cursor.close()
@@ -0,0 +1,179 @@
+import re
+from dataclasses import dataclass, field
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+from services.clinic_time import DEFAULT_TIMEZONE
+from services.line_service import MULTICAST_MAX_RECIPIENTS
+
+
+# テンプレートで使えるプレースホルダー（True は患者ごとに値が変わる）
+PLACEHOLDERS = {
+    "name": True,  # 患者の表示名
+    "last_visit_date": True,  # 最終来院日（クリニック現地の日付）
+    "clinic_name": False,  # クリニック名
+}
+
+# 患者の値がない場合・個別化しないテンプレートで使う値
+DEFAULT_VALUES = {
+    "name": "患者様",
+    "last_visit_date": "前回のご来院日",
+}
+
+# {{ と }} は波括弧そのもの、{名前} はプレースホルダー
+_TOKENS = re.compile(r"\{\{|\}\}|\{(\w+)\}")
+
+
+class TemplateError(ValueError):
+    """テンプレートに使えないプレースホルダーがある"""
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """解析済みのテンプレート
+
+    parts は文字列とプレースホルダー名が交互に並ぶ（偶数番目が文字列）。
+    展開には str.format の書式に変換したものを使い、1行あたり1回の format 呼び出しで済ませる。
+    """
+
+    parts: tuple
+    fields: tuple = field(init=False)  # 書式の位置引数に対応するプレースホルダー名
+    _format: object = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        fields = tuple(dict.fromkeys(self.parts[1::2]))
+        index = {name: n for n, name in enumerate(fields)}
+        pattern = "".join(
+            part.replace("{", "{{").replace("}", "}}") if n % 2 == 0 else f"{{{index[part]}}}"
+            for n, part in enumerate(self.parts)
+        )
+        object.__setattr__(self, "fields", fields)
+        object.__setattr__(self, "_format", pattern.format)
+
+    @property
+    def personal(self) -> bool:
+        """患者ごとに本文が変わるか"""
+        return any(PLACEHOLDERS[name] for name in self.fields)
+
+    def bind(self, values: dict) -> "CompiledTemplate":
+        """values にあるプレースホルダーを埋め込んだテンプレート（テナント共通の値を先に埋める）"""
+        if not any(name in values for name in self.fields):
+            return self
+        parts = [self.parts[0]]
+        for name, text in zip(self.parts[1::2], self.parts[2::2]):
+            if name in values:
+                parts[-1] += str(values[name]) + text
+            else:
+                parts.extend([name, text])
+        return CompiledTemplate(tuple(parts))
+
+    def render_many(self, columns: dict, count: int) -> list:
+        """プレースホルダーごとの値のリストから count 件の本文を展開"""
+        if not self.fields:
+            return [self.parts[0]] * count
+        return list(map(self._format, *(columns[name] for name in self.fields)))
+
+
+def compile_template(content: str, strict: bool = True) -> CompiledTemplate:
+    """テンプレートを解析
+
+    strict の場合、使えないプレースホルダーがあれば TemplateError。
+    strict でなければ（検証前に保存されたテンプレート）そのまま文字列として残す。
+    """
+    parts = [""]
+    unknown = []
+    position = 0
+    for match in _TOKENS.finditer(content):
+        parts[-1] += content[position:match.start()]
+        position = match.end()
+        name = match.group(1)
+        if name is None:
+            parts[-1] += match.group(0)[0]
+        elif name in PLACEHOLDERS:
+            parts.extend([name, ""])
+        else:
+            unknown.append(match.group(0))
+            parts[-1] += match.group(0)
+    parts[-1] += content[position:]
+
+    if strict and unknown:
+        available = ", ".join(f"{{{name}}}" for name in PLACEHOLDERS)
+        raise TemplateError(
+            f"Unknown placeholders: {', '.join(dict.fromkeys(unknown))} (available: {available}; "
+            f"write {{{{ and }}}} for literal braces)"
+        )
+    return CompiledTemplate(tuple(parts))
+
+
+def get_compiled(template_id, updated_at, content: str) -> CompiledTemplate:
+    """保存済みテンプレートの解析結果（テンプレートID・更新日時ごとにキャッシュ）"""
+    from services.cache_service import compiled_template_cache
+
+    return compiled_template_cache.get_or_load(
+        (str(template_id), updated_at), lambda: compile_template(content, strict=False)
+    )
+
+
+def _local_dates(values: list, tz_name: str) -> list:
+    tz = ZoneInfo(tz_name)
+    dates = {}
+    result = []
+    for value in values:
+        if value is None:
+            result.append(DEFAULT_VALUES["last_visit_date"])
+            continue
+        day = value.replace(tzinfo=timezone.utc).astimezone(tz).date()
+        text = dates.get(day)
+        if text is None:
+            text = dates[day] = f"{day.month}月{day.day}日"
+        result.append(text)
+    return result
+
+
+def render_batch(
+    template: CompiledTemplate,
+    patients: list,
+    clinic_name: str = "",
+    tz_name: str = DEFAULT_TIMEZONE,
+    personalize: bool = True
+) -> list:
+    """同じクリニックの患者（display_name・last_visit_at を持つ行、None は患者不明）の本文をまとめて展開
+
+    クリニック共通の値を先に埋め込み、残った患者ごとの値を列単位で用意して一括で展開する。
+    個別化しないテンプレートは全員に既定値を使う。
+    """
+    template = template.bind({"clinic_name": clinic_name or ""})
+    if not personalize:
+        template = template.bind(DEFAULT_VALUES)
+
+    columns = {}
+    if "name" in template.fields:
+        columns["name"] = [(p and p.display_name) or DEFAULT_VALUES["name"] for p in patients]
+    if "last_visit_date" in template.fields:
+        columns["last_visit_date"] = _local_dates([p and p.last_visit_at for p in patients], tz_name)
+    return template.render_many(columns, len(patients))
+
+
+def render(template: CompiledTemplate, patient=None, **kwargs) -> str:
+    """1人分の本文を展開（render_batch と同じ引数）"""
+    return render_batch(template, [patient], **kwargs)[0]
+
+
+def coalesce(messages: list) -> list:
+    """(宛先, 本文) のリストを送信単位にまとめる
+
+    同じ本文の宛先は最大500件ずつのマルチキャストに、本文が他の誰とも
+    異なる宛先だけをプッシュにする。戻り値は (endpoint, 本文, 宛先リスト) のリスト。
+    """
+    groups = {}
+    for recipient, message in messages:
+        groups.setdefault(message, []).append(recipient)
+
+    sends = []
+    for message, recipients in groups.items():
+        if len(recipients) == 1:
+            sends.append(("push", message, recipients))
+            continue
+        for i in range(0, len(recipients), MULTICAST_MAX_RECIPIENTS):
+            sends.append(("multicast", message, recipients[i:i + MULTICAST_MAX_RECIPIENTS]))
+    return sends
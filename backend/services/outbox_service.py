@@ -0,0 +1,357 @@
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import any_, bindparam, func, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+
+from app import db
+from models.message_log import MessageLog
+from models.message_outbox import MessageOutbox
+from services.stats_service import message_events, record_stats
+
+
+# embedded: python app.py のプロセス内でディスパッチャーを起動
+# standalone: `flask outbox-dispatcher` の専用プロセスで起動 / off: 起動しない
+OUTBOX_DISPATCHER = os.getenv("OUTBOX_DISPATCHER", "embedded")
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+# 1バッチに含める1テナントあたりの最大件数（チャネルごとのレート制限に偏らないよう複数テナントを混ぜる）
+OUTBOX_TENANT_BATCH_SIZE = int(os.getenv("OUTBOX_TENANT_BATCH_SIZE", "5"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# 再試行の間隔（秒、試行ごとに2倍）
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+# 取り出した行を他のディスパッチャーが取らない秒数（送信中にプロセスが落ちた行はこの後に再送される）
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+
+
+# テナントを毎回ランダムな順に見て、各テナントの送信待ちを古い順に最大 :per_tenant 件ずつ取り出し、
+# next_attempt_at を :lease（リース期限）に進める。コミット後は期限まで他のディスパッチャーが取らない
+CLAIM_SQL = """
+UPDATE message_outbox m SET next_attempt_at = :lease
+FROM (
+    SELECT o.id
+    FROM (SELECT id FROM tenants ORDER BY random()) AS t
+    CROSS JOIN LATERAL (
+        SELECT id FROM message_outbox
+        WHERE tenant_id = t.id AND status = 'pending' AND next_attempt_at <= :now
+        ORDER BY next_attempt_at, id
+        LIMIT :per_tenant
+        FOR UPDATE SKIP LOCKED
+    ) AS o
+    LIMIT :batch_size
+) AS due
+WHERE m.id = due.id
+RETURNING m.id, m.tenant_id, m.endpoint, m.payload, m.idempotency_key, m.message_log_ids, m.attempts
+"""
+
+
+def _text(message: str) -> list:
+    return [{"type": "text", "text": message}]
+
+
+class OutboxWriter:
+    """送信待ちメッセージの一括書き込み
+
+    行をためて flush() で現在のセッションのトランザクションへ INSERT する。
+    コミットは呼び出し側で、送信の原因となった更新と同じトランザクションにする。
+    同じ idempotency_key の行がすでにあれば追加しない。
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def push(self, tenant_id, user_id: str, message: str, log_ids=(), idempotency_key=None):
+        self._add(tenant_id, "push", {"to": user_id, "messages": _text(message)}, log_ids, idempotency_key)
+
+    def multicast(self, tenant_id, user_ids: list, message: str, log_ids=(), idempotency_key=None):
+        self._add(tenant_id, "multicast", {"to": list(user_ids), "messages": _text(message)}, log_ids, idempotency_key)
+
+    def reply(self, tenant_id, reply_token: str, message: str, log_ids=()):
+        self._add(tenant_id, "reply", {"replyToken": reply_token, "messages": _text(message)}, log_ids, None)
+
+    def _add(self, tenant_id, endpoint: str, payload: dict, log_ids, idempotency_key):
+        self.rows.append({
+            "tenant_id": tenant_id,
+            "endpoint": endpoint,
+            "payload": payload,
+            "idempotency_key": idempotency_key or uuid.uuid4(),
+            "message_log_ids": list(log_ids),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": datetime.utcnow(),
+            "created_at": datetime.utcnow()
+        })
+
+    def flush(self):
+        """ためた行を書き込み"""
+        if not self.rows:
+            return
+        db.session.execute(
+            insert(MessageOutbox).on_conflict_do_nothing(constraint="uq_message_outbox_idempotency_key"),
+            self.rows
+        )
+        self.written += len(self.rows)
+        self.rows = []
+
+
+def dispatch_pending(
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    per_tenant: int = OUTBOX_TENANT_BATCH_SIZE,
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    retry_base_seconds: float = OUTBOX_RETRY_BASE_SECONDS,
+    lease_seconds: float = OUTBOX_LEASE_SECONDS
+) -> dict:
+    """送信待ちを1バッチ送信して結果を反映（アプリコンテキスト内で呼ぶ）
+
+    行はテナントごとに最大 per_tenant 件ずつ取り出し（1テナントの大量送信が他のテナントを待たせない）、
+    next_attempt_at を lease_seconds 後に進めてすぐコミットする。LINE API の呼び出し中は
+    トランザクションもロックも持たない。リース中の行は他のディスパッチャーが取らないので、
+    複数のディスパッチャーが同じ行を送ることはない。途中でプロセスが落ちると
+    リース期限の後に次のディスパッチャーが同じ idempotency_key で再送する（LINE 側で重複配信されない）。
+    送信結果は別の短いトランザクションで反映し、送信ログの status も同時に更新して、
+    送信済みになったログはその時点で日別ロールアップの配信数に加算する。
+    """
+    from services.cache_service import get_tenant
+    from services.dispatch_service import SendJob, dispatch
+
+    claimed_at = datetime.utcnow()
+    lease = claimed_at + timedelta(seconds=lease_seconds)
+    rows = db.session.execute(
+        db.text(CLAIM_SQL).columns(
+            MessageOutbox.id,
+            MessageOutbox.tenant_id,
+            MessageOutbox.endpoint,
+            MessageOutbox.payload,
+            MessageOutbox.idempotency_key,
+            MessageOutbox.message_log_ids,
+            MessageOutbox.attempts
+        ),
+        {"now": claimed_at, "lease": lease, "per_tenant": per_tenant, "batch_size": batch_size}
+    ).all()
+    db.session.commit()
+    if not rows:
+        return {"sent": 0, "retried": 0, "failed": 0}
+
+    jobs = {}
+    for row in rows:
+        tenant = get_tenant(row.tenant_id)
+        if tenant and tenant.line_channel_access_token:
+            retry_key = None if row.endpoint == "reply" else str(row.idempotency_key)
+            jobs[row.id] = SendJob(tenant.line_channel_access_token, row.endpoint, row.payload, retry_key)
+    results = dict(zip(jobs, dispatch(list(jobs.values()))))
+
+    now = datetime.utcnow()
+    changes = []
+    log_status = {"sent": [], "failed": []}
+    log_tenants = {}
+    counts = {"sent": 0, "retried": 0, "failed": 0}
+    for row in rows:
+        attempts = row.attempts + 1
+        if results.get(row.id):
+            status, error = "sent", None
+        elif row.id not in jobs:
+            status, error = "failed", "tenant has no LINE access token"
+        else:
+            status = "failed" if attempts >= max_attempts or row.endpoint == "reply" else "pending"
+            error = "LINE API request failed"
+        changes.append({
+            "row_id": row.id,
+            "row_lease": lease,
+            "new_status": status,
+            "new_attempts": attempts,
+            "new_next_attempt_at": now + timedelta(seconds=retry_base_seconds * 2 ** row.attempts),
+            "new_last_error": error,
+            "new_sent_at": now if status == "sent" else None
+        })
+        if status in log_status:
+            log_status[status].extend(row.message_log_ids)
+        if status == "sent":
+            log_tenants.update(dict.fromkeys(row.message_log_ids, row.tenant_id))
+        counts["retried" if status == "pending" else status] += 1
+
+    # リース期限が過ぎて他のディスパッチャーが取り直した行は、そちらの結果に任せる
+    table = MessageOutbox.__table__
+    db.session.execute(
+        table.update()
+        .where(
+            table.c.id == bindparam("row_id"),
+            table.c.status == "pending",
+            table.c.next_attempt_at == bindparam("row_lease")
+        )
+        .values(
+            status=bindparam("new_status"),
+            attempts=bindparam("new_attempts"),
+            next_attempt_at=bindparam("new_next_attempt_at"),
+            last_error=bindparam("new_last_error"),
+            sent_at=bindparam("new_sent_at")
+        ),
+        changes
+    )
+    for status, log_ids in log_status.items():
+        if not log_ids:
+            continue
+        # 送信済みのログは sent_at を実際の送信日時にする（再集計と同じ日付で数えるため）
+        values = {"status": status, "sent_at": now} if status == "sent" else {"status": status}
+        updated = db.session.execute(
+            update(MessageLog)
+            .where(
+                MessageLog.id == any_(bindparam("log_ids", log_ids, type_=ARRAY(UUID(as_uuid=True)))),
+                MessageLog.status != "sent"
+            )
+            .values(**values)
+            .returning(MessageLog.id, MessageLog.message_type)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if status == "sent":
+            sent = Counter((log_tenants[log_id], message_type) for log_id, message_type in updated)
+            record_stats(
+                event for (tenant_id, message_type), count in sent.items()
+                for event in message_events(tenant_id, now, message_type, count)
+            )
+    db.session.commit()
+    return counts
+
+
+class OutboxDispatcher:
+    """アウトボックスを送信するディスパッチャースレッド群
+
+    各スレッドが dispatch_pending をバッチ単位で繰り返す。行は SKIP LOCKED で
+    取り出すので、スレッド数・プロセス数を増やしてもそのまま並行に送信できる。
+    """
+
+    def __init__(
+        self,
+        app,
+        workers: int = OUTBOX_WORKERS,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL
+    ):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._stop = threading.Event()
+        self._wakeup = threading.Condition()
+        self._generation = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = {"sent": 0, "retried": 0, "failed": 0}
+
+    def start(self):
+        """ディスパッチャースレッドを起動"""
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"outbox-dispatcher-{n}", daemon=True)
+            for n in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """送信中のバッチを終えてから停止"""
+        self._stop.set()
+        self.wake()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """新しいメッセージの書き込みを通知（ポーリング待ちを打ち切る）"""
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def _run(self):
+        from services.db_pool import use_jobs_pool
+
+        use_jobs_pool()
+        while not self._stop.is_set():
+            with self._wakeup:
+                generation = self._generation
+            counts = {}
+            try:
+                with self.app.app_context():
+                    counts = dispatch_pending(self.batch_size)
+                with self._lock:
+                    for name, count in counts.items():
+                        self._counters[name] += count
+            except Exception as e:
+                print(f"Outbox dispatcher error: {e}")
+
+            if sum(counts.values()) < self.batch_size:
+                with self._wakeup:
+                    if generation == self._generation and not self._stop.is_set():
+                        self._wakeup.wait(self.poll_interval)
+
+    def stats(self) -> dict:
+        """スレッド数・送信件数などの統計"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": bool(self._threads),
+                **self._counters
+            }
+
+
+_dispatcher = None
+
+
+def start_dispatcher(app, **kwargs) -> OutboxDispatcher:
+    """このプロセスでディスパッチャーを起動"""
+    global _dispatcher
+
+    if _dispatcher is None:
+        _dispatcher = OutboxDispatcher(app, **kwargs)
+    _dispatcher.start()
+    return _dispatcher
+
+
+def notify_dispatcher():
+    """同じプロセス内のディスパッチャーに新着を通知（別プロセスはポーリングで拾う）"""
+    if _dispatcher is not None:
+        _dispatcher.wake()
+
+
+def outbox_stats() -> dict:
+    """アウトボックスの滞留状況"""
+    pending, oldest = db.session.query(
+        func.count(MessageOutbox.id), func.min(MessageOutbox.created_at)
+    ).filter(MessageOutbox.status == "pending").one()
+    failed = db.session.query(func.count(MessageOutbox.id)).filter(MessageOutbox.status == "failed").scalar()
+    return {
+        "dispatcher": OUTBOX_DISPATCHER,
+        "pending": pending,
+        "failed": failed,
+        "oldest_pending_at": oldest.isoformat() if oldest else None,
+        "pool": _dispatcher.stats() if _dispatcher is not None else None
+    }
+
+
+def purge_sent_messages(retention_days: int = OUTBOX_RETENTION_DAYS) -> int:
+    """送信済みのメッセージを保持期間経過後に削除"""
+    threshold = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(
+        db.delete(MessageOutbox).where(
+            MessageOutbox.status == "sent",
+            MessageOutbox.created_at < threshold
+        )
+    )
+    db.session.commit()
+    return result.rowcount
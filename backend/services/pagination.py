@@ -0,0 +1,42 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from app import db
+
+
+class InvalidCursor(ValueError):
+    """カーソル文字列が不正"""
+
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    """キーセットページングのカーソル（最後の行の並び順キー）を文字列化"""
+    raw = json.dumps([created_at.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """encode_cursor の逆変換（不正な場合は InvalidCursor）"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def estimate_count(statement) -> int:
+    """実行計画の推定行数による概算件数（COUNT(*) を実行しない）"""
+    connection = db.session.connection()
+    compiled = statement.compile(dialect=connection.dialect)
+    params = {k: str(v) if isinstance(v, uuid.UUID) else v for k, v in compiled.params.items()}
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def escape_like(value: str) -> str:
+    """LIKE のワイルドカードをエスケープ（エスケープ文字は \\）"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
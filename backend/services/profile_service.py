@@ -0,0 +1,224 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app import db
+
+
+# embedded: python app.py のプロセス内でプロフィール取得ワーカーを起動
+# standalone: `flask profile-worker` の専用プロセスで起動 / off: 起動しない
+PROFILE_ENRICHER = os.getenv("PROFILE_ENRICHER", "embedded")
+
+PROFILE_BATCH_SIZE = int(os.getenv("PROFILE_BATCH_SIZE", "100"))
+# 取得済みのプロフィールを取り直すまでの日数
+PROFILE_REFRESH_DAYS = float(os.getenv("PROFILE_REFRESH_DAYS", "30"))
+# 取得できなかった患者を再試行するまでの分数
+PROFILE_RETRY_MINUTES = float(os.getenv("PROFILE_RETRY_MINUTES", "60"))
+PROFILE_POLL_INTERVAL = float(os.getenv("PROFILE_POLL_INTERVAL", "30"))
+
+
+# 未取得（NULL）・期限切れの患者を古い順に取り出し、再試行時刻まで他のワーカーが取らないようにする
+PROFILE_CLAIM_SQL = """
+UPDATE patients p SET profile_refreshed_at = :lease
+FROM (
+    SELECT id FROM patients
+    WHERE status = 'active' AND (profile_refreshed_at IS NULL OR profile_refreshed_at < :stale)
+    ORDER BY profile_refreshed_at NULLS FIRST
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+) AS due
+WHERE p.id = due.id
+RETURNING p.id, p.tenant_id, p.line_user_id
+"""
+
+# 取得したプロフィールを1文で反映（変わった場合だけ updated_at を更新）
+PROFILE_UPDATE_SQL = """
+UPDATE patients p SET
+    display_name = i.display_name,
+    picture_url = i.picture_url,
+    profile_refreshed_at = :now,
+    updated_at = CASE
+        WHEN (p.display_name, p.picture_url) IS DISTINCT FROM (i.display_name, i.picture_url) THEN :now
+        ELSE p.updated_at
+    END
+FROM unnest(
+    CAST(:ids AS uuid[]), CAST(:display_names AS text[]), CAST(:picture_urls AS text[])
+) AS i(id, display_name, picture_url)
+WHERE p.id = i.id
+"""
+
+
+def enrich_profiles(
+    batch_size: int = PROFILE_BATCH_SIZE,
+    refresh_days: float = PROFILE_REFRESH_DAYS,
+    retry_minutes: float = PROFILE_RETRY_MINUTES
+) -> dict:
+    """プロフィール未取得・期限切れの患者を1バッチ取得して反映（アプリコンテキスト内で呼ぶ）
+
+    取り出した行は profile_refreshed_at を再試行時刻に合わせてすぐコミットするので、
+    LINE API の応答を待つ間に患者の行をロックし続けない。取得できなかった患者は
+    retry_minutes 後に再試行される。テナントにアクセストークンがない患者は取得済みとして
+    profile_refreshed_at だけ更新し（refresh_days 後まで取り出さない）、skipped として数える。
+    """
+    from sqlalchemy import update
+    from models.patient import Patient
+    from services.cache_service import get_tenant, profile_cache
+    from services.dispatch_service import ProfileJob, fetch_profiles
+
+    now = datetime.utcnow()
+    stale = now - timedelta(days=refresh_days)
+    rows = db.session.execute(db.text(PROFILE_CLAIM_SQL), {
+        "stale": stale,
+        "lease": stale + timedelta(minutes=retry_minutes),
+        "batch_size": batch_size
+    }).all()
+    db.session.commit()
+    if not rows:
+        return {"claimed": 0, "updated": 0, "cached": 0, "skipped": 0, "failed": 0}
+
+    keys = [(str(row.tenant_id), row.line_user_id) for row in rows]
+    profiles = profile_cache.get_many(keys)
+    cached = len(profiles)
+
+    jobs = {}
+    skipped = []
+    for row, key in zip(rows, keys):
+        if key in profiles:
+            continue
+        tenant = get_tenant(row.tenant_id)
+        if tenant and tenant.line_channel_access_token:
+            jobs[key] = ProfileJob(tenant.line_channel_access_token, row.line_user_id)
+        else:
+            skipped.append(row.id)
+    fetched = {key: profile for key, profile in zip(jobs, fetch_profiles(list(jobs.values()))) if profile}
+    profile_cache.put_many(fetched)
+    profiles.update(fetched)
+
+    updates = [(row.id, profiles[key]) for row, key in zip(rows, keys) if key in profiles]
+    if updates:
+        db.session.execute(db.text(PROFILE_UPDATE_SQL), {
+            "now": datetime.utcnow(),
+            "ids": [str(patient_id) for patient_id, _ in updates],
+            "display_names": [profile.get("displayName") for _, profile in updates],
+            "picture_urls": [profile.get("pictureUrl") for _, profile in updates],
+        })
+        db.session.commit()
+    if skipped:
+        db.session.execute(
+            update(Patient)
+            .where(Patient.id.in_(skipped))
+            .values(profile_refreshed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    return {
+        "claimed": len(rows),
+        "updated": len(updates),
+        "cached": cached,
+        "skipped": len(skipped),
+        "failed": len(rows) - len(updates) - len(skipped)
+    }
+
+
+class ProfileEnricher:
+    """LINE プロフィールを取得して患者に反映するワーカースレッド
+
+    友だち追加の Webhook では取得せず（応答を遅らせない）、このワーカーが
+    未取得・期限切れの患者をバッチで取得する。取り出しは SKIP LOCKED なので
+    複数プロセスで起動してもよい。
+    """
+
+    def __init__(self, app, batch_size: int = PROFILE_BATCH_SIZE, poll_interval: float = PROFILE_POLL_INTERVAL):
+        self.app = app
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._stop = threading.Event()
+        self._wakeup = threading.Condition()
+        self._generation = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {"updated": 0, "cached": 0, "skipped": 0, "failed": 0}
+
+    def start(self):
+        """ワーカースレッドを起動"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profile-enricher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """取得中のバッチを終えてから停止"""
+        self._stop.set()
+        self.wake()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def wake(self):
+        """友だち追加を通知（ポーリング待ちを打ち切る）"""
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def _run(self):
+        from services.db_pool import use_jobs_pool
+
+        use_jobs_pool()
+        while not self._stop.is_set():
+            with self._wakeup:
+                generation = self._generation
+            counts = {}
+            try:
+                with self.app.app_context():
+                    counts = enrich_profiles(self.batch_size)
+                with self._lock:
+                    for name in self._counters:
+                        self._counters[name] += counts[name]
+            except Exception as e:
+                print(f"Profile enricher error: {e}")
+
+            if counts.get("claimed", 0) < self.batch_size:
+                with self._wakeup:
+                    if generation == self._generation and not self._stop.is_set():
+                        self._wakeup.wait(self.poll_interval)
+
+    def stats(self) -> dict:
+        """取得件数などの統計"""
+        with self._lock:
+            return {"running": self._thread is not None, **self._counters}
+
+
+_enricher = None
+
+
+def start_enricher(app, **kwargs) -> ProfileEnricher:
+    """このプロセスでプロフィール取得ワーカーを起動"""
+    global _enricher
+
+    if _enricher is None:
+        _enricher = ProfileEnricher(app, **kwargs)
+    _enricher.start()
+    return _enricher
+
+
+def notify_enricher():
+    """同じプロセス内のワーカーに友だち追加を通知（別プロセスはポーリングで拾う）"""
+    if _enricher is not None:
+        _enricher.wake()
+
+
+def profile_stats() -> dict:
+    """プロフィール未取得・期限切れの患者数とワーカーの状態"""
+    stale = datetime.utcnow() - timedelta(days=PROFILE_REFRESH_DAYS)
+    missing, due = db.session.execute(db.text("""
+        SELECT count(*) FILTER (WHERE profile_refreshed_at IS NULL),
+               count(*) FILTER (WHERE profile_refreshed_at IS NULL OR profile_refreshed_at < :stale)
+        FROM patients WHERE status = 'active'
+    """), {"stale": stale}).one()
+    return {
+        "enricher": PROFILE_ENRICHER,
+        "missing": missing,
+        "due": due,
+        "worker": _enricher.stats() if _enricher is not None else None
+    }
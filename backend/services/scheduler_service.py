@@ -1,165 +1,404 @@
-from datetime import datetime, timedelta
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 scheduler = BackgroundScheduler()
 
+# standalone（既定）: Web プロセスでは起動せず `flask scheduler` の専用プロセスで実行
+# embedded: `python app.py`（開発用サーバー）のプロセス内で起動。gunicorn のワーカーでは起動しない
+# off: 起動しない
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "standalone")
 
-def init_scheduler(app):
-    """スケジューラー初期化"""
+# 起動が遅れても同じ実行回とみなす猶予（秒）
+JOB_MISFIRE_GRACE_SECONDS = int(os.getenv("JOB_MISFIRE_GRACE_SECONDS", "300"))
+
+# 夜間に再集計する日数（タイムゾーン差で日付をまたぐ分を含めて直近2日）
+DAILY_STATS_REBUILD_DAYS = int(os.getenv("DAILY_STATS_REBUILD_DAYS", "2"))
+
+
+def scheduled_jobs() -> list:
+    """(ジョブID, 処理関数, トリガー) の一覧"""
+    return [
+        # アフターフォロー（毎時0分）
+        ("aftercare_job", process_aftercare, CronTrigger(minute=0)),
+        # リコール（毎日9:00）
+        ("recall_job", process_recall, CronTrigger(hour=9, minute=0)),
+        # 日別ロールアップの再集計（毎日3:00）
+        ("daily_stats_job", process_daily_stats, CronTrigger(hour=3, minute=0)),
+        # 処理済み Webhook イベントの削除（毎日4:00）
+        ("webhook_purge_job", process_webhook_purge, CronTrigger(hour=4, minute=0)),
+        # 送信済みアウトボックスの削除（毎日4:10）
+        ("outbox_purge_job", process_outbox_purge, CronTrigger(hour=4, minute=10)),
+    ]
+
+
+def init_scheduler(app, jobs: Optional[list] = None):
+    """スケジューラー初期化
+
+    複数プロセスで起動しても、各ジョブは実行回ごとにクラスタ全体で1回だけ実行される
+    （services.job_runner.run_exclusive）。
+    """
+    jobs = scheduled_jobs() if jobs is None else jobs
     
-    with app.app_context():
-        # アフターフォロー（毎時実行）
+    for job_id, func, trigger in jobs:
         scheduler.add_job(
-            func=lambda: run_with_app_context(app, process_aftercare),
-            trigger=CronTrigger(minute=0),  # 毎時0分
-            id="aftercare_job",
-            replace_existing=True
+            func=run_scheduled_job,
+            args=(app, job_id, func, trigger),
+            trigger=trigger,
+            id=job_id,
+            replace_existing=True,
+            misfire_grace_time=JOB_MISFIRE_GRACE_SECONDS,
+            coalesce=True
         )
-        
-        # リコール（毎日9時）
-        scheduler.add_job(
-            func=lambda: run_with_app_context(app, process_recall),
-            trigger=CronTrigger(hour=9, minute=0),  # 毎日9:00
-            id="recall_job",
-            replace_existing=True
-        )
-        
-        scheduler.start()
-        print("Scheduler started with jobs: aftercare_job, recall_job")
+    
+    scheduler.start()
+    print(f"Scheduler started with jobs: {', '.join(job_id for job_id, *_ in jobs)}")
 
 
-def run_with_app_context(app, func):
-    """Flaskアプリコンテキスト内で実行"""
-    with app.app_context():
-        func()
+def run_scheduled_job(app, job_id: str, func, trigger):
+    """トリガーの予定時刻を実行回としてジョブを排他実行"""
+    from services.db_pool import jobs_pool
+    from services.job_runner import run_exclusive
+    
+    # 各プロセスの起動時刻のずれに関係なく同じ予定時刻になるよう、
+    # 猶予時間内で現在時刻以前の最後の起動予定時刻をトリガーから求める
+    now = datetime.now(trigger.timezone)
+    scheduled = trigger.get_next_fire_time(None, now - timedelta(seconds=JOB_MISFIRE_GRACE_SECONDS))
+    if scheduled is None or scheduled > now:
+        # 予定時刻以外からの手動実行
+        scheduled = now.replace(microsecond=0)
+    while True:
+        following = trigger.get_next_fire_time(scheduled, scheduled + timedelta(microseconds=1))
+        if following is None or following > now:
+            break
+        scheduled = following
+    scheduled_at = scheduled.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    with app.app_context(), jobs_pool():
+        run_exclusive(job_id, scheduled_at, func)
 
 
-def process_aftercare():
-    """アフターフォロー処理（来院24時間後にメッセージ送信）"""
+def _active_templates(template_type: str):
+    """テナントごとの有効なテンプレート（最新の1件）サブクエリ"""
+    from sqlalchemy import select
+    from models.message_template import MessageTemplate
+    
+    return (
+        select(
+            MessageTemplate.id,
+            MessageTemplate.tenant_id,
+            MessageTemplate.content,
+            MessageTemplate.personalize,
+            MessageTemplate.updated_at
+        )
+        .where(
+            MessageTemplate.type == template_type,
+            MessageTemplate.is_active == True
+        )
+        .distinct(MessageTemplate.tenant_id)
+        .order_by(MessageTemplate.tenant_id, MessageTemplate.created_at.desc())
+        .subquery()
+    )
+
+
+def _job_tenants(template_type: str, *conditions) -> list:
+    """ジョブ対象テナント（有効なテンプレートとアクセストークンあり）のID一覧"""
+    from sqlalchemy import select
     from app import db
-    from models.visit import Visit
-    from models.patient import Patient
     from models.tenant import Tenant
-    from models.message_template import MessageTemplate
-    from models.message_log import MessageLog
-    from services.line_service import send_line_message
+    
+    template = _active_templates(template_type)
+    tenant_ids = db.session.execute(
+        select(Tenant.id)
+        .join(template, template.c.tenant_id == Tenant.id)
+        .where(
+            Tenant.line_channel_access_token.isnot(None),
+            Tenant.line_channel_access_token != "",
+            *conditions
+        )
+    ).scalars().all()
+    db.session.rollback()
+    return tenant_ids
+
+
+def process_aftercare():
+    """アフターフォロー処理（来院24時間後にメッセージ送信）
+
+    テナントをシャードに分けて並行処理する。送信待ちメッセージ・送信ログ・来院の
+    アフターフォロー済みはテナント単位で同じトランザクションでコミットし、
+    送信はアウトボックスのディスパッチャーが行う。
+    """
+    from services.outbox_service import notify_dispatcher
+    from services.shard_executor import run_sharded
     
     now = datetime.utcnow()
     # 23〜25時間前に来院した患者を対象（1時間の幅をもたせる）
     target_start = now - timedelta(hours=25)
     target_end = now - timedelta(hours=23)
     
-    visits = Visit.query.filter(
-        Visit.visit_date >= target_start,
-        Visit.visit_date < target_end,
-        Visit.aftercare_sent == False
+    run = run_sharded(
+        _job_tenants("aftercare"),
+        lambda tenant_ids, shard: _aftercare_shard(tenant_ids, shard, target_start, target_end)
+    )
+    notify_dispatcher()
+    counters = run.counters
+    print(f"Aftercare processed: {run.rows} visits in {len(run.shards)} shards, "
+          f"{counters.get('multicast', 0)} multicast / {counters.get('push', 0)} push requests, "
+          f"{len(run.failed_tenants)} tenants failed")
+    return run
+
+
+def _aftercare_shard(tenant_ids: list, shard, target_start: datetime, target_end: datetime):
+    """1シャード分のアフターフォロー"""
+    from sqlalchemy import select, update
+    from app import db
+    from models.visit import Visit
+    from models.patient import Patient
+    from models.tenant import Tenant
+    from services.message_log_writer import MessageLogWriter
+    from services.message_render import coalesce, get_compiled, render_batch
+    from services.outbox_service import OutboxWriter
+    
+    # テナントごとの有効なアフターフォローテンプレート
+    template = _active_templates("aftercare")
+    
+    # 対象来院・患者・テナント・テンプレートを1クエリで取得
+    rows = db.session.execute(
+        select(
+            Visit.id.label("visit_id"),
+            Patient.id.label("patient_id"),
+            Patient.line_user_id,
+            Patient.display_name,
+            Patient.last_visit_at,
+            Tenant.id.label("tenant_id"),
+            Tenant.clinic_name,
+            Tenant.timezone,
+            template.c.id.label("template_id"),
+            template.c.content,
+            template.c.personalize,
+            template.c.updated_at
+        )
+        .join(Patient, Patient.id == Visit.patient_id)
+        .join(Tenant, Tenant.id == Patient.tenant_id)
+        .join(template, template.c.tenant_id == Tenant.id)
+        .where(
+            Tenant.id.in_(tenant_ids),
+            Visit.visit_date >= target_start,
+            Visit.visit_date < target_end,
+            Visit.aftercare_sent == False,
+            Patient.status == "active"
+        )
     ).all()
+    db.session.rollback()
     
-    for visit in visits:
-        patient = Patient.query.get(visit.patient_id)
-        if not patient or patient.status != "active":
-            continue
-        
-        tenant = Tenant.query.get(patient.tenant_id)
-        if not tenant or not tenant.line_channel_access_token:
-            continue
-        
-        # テンプレート取得
-        template = MessageTemplate.query.filter_by(
-            tenant_id=tenant.id,
-            type="aftercare",
-            is_active=True
-        ).first()
-        
-        if not template:
-            continue
-        
-        # メッセージ送信
-        message = template.content.replace("{name}", patient.display_name or "患者様")
-        success = send_line_message(
-            tenant.line_channel_access_token,
-            patient.line_user_id,
-            message
+    # テナントごとに患者向けの本文をまとめて展開
+    tenant_rows = {}
+    for row in rows:
+        tenant_rows.setdefault(row.tenant_id, []).append(row)
+    recipients = {}
+    for tenant_id, batch in tenant_rows.items():
+        first = batch[0]
+        messages = render_batch(
+            get_compiled(first.template_id, first.updated_at, first.content), batch,
+            clinic_name=first.clinic_name, tz_name=first.timezone, personalize=first.personalize
         )
-        
-        if success:
-            visit.aftercare_sent = True
-            visit.aftercare_sent_at = datetime.utcnow()
-            
-            # ログ記録
-            log = MessageLog(
-                patient_id=patient.id,
-                message_type="aftercare",
-                content=message,
-                status="sent"
-            )
-            db.session.add(log)
+        for row, message in zip(batch, messages):
+            recipient = recipients.setdefault(tenant_id, {}).setdefault((row.line_user_id, message), {
+                "patient_id": row.patient_id,
+                "visit_ids": []
+            })
+            recipient["visit_ids"].append(row.visit_id)
     
-    db.session.commit()
-    print(f"Aftercare processed: {len(visits)} visits")
+    # テナントごとに1トランザクション（1テナントの失敗で他のテナントの処理を失わない）
+    for tenant_id, tenant_recipients in recipients.items():
+        with shard.tenant(tenant_id):
+            log_writer = MessageLogWriter()
+            outbox = OutboxWriter()
+            # 同じ本文の宛先はマルチキャスト（最大500件）、本文が異なる宛先だけプッシュ
+            for endpoint, message, keys in coalesce([(key, key[1]) for key in tenant_recipients]):
+                targets = [tenant_recipients[key] for key in keys]
+                visit_ids = [visit_id for t in targets for visit_id in t["visit_ids"]]
+                db.session.execute(
+                    update(Visit)
+                    .where(Visit.id.in_(visit_ids))
+                    .values(aftercare_sent=True, aftercare_sent_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                log_ids = log_writer.add_many(
+                    [t["patient_id"] for t in targets], "aftercare", message, status="pending"
+                )
+                user_ids = [user_id for user_id, _ in keys]
+                if endpoint == "push":
+                    outbox.push(tenant_id, user_ids[0], message, log_ids=log_ids)
+                else:
+                    outbox.multicast(tenant_id, user_ids, message, log_ids=log_ids)
+                shard.count(endpoint)
+                shard.rows += len(visit_ids)
+            log_writer.flush()
+            outbox.flush()
 
 
 def process_recall():
-    """リコール処理（休眠患者への呼び戻し）"""
-    from app import db
-    from models.patient import Patient
+    """リコール処理（休眠患者への呼び戻し）
+
+    テナントをシャードに分けて並行処理する。テナントごとに休眠患者を
+    (last_visit_at, id) のキーセットで500件ずつ走査し、チャンクごとに
+    送信待ちメッセージ・送信ログ・カーソルを同じトランザクションでコミットする。
+    途中で停止しても同日の再実行はカーソルから再開する。
+    """
     from models.tenant import Tenant
-    from models.message_template import MessageTemplate
-    from models.message_log import MessageLog
-    from services.line_service import multicast_line_message
+    from services.outbox_service import notify_dispatcher
+    from services.shard_executor import run_sharded
     
     now = datetime.utcnow()
+    today = now.date()
     # 90日以上来院していない患者
     dormant_threshold = now - timedelta(days=90)
     
-    # テナントごとに処理
-    tenants = Tenant.query.filter(
-        Tenant.subscription_status == "active"
+    # 配信対象テナント（有効なリコールテンプレートあり）
+    run = run_sharded(
+        _job_tenants("recall", Tenant.subscription_status == "active"),
+        lambda tenant_ids, shard: _recall_shard(tenant_ids, shard, today, dormant_threshold)
+    )
+    notify_dispatcher()
+    counters = run.counters
+    print(f"Recall processed for {sum(s.tenants for s in run.shards)} tenants, {run.rows} patients, "
+          f"{counters.get('multicast', 0)} multicast / {counters.get('push', 0)} push requests, "
+          f"{len(run.failed_tenants)} tenants failed")
+    return run
+
+
+def _recall_shard(tenant_ids: list, shard, today, dormant_threshold: datetime):
+    """1シャード分のリコール"""
+    from sqlalchemy import select, update, tuple_
+    from app import db
+    from models.patient import Patient
+    from models.tenant import Tenant
+    from models.recall_run import RecallRun
+    from services.line_service import MULTICAST_MAX_RECIPIENTS
+    from services.message_log_writer import MessageLogWriter
+    from services.message_render import coalesce, get_compiled, render_batch
+    from services.outbox_service import OutboxWriter
+    
+    template = _active_templates("recall")
+    tenants = db.session.execute(
+        select(
+            Tenant.id,
+            Tenant.clinic_name,
+            Tenant.timezone,
+            template.c.id.label("template_id"),
+            template.c.content,
+            template.c.personalize,
+            template.c.updated_at
+        )
+        .join(template, template.c.tenant_id == Tenant.id)
+        .where(Tenant.id.in_(tenant_ids))
     ).all()
     
+    # 当日の進捗を取得（なければ作成）
+    runs = {
+        r.tenant_id: r
+        for r in RecallRun.query.filter(RecallRun.run_date == today, RecallRun.tenant_id.in_(tenant_ids))
+    }
     for tenant in tenants:
-        if not tenant.line_channel_access_token:
-            continue
-        
-        # リコールテンプレート取得
-        template = MessageTemplate.query.filter_by(
-            tenant_id=tenant.id,
-            type="recall",
-            is_active=True
-        ).first()
-        
-        if not template:
-            continue
-        
-        # 休眠患者取得
-        dormant_patients = Patient.query.filter(
-            Patient.tenant_id == tenant.id,
-            Patient.status == "active",
-            Patient.last_visit_at < dormant_threshold
-        ).limit(500).all()  # LINE APIの制限
-        
-        if not dormant_patients:
+        if tenant.id not in runs:
+            runs[tenant.id] = RecallRun(
+                tenant_id=tenant.id,
+                run_date=today,
+                dormant_threshold=dormant_threshold,
+                sent_count=0
+            )
+            db.session.add(runs[tenant.id])
+    db.session.commit()
+    
+    for tenant in tenants:
+        run = runs[tenant.id]
+        if run.completed_at is not None:
             continue
+        run_id, threshold = run.id, run.dormant_threshold
+        cursor = (run.cursor_last_visit_at, run.cursor_patient_id) if run.cursor_patient_id else None
         
-        # マルチキャスト送信
-        user_ids = [p.line_user_id for p in dormant_patients]
-        success = multicast_line_message(
-            tenant.line_channel_access_token,
-            user_ids,
-            template.content
-        )
-        
-        if success:
-            # ログ記録
-            for patient in dormant_patients:
-                log = MessageLog(
-                    patient_id=patient.id,
-                    message_type="recall",
-                    content=template.content,
-                    status="sent"
+        done = False
+        while not done and not shard.failed(tenant.id):
+            with shard.tenant(tenant.id):
+                query = select(Patient.id, Patient.line_user_id, Patient.display_name, Patient.last_visit_at).where(
+                    Patient.tenant_id == tenant.id,
+                    Patient.status == "active",
+                    Patient.last_visit_at < threshold
                 )
-                db.session.add(log)
+                if cursor:
+                    query = query.where(tuple_(Patient.last_visit_at, Patient.id) > tuple_(*cursor))
+                page = db.session.execute(
+                    query.order_by(Patient.last_visit_at, Patient.id).limit(MULTICAST_MAX_RECIPIENTS)
+                ).all()
+                done = len(page) < MULTICAST_MAX_RECIPIENTS
+                
+                if page:
+                    log_writer = MessageLogWriter()
+                    outbox = OutboxWriter()
+                    messages = render_batch(
+                        get_compiled(tenant.template_id, tenant.updated_at, tenant.content), page,
+                        clinic_name=tenant.clinic_name, tz_name=tenant.timezone, personalize=tenant.personalize
+                    )
+                    sends = coalesce(list(zip(page, messages)))
+                    for n, (endpoint, message, patients) in enumerate(sends):
+                        log_ids = log_writer.add_many(
+                            [p.id for p in patients], "recall", message, status="pending"
+                        )
+                        # 同じカーソルからのチャンクは同じキーになり、二重に積まれない
+                        key = uuid.uuid5(run_id, f"{cursor}:{n}")
+                        if endpoint == "push":
+                            outbox.push(tenant.id, patients[0].line_user_id, message, log_ids=log_ids, idempotency_key=key)
+                        else:
+                            outbox.multicast(
+                                tenant.id, [p.line_user_id for p in patients], message,
+                                log_ids=log_ids, idempotency_key=key
+                            )
+                        shard.count(endpoint)
+                    log_writer.flush()
+                    outbox.flush()
+                    cursor = (page[-1].last_visit_at, page[-1].id)
+                
+                db.session.execute(
+                    update(RecallRun)
+                    .where(RecallRun.id == run_id)
+                    .values(
+                        cursor_last_visit_at=cursor[0] if cursor else None,
+                        cursor_patient_id=cursor[1] if cursor else None,
+                        sent_count=RecallRun.sent_count + len(page),
+                        completed_at=datetime.utcnow() if done else None
+                    )
+                )
+                shard.rows += len(page)
+
+
+def process_daily_stats():
+    """日別ロールアップを直近分だけ生データから再集計（取りこぼしの補正）"""
+    from datetime import date
+    from services.stats_service import rebuild_daily_stats
     
-    db.session.commit()
-    print(f"Recall processed for {len(tenants)} tenants")
+    since_date = date.today() - timedelta(days=DAILY_STATS_REBUILD_DAYS)
+    rows = rebuild_daily_stats(since_date=since_date)
+    print(f"Daily stats rebuilt since {since_date}: {rows} rows")
+    return rows
+
+
+def process_webhook_purge():
+    """保持期間を過ぎた処理済み Webhook イベントを削除"""
+    from services.webhook_queue import purge_processed_events
+    
+    deleted = purge_processed_events()
+    print(f"Webhook events purged: {deleted}")
+    return deleted
+
+
+def process_outbox_purge():
+    """保持期間を過ぎた送信済みメッセージをアウトボックスから削除"""
+    from services.outbox_service import purge_sent_messages
+    
+    deleted = purge_sent_messages()
+    print(f"Outbox messages purged: {deleted}")
+    return deleted
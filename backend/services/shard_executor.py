@@ -0,0 +1,144 @@
+import os
+import time
+import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from flask import current_app
+
+from app import db
+from services.db_pool import jobs_pool
+
+
+# テナントを振り分けるシャード数と、同時に処理するシャード数（スレッド数）
+JOB_SHARDS = int(os.getenv("JOB_SHARDS", "8"))
+JOB_SHARD_WORKERS = int(os.getenv("JOB_SHARD_WORKERS", "4"))
+
+
+def tenant_shard(tenant_id, shards: int = JOB_SHARDS) -> int:
+    """テナントごとに固定のシャード番号"""
+    return zlib.crc32(str(tenant_id).encode("utf-8")) % shards
+
+
+@dataclass
+class ShardResult:
+    """1シャード分の処理結果"""
+
+    shard: int
+    tenants: int = 0
+    rows: int = 0
+    failed_tenants: list = field(default_factory=list)
+    counters: dict = field(default_factory=dict)  # ジョブ固有の件数（送信リクエスト数など）
+    seconds: float = 0.0
+    error: Optional[str] = None  # シャード全体が失敗した場合
+
+    @contextmanager
+    def tenant(self, tenant_id):
+        """テナント1件分の処理（成功ならコミット、例外はロールバックして記録し、他のテナントは続行）"""
+        rows, counters = self.rows, dict(self.counters)
+        try:
+            yield
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.rows, self.counters = rows, counters
+            self.failed_tenants.append(str(tenant_id))
+            print(f"Shard {self.shard}: tenant {tenant_id} failed: {traceback.format_exc()}")
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def failed(self, tenant_id) -> bool:
+        return str(tenant_id) in self.failed_tenants
+
+    def to_dict(self) -> dict:
+        return {
+            "shard": self.shard,
+            "tenants": self.tenants,
+            "rows": self.rows,
+            "failed_tenants": self.failed_tenants,
+            "counters": self.counters,
+            "seconds": round(self.seconds, 3),
+            "error": self.error,
+        }
+
+
+@dataclass
+class ShardedRun:
+    """シャード並列実行の結果（job_runs.details に記録される）"""
+
+    shards: list
+
+    @property
+    def rows(self) -> int:
+        return sum(s.rows for s in self.shards)
+
+    @property
+    def failed_tenants(self) -> list:
+        return [t for s in self.shards for t in s.failed_tenants]
+
+    @property
+    def counters(self) -> dict:
+        totals = {}
+        for shard in self.shards:
+            for name, n in shard.counters.items():
+                totals[name] = totals.get(name, 0) + n
+        return totals
+
+    @property
+    def failed_shards(self) -> list:
+        return [s.shard for s in self.shards if s.error]
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "tenants": sum(s.tenants for s in self.shards),
+            "failed_tenants": self.failed_tenants,
+            "failed_shards": self.failed_shards,
+            "counters": self.counters,
+            "shards": [s.to_dict() for s in self.shards],
+        }
+
+
+def run_sharded(
+    tenant_ids: list,
+    process_shard: Callable[[list, ShardResult], None],
+    shards: Optional[int] = None,
+    workers: Optional[int] = None
+) -> ShardedRun:
+    """テナントをシャードに分けてスレッドプールで並行処理（アプリコンテキスト内で呼ぶ）
+
+    process_shard(シャードのテナントIDリスト, ShardResult) は各シャードのスレッドで、
+    シャードごとのアプリコンテキスト（= ジョブ用プールの専用 DB セッション）で呼ばれる。
+    LINE への送信はアウトボックス経由なので、シャードは LINE API を呼ばない。
+    テナント単位の失敗は ShardResult.tenant で分離する。シャード内で捕捉されなかった
+    例外はそのシャードだけの失敗として記録し、他のシャードは続行する。
+    """
+    shards = shards or JOB_SHARDS
+    workers = workers or JOB_SHARD_WORKERS
+    app = current_app._get_current_object()
+    groups = {}
+    for tenant_id in tenant_ids:
+        groups.setdefault(tenant_shard(tenant_id, shards), []).append(tenant_id)
+
+    def run(shard: int) -> ShardResult:
+        result = ShardResult(shard=shard, tenants=len(groups[shard]))
+        started = time.perf_counter()
+        with app.app_context(), jobs_pool():
+            try:
+                process_shard(groups[shard], result)
+            except Exception:
+                db.session.rollback()
+                result.error = traceback.format_exc()
+                print(f"Shard {shard} failed: {result.error}")
+        result.seconds = time.perf_counter() - started
+        return result
+
+    if not groups:
+        return ShardedRun(shards=[])
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups))),
+                            thread_name_prefix="job-shard") as pool:
+        return ShardedRun(shards=list(pool.map(run, sorted(groups))))
@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from models.tenant import Tenant
+from models.daily_tenant_stat import DailyTenantStat
+from services.clinic_time import DEFAULT_TIMEZONE, local_date_of
+
+
+COUNTERS = (
+    "new_patients", "visits", "blocks", "messages", "messages_aftercare",
+    "messages_recall", "messages_welcome", "messages_reply"
+)
+
+# メッセージ種別ごとの集計カラム（それ以外は messages のみ加算）
+MESSAGE_COUNTERS = {
+    "aftercare": "messages_aftercare",
+    "recall": "messages_recall",
+    "welcome": "messages_welcome",
+    "reply": "messages_reply",
+}
+
+
+def message_events(tenant_id, sent_at: datetime, message_type: str, count: int = 1) -> list:
+    """メッセージ送信の集計イベント"""
+    events = [(tenant_id, sent_at, "messages", count)]
+    if message_type in MESSAGE_COUNTERS:
+        events.append((tenant_id, sent_at, MESSAGE_COUNTERS[message_type], count))
+    return events
+
+
+def record_stats(events: Iterable[tuple]):
+    """集計イベントを日別ロールアップに加算
+
+    events は (tenant_id, 発生日時(UTC), カラム名, 件数) のタプル。
+    テナント現地日付ごとにまとめて1文の UPSERT で加算する（コミットは呼び出し側）。
+    """
+    events = [e for e in events if e[0] is not None]
+    if not events:
+        return
+
+    tenant_ids = {str(tenant_id) for tenant_id, _, _, _ in events}
+    timezones = {
+        str(tenant_id): tz_name
+        for tenant_id, tz_name in db.session.query(Tenant.id, Tenant.timezone)
+        .filter(Tenant.id.in_(tenant_ids))
+    }
+
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for tenant_id, occurred_at, counter, count in events:
+        tz_name = timezones.get(str(tenant_id), DEFAULT_TIMEZONE)
+        totals[(str(tenant_id), local_date_of(occurred_at, tz_name))][counter] += count
+
+    now = datetime.utcnow()
+    statement = insert(DailyTenantStat).values([
+        {"tenant_id": tenant_id, "stat_date": stat_date, "updated_at": now, **counts}
+        for (tenant_id, stat_date), counts in sorted(totals.items())
+    ])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=["tenant_id", "stat_date"],
+        set_={
+            **{c: getattr(DailyTenantStat, c) + getattr(statement.excluded, c) for c in COUNTERS},
+            "updated_at": statement.excluded.updated_at,
+        }
+    ))
+
+
+REBUILD_SQL = """
+INSERT INTO daily_tenant_stats (
+    tenant_id, stat_date, new_patients, visits, blocks, messages,
+    messages_aftercare, messages_recall, messages_welcome, messages_reply, updated_at
+)
+SELECT
+    e.tenant_id,
+    e.stat_date,
+    count(*) FILTER (WHERE e.kind = 'patient'),
+    count(*) FILTER (WHERE e.kind = 'visit'),
+    count(*) FILTER (WHERE e.kind = 'block'),
+    count(*) FILTER (WHERE e.kind = 'message'),
+    count(*) FILTER (WHERE e.kind = 'message' AND e.message_type = 'aftercare'),
+    count(*) FILTER (WHERE e.kind = 'message' AND e.message_type = 'recall'),
+    count(*) FILTER (WHERE e.kind = 'message' AND e.message_type = 'welcome'),
+    count(*) FILTER (WHERE e.kind = 'message' AND e.message_type = 'reply'),
+    now() AT TIME ZONE 'UTC'
+FROM (
+    SELECT p.tenant_id, date(timezone(t.timezone, timezone('UTC', p.created_at))) AS stat_date,
+           'patient' AS kind, NULL AS message_type
+    FROM patients p JOIN tenants t ON t.id = p.tenant_id
+    WHERE p.created_at >= :since {tenant_filter}
+    UNION ALL
+    SELECT p.tenant_id, date(timezone(t.timezone, timezone('UTC', p.updated_at))),
+           'block', NULL
+    FROM patients p JOIN tenants t ON t.id = p.tenant_id
+    WHERE p.status = 'blocked' AND p.updated_at >= :since {tenant_filter}
+    UNION ALL
+    SELECT p.tenant_id, date(timezone(t.timezone, timezone('UTC', v.visit_date))),
+           'visit', NULL
+    FROM visits v JOIN patients p ON p.id = v.patient_id JOIN tenants t ON t.id = p.tenant_id
+    WHERE v.visit_date >= :since {tenant_filter}
+    UNION ALL
+    SELECT p.tenant_id, date(timezone(t.timezone, timezone('UTC', m.sent_at))),
+           'message', m.message_type
+    FROM message_logs m JOIN patients p ON p.id = m.patient_id JOIN tenants t ON t.id = p.tenant_id
+    WHERE m.status = 'sent' AND m.sent_at >= :since {tenant_filter}
+) e
+WHERE e.stat_date >= :since_date
+GROUP BY e.tenant_id, e.stat_date
+ON CONFLICT (tenant_id, stat_date) DO UPDATE SET
+    new_patients = excluded.new_patients,
+    visits = excluded.visits,
+    messages = excluded.messages,
+    messages_aftercare = excluded.messages_aftercare,
+    messages_recall = excluded.messages_recall,
+    messages_welcome = excluded.messages_welcome,
+    messages_reply = excluded.messages_reply,
+    updated_at = excluded.updated_at
+"""
+
+
+def rebuild_daily_stats(since_date: Optional[date] = None, tenant_id=None) -> int:
+    """生データから日別ロールアップを再集計（since_date 以降、None は全期間）
+
+    ブロック数は解除イベントの履歴がないため、既存行では加算済みの値を残す。
+    """
+    since_date = since_date or date(1970, 1, 1)
+    # 現地日付の境界をまたぐ分を含めるため1日前から読む
+    since = datetime.combine(since_date - timedelta(days=1), datetime.min.time())
+
+    sql = REBUILD_SQL.format(tenant_filter="AND p.tenant_id = :tenant_id" if tenant_id else "")
+    params = {"since": since, "since_date": since_date}
+    if tenant_id:
+        params["tenant_id"] = str(tenant_id)
+    result = db.session.execute(db.text(sql), params)
+    db.session.commit()
+    return result.rowcount
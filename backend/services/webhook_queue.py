@@ -0,0 +1,316 @@
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.orm import aliased
+
+from app import db
+from models.webhook_event import WebhookEvent
+
+
+# sync: リクエスト内でイベントを処理 / queue: キューに保存してワーカーで処理
+WEBHOOK_MODE = os.getenv("LINE_WEBHOOK_MODE", "sync")
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "1.0"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+# 失敗したイベントを再試行するまでの秒数（試行ごとに2倍）
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "5"))
+WEBHOOK_RETENTION_DAYS = int(os.getenv("WEBHOOK_RETENTION_DAYS", "7"))
+
+# ワーカーの担当パーティションを確保するアドバイザリーロックのキー（"LINE"）
+PARTITION_LOCK_KEY = 0x4C494E45
+
+SHARDS = 1024
+
+
+def shard_of(tenant_id, line_user_id) -> int:
+    """テナント・ユーザーごとに固定のシャード番号"""
+    return zlib.crc32(f"{tenant_id}:{line_user_id or ''}".encode("utf-8")) % SHARDS
+
+
+def enqueue_events(tenant_id, events: list) -> int:
+    """受信したイベントをキューテーブルに保存（コミットは呼び出し側）"""
+    if not events:
+        return 0
+
+    now = datetime.utcnow()
+    rows = []
+    for event in events:
+        user_id = event.get("source", {}).get("userId")
+        rows.append({
+            "tenant_id": tenant_id,
+            "line_user_id": user_id,
+            "shard": shard_of(tenant_id, user_id),
+            "payload": event,
+            "status": "pending",
+            "attempts": 0,
+            "received_at": now
+        })
+    db.session.execute(db.insert(WebhookEvent), rows)
+    return len(rows)
+
+
+class WebhookWorkerPool:
+    """キューに保存された Webhook イベントを処理するワーカースレッド群
+
+    イベントはシャードでワーカーに振り分け、各ワーカーは担当分を受信順にバッチで取り出し、
+    連続する同じテナントのイベントをまとめて処理する（同じユーザーのイベントは常に
+    同じワーカーが順番に処理）。失敗したイベントは再試行時刻まで待たせ、その間は
+    同じユーザーの以降のイベントだけを止めて他のユーザーの処理を続ける。
+    担当パーティションはアドバイザリーロックで確保するため、同じワーカー数で
+    複数プロセスから起動しても二重処理や順序の入れ替わりは起きない。
+    """
+
+    def __init__(
+        self,
+        app,
+        workers: int = WEBHOOK_WORKERS,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        poll_interval: float = WEBHOOK_POLL_INTERVAL,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        retry_base_seconds: float = WEBHOOK_RETRY_BASE_SECONDS
+    ):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+
+        self._stop = threading.Event()
+        self._wakeups = [threading.Event() for _ in range(workers)]
+        self._threads = []
+        self._owned = set()
+        self._lock = threading.Lock()
+        self._counters = {"processed": 0, "failed": 0, "retried": 0}
+
+    def start(self):
+        """ワーカースレッドを起動"""
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, args=(p,), name=f"webhook-worker-{p}", daemon=True)
+            for p in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """処理中のイベントを終えてから停止"""
+        self._stop.set()
+        self.wake()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """新しいイベントの到着を通知（ポーリング待ちを打ち切る）"""
+        for wakeup in self._wakeups:
+            wakeup.set()
+
+    def _run(self, partition: int):
+        from services.db_pool import jobs_engine, use_jobs_pool
+
+        use_jobs_pool()
+        with self.app.app_context():
+            engine = jobs_engine()
+        lock_conn = None
+
+        while not self._stop.is_set():
+            processed = 0
+            try:
+                if lock_conn is None:
+                    lock_conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+                # セッションレベルのロック（保持中の再取得も成功する）
+                owned = lock_conn.execute(
+                    db.text("SELECT pg_try_advisory_lock(:key, :partition)"),
+                    {"key": PARTITION_LOCK_KEY, "partition": partition}
+                ).scalar()
+                self._set_owned(partition, owned)
+                if owned:
+                    with self.app.app_context():
+                        processed = self.process_partition(partition)
+            except Exception as e:
+                print(f"Webhook worker {partition} error: {e}")
+                self._set_owned(partition, False)
+                if lock_conn is not None:
+                    lock_conn.invalidate()
+                    lock_conn = None
+
+            if processed < self.batch_size:
+                self._wakeups[partition].wait(self.poll_interval)
+                self._wakeups[partition].clear()
+
+        if lock_conn is not None:
+            lock_conn.execute(db.text("SELECT pg_advisory_unlock_all()"))
+            lock_conn.close()
+        self._set_owned(partition, False)
+
+    def _set_owned(self, partition: int, owned: bool):
+        with self._lock:
+            if owned:
+                self._owned.add(partition)
+            else:
+                self._owned.discard(partition)
+
+    def process_partition(self, partition: int) -> int:
+        """担当パーティションの未処理イベントを受信順に1バッチ処理し、取り出した件数を返す
+
+        再試行待ちのイベントがあるユーザーは、そのイベント以降を取り出さない。
+        連続する同じテナントのイベントは1回の process_events と1コミットで処理し、
+        失敗した場合はイベントごとに処理し直して、失敗したユーザーの以降のイベントだけを残す。
+        """
+        now = datetime.utcnow()
+        waiting = aliased(WebhookEvent)
+        rows = db.session.execute(
+            select(
+                WebhookEvent.id, WebhookEvent.tenant_id, WebhookEvent.line_user_id,
+                WebhookEvent.payload, WebhookEvent.attempts
+            )
+            .where(
+                WebhookEvent.status == "pending",
+                WebhookEvent.shard % self.workers == partition,
+                ~exists().where(
+                    waiting.status == "pending",
+                    waiting.next_attempt_at > now,
+                    waiting.tenant_id == WebhookEvent.tenant_id,
+                    waiting.line_user_id.is_not_distinct_from(WebhookEvent.line_user_id),
+                    waiting.id <= WebhookEvent.id
+                )
+            )
+            .order_by(WebhookEvent.id)
+            .limit(self.batch_size)
+        ).all()
+        db.session.rollback()
+
+        # 再試行待ちになったユーザー（このバッチの以降のイベントは処理しない）
+        blocked = set()
+        for tenant_id, group in groupby(rows, key=lambda row: row.tenant_id):
+            group = [row for row in group if (row.tenant_id, row.line_user_id) not in blocked]
+            if not group:
+                continue
+            try:
+                self._process(tenant_id, group)
+                continue
+            except Exception as e:
+                db.session.rollback()
+                if len(group) == 1:
+                    self._fail(group[0], e, blocked)
+                    continue
+            for row in group:
+                if (row.tenant_id, row.line_user_id) in blocked:
+                    continue
+                try:
+                    self._process(tenant_id, [row])
+                except Exception as e:
+                    db.session.rollback()
+                    self._fail(row, e, blocked)
+        return len(rows)
+
+    def _process(self, tenant_id, rows: list):
+        """同じテナントのイベントを受信順に処理して処理済みにする（1トランザクション）"""
+        from routes.webhook import process_events
+        from services.cache_service import get_tenant
+        from services.outbox_service import notify_dispatcher
+        from services.profile_service import notify_enricher
+
+        tenant = get_tenant(tenant_id)
+        followed = process_events(tenant, [row.payload for row in rows]) if tenant else 0
+        db.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_([row.id for row in rows]))
+            .values(status="done", attempts=WebhookEvent.attempts + 1, processed_at=datetime.utcnow())
+        )
+        db.session.commit()
+        notify_dispatcher()
+        if followed:
+            notify_enricher()
+        self._count("processed", len(rows))
+
+    def _fail(self, row, error: Exception, blocked: set):
+        """失敗したイベントに再試行時刻を設定（上限回数で failed）"""
+        attempts = row.attempts + 1
+        status = "failed" if attempts >= self.max_attempts else "pending"
+        print(f"Webhook event {row.id} failed ({attempts}/{self.max_attempts}): {error}")
+        db.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id == row.id)
+            .values(
+                status=status,
+                attempts=attempts,
+                last_error=str(error)[:1000],
+                next_attempt_at=datetime.utcnow() + timedelta(seconds=self.retry_base_seconds * 2 ** row.attempts)
+            )
+        )
+        db.session.commit()
+        if status == "pending":
+            # 同じユーザーの以降のイベントが追い越さないよう、再試行までこのユーザーだけ止める
+            blocked.add((row.tenant_id, row.line_user_id))
+            self._count("retried")
+        else:
+            self._count("failed")
+
+    def _count(self, name: str, count: int = 1):
+        with self._lock:
+            self._counters[name] += count
+
+    def stats(self) -> dict:
+        """ワーカー数・処理件数などの統計"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": bool(self._threads),
+                "owned_partitions": sorted(self._owned),
+                **self._counters
+            }
+
+
+_pool = None
+
+
+def start_worker_pool(app, **kwargs) -> WebhookWorkerPool:
+    """このプロセスでワーカーを起動"""
+    global _pool
+
+    if _pool is None:
+        _pool = WebhookWorkerPool(app, **kwargs)
+    _pool.start()
+    return _pool
+
+
+def notify_workers():
+    """同じプロセス内のワーカーに新着を通知（別プロセスはポーリングで拾う）"""
+    if _pool is not None:
+        _pool.wake()
+
+
+def queue_stats() -> dict:
+    """キューの滞留状況"""
+    pending, oldest = db.session.query(
+        func.count(WebhookEvent.id), func.min(WebhookEvent.received_at)
+    ).filter(WebhookEvent.status == "pending").one()
+    return {
+        "mode": WEBHOOK_MODE,
+        "pending": pending,
+        "oldest_pending_at": oldest.isoformat() if oldest else None,
+        "pool": _pool.stats() if _pool is not None else None
+    }
+
+
+def purge_processed_events(retention_days: int = WEBHOOK_RETENTION_DAYS) -> int:
+    """処理済みイベントを保持期間経過後に削除"""
+    threshold = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(
+        db.delete(WebhookEvent).where(
+            WebhookEvent.status == "done",
+            WebhookEvent.processed_at < threshold
+        )
+    )
+    db.session.commit()
+    return result.rowcount
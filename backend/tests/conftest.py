@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+# テスト専用DB（テーブルを TRUNCATE するため本番・開発DBとは分ける）。未設定ならDBを使うテストはスキップ
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """テスト用DBに接続したアプリ（マイグレーション適用済み）"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    from flask_migrate import upgrade
+    from app import create_app
+    from services.db_pool import use_jobs_pool
+    # シード投入が Web 用の statement_timeout に掛からないようジョブ用のプールを使う
+    use_jobs_pool()
+    app = create_app()
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+    return app
@@ -0,0 +1,119 @@
+"""ホットクエリの実行計画（期待するインデックスが使われること）
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest tests/test_hot_query_indexes.py
+
+アフターフォロー・リコールのジョブ、ダッシュボード、テンプレート一覧・検索を実際に動かして
+発行された SELECT を記録し、シードしたデータで EXPLAIN (FORMAT JSON) を取って確認する。
+"""
+import json
+from contextlib import contextmanager
+
+import pytest
+
+from benchmarks._common import reset_tables
+from benchmarks.explain_hot_queries import seed, used_indexes
+
+TENANTS = 200
+PATIENTS_PER_TENANT = 300
+
+# 患者をテナントで絞るインデックス（どれが選ばれてもよい）
+PATIENT_TENANT_INDEXES = {
+    "ix_patients_tenant_status_last_visit", "ix_patients_tenant_created",
+    "ix_patients_tenant_status_created", "uq_tenant_line_user",
+}
+
+
+@pytest.fixture(scope="module")
+def seeded(app):
+    """テナント・患者・来院・ログ・テンプレート・日別ロールアップを投入して (テナントID, 患者ID) を返す"""
+    from app import db
+    from services.stats_service import rebuild_daily_stats
+
+    with app.app_context():
+        tenant_id, patient_id = seed(TENANTS, PATIENTS_PER_TENANT)
+        rebuild_daily_stats()
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+    yield tenant_id, patient_id
+    with app.app_context():
+        reset_tables()
+
+
+@contextmanager
+def captured_selects():
+    """ブロック内で全エンジンに発行された SELECT をパラメータ展開済みの SQL で記録"""
+    from sqlalchemy import event
+    from app import db
+
+    statements = []
+
+    def listener(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append(cursor.mogrify(statement, parameters).decode())
+
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", listener)
+
+
+def plan_indexes(statements: list) -> set:
+    """記録した SQL の実行計画で使われたインデックス名"""
+    from app import db
+
+    found = set()
+    for sql in statements:
+        result = db.session.execute(db.text(f"EXPLAIN (FORMAT JSON) {sql}".replace(":", r"\:"))).scalar()
+        found |= used_indexes((result if isinstance(result, list) else json.loads(result))[0]["Plan"])
+    db.session.rollback()
+    return found
+
+
+def assert_uses(found: set, *expected: set):
+    for candidates in expected:
+        assert found & candidates, f"expected one of {sorted(candidates)}, plans used {sorted(found)}"
+
+
+def test_aftercare_uses_pending_visits_index(app, seeded):
+    from services.scheduler_service import process_aftercare
+
+    with app.app_context():
+        with captured_selects() as statements:
+            process_aftercare()
+        assert_uses(plan_indexes(statements), {"ix_visits_aftercare_pending"})
+
+
+def test_recall_uses_keyset_index(app, seeded):
+    from services.scheduler_service import process_recall
+
+    with app.app_context():
+        with captured_selects() as statements:
+            process_recall()
+        assert_uses(plan_indexes(statements), {"ix_patients_tenant_status_last_visit"})
+
+
+def test_dashboard_uses_rollup_and_patient_indexes(app, seeded):
+    tenant_id, _ = seeded
+    client = app.test_client()
+    with app.app_context():
+        with captured_selects() as statements:
+            for path in ("/api/dashboard/stats", "/api/dashboard/trends"):
+                assert client.get(path, headers={"X-Tenant-ID": str(tenant_id)}).status_code == 200
+        assert_uses(plan_indexes(statements), {"daily_tenant_stats_pkey"}, PATIENT_TENANT_INDEXES)
+
+
+def test_template_queries_use_tenant_type_index(app, seeded):
+    from services.cache_service import get_active_template, template_cache
+
+    tenant_id, _ = seeded
+    client = app.test_client()
+    with app.app_context():
+        template_cache.invalidate()
+        with captured_selects() as statements:
+            assert client.get("/api/templates/", headers={"X-Tenant-ID": str(tenant_id)}).status_code == 200
+            assert get_active_template(tenant_id, "welcome") is not None
+        assert_uses(plan_indexes(statements), {"ix_message_templates_tenant_type_active"})
@@ -0,0 +1,97 @@
+"""キーワード照合（Aho-Corasick）の一致・優先順位（DB 不要）
+
+    python -m pytest tests/test_keyword_matcher.py
+"""
+import random
+
+from services.keyword_matcher import KeywordMatcher, MatchTarget, normalize
+
+
+def target(name: str, priority: int = 0, keyword: str = "", order: int = 0) -> MatchTarget:
+    """build_matcher と同じ (緊急応答, キーワード長, 新しさ) の優先度を持つ返信内容"""
+    return MatchTarget("alert_reply" if priority else "keyword_reply", name, (priority, len(keyword), order))
+
+
+def matcher(*keywords: str, **targets) -> KeywordMatcher:
+    return KeywordMatcher({k: targets.get(k) or target(k, keyword=k) for k in keywords})
+
+
+def matched(m: KeywordMatcher, text: str):
+    best = m.best_match(text)
+    return best.content if best else None
+
+
+def naive_best(keywords: dict, text: str):
+    """全キーワードを本文に対して1つずつ調べる素朴な照合"""
+    text = normalize(text)
+    hits = [t for k, t in keywords.items() if normalize(k) and normalize(k) in text]
+    return max(hits, key=lambda t: t.rank) if hits else None
+
+
+def test_no_match_and_empty_keyword():
+    m = matcher("予約", "")
+    assert m.size == 1
+    assert matched(m, "こんにちは") is None
+    assert matched(m, "") is None
+
+
+def test_suffix_keyword_inside_longer_keyword():
+    m = matcher("aa", "a")
+    assert matched(m, "ba") == "a"
+    assert matched(m, "baa") == "aa"
+    assert matched(m, "aba") == "a"
+
+
+def test_overlapping_keywords_follow_failure_links():
+    m = matcher("he", "she", "his", "hers")
+    assert matched(m, "ushers") == "hers"
+    assert matched(m, "ushe") == "she"
+    assert matched(m, "ahis") == "his"
+    # 長いキーワードの途中で外れても、接尾辞の短いキーワードは一致する
+    assert matched(matcher("abcd", "bc"), "abce") == "bc"
+
+
+def test_full_width_and_half_width_are_normalized():
+    m = matcher("ＡＢＣ", "ｲﾀｲ", "予約１")
+    assert matched(m, "abc") == "ＡＢＣ"
+    assert matched(m, "ＡＢＣ") == "ＡＢＣ"
+    assert matched(m, "Abc の件") == "ＡＢＣ"
+    assert matched(m, "歯がイタイです") == "ｲﾀｲ"
+    assert matched(m, "予約1をお願いします") == "予約１"
+
+
+def test_alert_keyword_beats_longer_template_keyword():
+    m = matcher(
+        "痛い", "痛いときの予約",
+        **{"痛い": target("alert", priority=1, keyword="痛い"),
+           "痛いときの予約": target("template", keyword="痛いときの予約")}
+    )
+    assert matched(m, "歯が痛いときの予約をしたい") == "alert"
+    assert matched(m, "痛いときの予約") == "alert"
+
+
+def test_longer_keyword_then_newer_template_wins():
+    m = matcher(
+        "予約", "予約変更", "変更",
+        **{"予約": target("old", keyword="予約", order=1),
+           "予約変更": target("long", keyword="予約変更", order=0),
+           "変更": target("new", keyword="変更", order=2)}
+    )
+    assert matched(m, "予約変更したい") == "long"
+    assert matched(m, "予約と変更") == "new"
+    assert matched(m, "予約したい") == "old"
+
+
+def test_matches_naive_search_on_random_input():
+    rng = random.Random(20261020)
+    for trial in range(300):
+        keywords = {}
+        for order in range(rng.randint(1, 12)):
+            keyword = "".join(rng.choice("abcａｂ") for _ in range(rng.randint(1, 4)))
+            keywords[keyword] = target(keyword, priority=int(rng.random() < 0.2), keyword=keyword, order=order)
+        m = KeywordMatcher(keywords)
+        for _ in range(20):
+            text = "".join(rng.choice("abcＡｂx") for _ in range(rng.randint(0, 20)))
+            expected = naive_best(keywords, text)
+            actual = m.best_match(text)
+            assert (actual and actual.rank) == (expected and expected.rank), (trial, keywords, text)
@@ -0,0 +1,90 @@
+"""テンプレートの解析・展開（DB 不要）
+
+    python -m pytest tests/test_message_render.py
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services.message_render import (
+    DEFAULT_VALUES, CompiledTemplate, TemplateError, compile_template, render, render_batch
+)
+
+
+def patient(name=None, last_visit_at=None):
+    return SimpleNamespace(display_name=name, last_visit_at=last_visit_at)
+
+
+def test_compile_splits_text_and_placeholders():
+    template = compile_template("{name}さん、{clinic_name}です。{name}さんの前回は{last_visit_date}")
+    assert template.parts == ("", "name", "さん、", "clinic_name", "です。", "name", "さんの前回は", "last_visit_date", "")
+    assert template.fields == ("name", "clinic_name", "last_visit_date")
+    assert template.personal
+
+
+def test_double_braces_are_literal():
+    template = compile_template("{{name}} は {name}、{{ {name} }}")
+    assert template.parts == ("{name} は ", "name", "、{ ", "name", " }")
+    assert template.render_many({"name": ["太郎"]}, 1) == ["{name} は 太郎、{ 太郎 }"]
+
+
+def test_single_braces_without_placeholder_are_kept():
+    template = compile_template("a { b } c {name}")
+    assert template.render_many({"name": ["太郎"]}, 1) == ["a { b } c 太郎"]
+
+
+def test_strict_rejects_unknown_placeholder():
+    with pytest.raises(TemplateError) as error:
+        compile_template("{name}様 {coupon} {coupon}")
+    assert "{coupon}" in str(error.value)
+    assert str(error.value).count("{coupon}") == 1
+
+
+def test_non_strict_keeps_unknown_placeholder_as_text():
+    template = compile_template("{coupon} {name}", strict=False)
+    assert template.fields == ("name",)
+    assert template.render_many({"name": ["太郎"]}, 1) == ["{coupon} 太郎"]
+
+
+def test_values_are_not_formatted_again():
+    template = compile_template("{name}様")
+    assert template.render_many({"name": ["{0}", "{name}", "}{"]}, 3) == ["{0}様", "{name}様", "}{様"]
+
+
+def test_bind_merges_clinic_name_before_format_pattern():
+    template = compile_template("{clinic_name}より{name}様へ")
+    bound = template.bind({"clinic_name": "さくら{本院}"})
+    assert bound.parts == ("さくら{本院}より", "name", "様へ")
+    assert bound.fields == ("name",)
+    # クリニック名の波括弧は書式として解釈されない
+    assert bound.render_many({"name": ["太郎", "花子"]}, 2) == ["さくら{本院}より太郎様へ", "さくら{本院}より花子様へ"]
+
+
+def test_bind_without_matching_field_returns_same_template():
+    template = compile_template("{name}様")
+    assert template.bind({"clinic_name": "さくら歯科"}) is template
+    fixed = compile_template("{clinic_name}です").bind({"clinic_name": "さくら歯科"})
+    assert fixed.fields == () and not fixed.personal
+    assert fixed.render_many({}, 3) == ["さくら歯科です"] * 3
+
+
+def test_render_batch_fills_patient_values_and_defaults():
+    template = compile_template("{clinic_name}：{name}様 {last_visit_date}")
+    patients = [patient("太郎", datetime(2024, 1, 31, 16, 0)), patient(None, None), None]
+    assert render_batch(template, patients, clinic_name="さくら歯科", tz_name="Asia/Tokyo") == [
+        "さくら歯科：太郎様 2月1日",
+        f"さくら歯科：{DEFAULT_VALUES['name']}様 {DEFAULT_VALUES['last_visit_date']}",
+        f"さくら歯科：{DEFAULT_VALUES['name']}様 {DEFAULT_VALUES['last_visit_date']}",
+    ]
+
+
+def test_render_without_personalize_uses_defaults():
+    template = compile_template("{name}様（{clinic_name}）")
+    assert render(template, patient("太郎"), clinic_name="さくら歯科", personalize=False) == (
+        f"{DEFAULT_VALUES['name']}様（さくら歯科）"
+    )
+
+
+def test_compiled_templates_compare_by_parts():
+    assert compile_template("{name}様") == CompiledTemplate(("", "name", "様"))
@@ -0,0 +1,11 @@
+"""本番用のエントリーポイント
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+埋め込みモードのワーカー（アウトボックス・Webhook キュー・プロフィール取得）は
+fork 後の各 gunicorn ワーカーで起動する（gunicorn.conf.py の post_worker_init）。
+スケジューラーは Web ワーカーでは起動しないので `flask scheduler` を別プロセスで動かす。
+"""
+from app import create_app
+
+app = create_app()